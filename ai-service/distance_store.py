@@ -0,0 +1,492 @@
+import numpy as np
+import os
+import json
+import heapq
+import math
+import logging
+import threading
+import time
+from itertools import chain, repeat
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; the store then relies on a single server process
+    fcntl = None
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger('distance_store')
+
+# Constants
+DEFAULT_CAPACITY = 4096  # Locations kept in the store (matrix is capacity x capacity float64, 128 MB)
+DEFAULT_MIN_LOCATIONS = 2  # A lone location has no pairs to look up
+DEFAULT_MAX_LOCATIONS = 64  # Larger gathers touch too many scattered rows and lose to vectorized haversine
+COORDINATE_PRECISION = 5  # Decimal places used for coordinate keys (~1 m)
+COORDINATE_TOLERANCE = 1e-6  # Degrees a known location may move before its distances are dropped
+CHECKPOINT_INTERVAL_SECONDS = 30  # Background matrix flush and index save at most this often
+EVICTION_BATCH_DIVISOR = 64  # Cold slots are released capacity // 64 at a time, one index write per batch
+INDEX_VERSION = 2
+MATRIX_FILE = 'distances.f64'
+INDEX_FILE = 'distance_index.json'
+LOCK_FILE = 'store.lock'
+
+def location_key(latitude, longitude, customer_id=None, depot_id=None):
+    """
+    Build a stable key for a location
+    
+    Args:
+        latitude: Latitude in degrees
+        longitude: Longitude in degrees
+        customer_id: Customer ID, preferred key for delivery stops
+        depot_id: Depot ID, preferred key for post offices
+    
+    Returns:
+        String key such as 'cust:CUST102', 'depot:PO1' or 'geo:17.48640,78.50042'
+    """
+    if depot_id:
+        return f"depot:{depot_id}"
+    if customer_id:
+        return f"cust:{customer_id}"
+    return f"geo:{latitude:.{COORDINATE_PRECISION}f},{longitude:.{COORDINATE_PRECISION}f}"
+
+def covering_rows(missing):
+    """
+    Pick rows of a symmetric missing-pair mask that together cover every missing pair
+    
+    Greedy vertex cover: one new location among known ones is covered by its
+    own row instead of by every row that misses its column.
+    
+    Args:
+        missing: Symmetric (n, n) boolean mask of unknown pairs
+    
+    Returns:
+        numpy array of row indices
+    """
+    remaining = missing.copy()
+    counts = remaining.sum(axis=1)
+    cover = []
+    while True:
+        row = int(counts.argmax())
+        if counts[row] == 0:
+            return np.array(cover, dtype=np.int64)
+        cover.append(row)
+        counts -= remaining[row]
+        counts[row] = 0
+        remaining[row] = False
+        remaining[:, row] = False
+
+class DistanceStore:
+    """
+    Persistent, memory-mapped pairwise distance store for recurring locations
+    
+    Each known location owns a slot in a capacity x capacity float64 matrix on
+    disk. Distances must be symmetric: a pair is kept once, in the row of the
+    slot that was handed out last, so a new location only resets its own
+    (contiguous) row and unknown pairs read as NaN. Requests gather their
+    submatrix in one indexing operation and only the missing pairs are computed.
+    Requests outside min_locations..max_locations are computed directly: a
+    postman's cluster is gathered faster than haversine computes it, but
+    the cells of a large matrix are spread over too many rows of the file.
+    
+    The slot index lives in this process only, so one process owns a directory:
+    opening takes an exclusive lock file, and a second process opening the same
+    directory gets a disabled store that computes every matrix directly. Route
+    worker processes do not use the store at all.
+    
+    The index on disk is saved by a background checkpoint (matrix flushed
+    first) and on close(). A slot it maps is never reused before a newer index
+    has dropped it: when the store is full, a batch of least recently used
+    slots is released with one index write, so a crash loses at most the
+    locations added since the last checkpoint.
+    """
+    
+    def __init__(self, directory, capacity=DEFAULT_CAPACITY, min_locations=DEFAULT_MIN_LOCATIONS,
+                 max_locations=DEFAULT_MAX_LOCATIONS):
+        """
+        Initialize the store (files are opened on first use)
+        
+        Args:
+            directory: Directory holding the matrix and index files
+            capacity: Maximum number of locations kept
+            min_locations: Requests with fewer locations bypass the store
+            max_locations: Requests with more locations bypass the store
+        """
+        self.directory = directory
+        self.capacity = capacity
+        self.min_locations = min_locations
+        self.max_locations = max_locations
+        self.eviction_batch = max(1, capacity // EVICTION_BATCH_DIVISOR)
+        self.matrix_path = os.path.join(directory, MATRIX_FILE)
+        self.index_path = os.path.join(directory, INDEX_FILE)
+        self.lock_path = os.path.join(directory, LOCK_FILE)
+        self.lock = threading.Lock()
+        self.index_lock = threading.Lock()  # Serializes index writes, taken after self.lock
+        self.lock_file = None
+        self.disabled = False
+        self.matrix = None
+        self.cells = None  # Flat view of the matrix for single-take gathers
+        self.slots = {}
+        self.coordinates = None  # One row per slot plus a NaN row that unknown keys point at
+        self.last_used = None
+        self.epochs = None  # Order in which slots were handed out, decides the row a pair lives in
+        self.epoch = 0
+        self.free = []  # Slots no saved index maps, safe to hand out
+        self.released = []  # Slots dropped from self.slots that the saved index may still map
+        self.saved_index = None
+        self.sequence = 0
+        self.saved_sequence = 0
+        self.saved_at = 0.0
+        self.checkpointing = False
+        self.clock = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bypassed = 0
+    
+    def uses_store(self, count):
+        """True if a matrix of count locations is looked up rather than computed"""
+        return self.min_locations <= count <= self.max_locations
+    
+    def _acquire_directory(self):
+        """Take the directory's lock file; False if another process holds it"""
+        self.lock_file = open(self.lock_path, 'a')
+        if fcntl is None:
+            return True
+        try:
+            fcntl.flock(self.lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            self.lock_file.close()
+            self.lock_file = None
+            return False
+    
+    def _open(self):
+        """
+        Open or create the memory-mapped matrix and load the slot index
+        
+        Returns:
+            True if the store can be used, False if another process owns the directory
+        """
+        if self.matrix is not None:
+            return True
+        if self.disabled:
+            return False
+        
+        os.makedirs(self.directory, exist_ok=True)
+        if not self._acquire_directory():
+            logger.warning(f"Distance store {self.directory} is in use by another process, computing distances directly")
+            self.disabled = True
+            return False
+        
+        index = None
+        if os.path.exists(self.index_path) and os.path.exists(self.matrix_path):
+            try:
+                with open(self.index_path, 'r') as f:
+                    index = json.load(f)
+                if index.get('version') != INDEX_VERSION or index.get('capacity') != self.capacity:
+                    logger.warning("Distance store format or capacity changed, starting a new store")
+                    index = None
+            except Exception as e:
+                logger.error(f"Error loading distance store index: {e}")
+                index = None
+        
+        if index is None:
+            # A new file is zero-filled (sparse on most filesystems); a slot's row
+            # is reset to NaN when the slot is handed out, so nothing is written up front
+            self.matrix = np.memmap(self.matrix_path, dtype=np.float64, mode='w+',
+                                    shape=(self.capacity, self.capacity))
+            self.slots = {}
+            self.coordinates = np.full((self.capacity + 1, 2), np.nan)
+            self.last_used = np.zeros(self.capacity, dtype=np.int64)
+            self.epochs = np.zeros(self.capacity, dtype=np.int64)
+            self.epoch = 0
+            self.clock = 0
+        else:
+            self.matrix = np.memmap(self.matrix_path, dtype=np.float64, mode='r+',
+                                    shape=(self.capacity, self.capacity))
+            self.slots = index['slots']
+            coordinates = np.array(index['coordinates'], dtype=np.float64).reshape(self.capacity, 2)
+            self.coordinates = np.vstack([coordinates, np.full((1, 2), np.nan)])
+            self.last_used = np.array(index['last_used'], dtype=np.int64)
+            self.epochs = np.array(index['epochs'], dtype=np.int64)
+            self.epoch = index['epoch']
+            self.clock = index['clock']
+        
+        self.cells = np.asarray(self.matrix).reshape(-1)
+        used = set(self.slots.values())
+        self.free = [slot for slot in range(self.capacity - 1, -1, -1) if slot not in used]
+        self.released = []
+        self.sequence += 1
+        self.saved_index = self._snapshot()
+        self._write_index(self.saved_index)
+        self.saved_sequence = self.sequence
+        self.saved_at = time.monotonic()
+        
+        logger.info(f"Opened distance store with {len(self.slots)} of {self.capacity} locations")
+        return True
+    
+    def _snapshot(self):
+        """Copy the slot index for saving (caller holds self.lock)"""
+        return {
+            'version': INDEX_VERSION,
+            'capacity': self.capacity,
+            'slots': dict(self.slots),
+            'coordinates': self.coordinates[:self.capacity].copy(),
+            'last_used': self.last_used.copy(),
+            'epochs': self.epochs.copy(),
+            'epoch': self.epoch,
+            'clock': self.clock
+        }
+    
+    def _write_index(self, index):
+        """Write a slot index snapshot next to the matrix file"""
+        coordinates = index['coordinates']
+        data = dict(index,
+                    coordinates=np.where(np.isnan(coordinates), None, coordinates).tolist(),
+                    last_used=index['last_used'].tolist(),
+                    epochs=index['epochs'].tolist())
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.index_path)
+    
+    def _release_batch(self, count, protected):
+        """
+        Make at least count slots free, evicting cold locations in one batch
+        
+        The saved index minus the released slots is written before any of them
+        is handed out again (caller holds self.lock).
+        
+        Args:
+            count: Slots needed beyond the free list
+            protected: Keys used by the current request
+        """
+        released = set(self.released)
+        wanted = max(count - len(released), self.eviction_batch) if count > len(released) else 0
+        if wanted:
+            candidates = ((self.last_used[slot], slot, key) for key, slot in self.slots.items()
+                          if key not in protected)
+            for _, slot, key in heapq.nsmallest(wanted, candidates):
+                del self.slots[key]
+                released.add(slot)
+                self.evictions += 1
+        
+        with self.index_lock:
+            self.sequence += 1
+            saved_slots = self.saved_index['slots']
+            self.saved_index = dict(self.saved_index, slots={key: slot for key, slot in saved_slots.items()
+                                                              if slot not in released})
+            self._write_index(self.saved_index)
+            self.saved_sequence = self.sequence
+        self.released = []
+        self.free.extend(released)
+    
+    def _reset_slot(self, slot, location):
+        """Give a slot a new location; its row holds all of the slot's pairs from now on"""
+        self.matrix[slot, :] = np.nan
+        self.matrix[slot, slot] = 0.0
+        self.coordinates[slot] = location
+        self.epoch += 1
+        self.epochs[slot] = self.epoch
+    
+    def _resolve_keys(self, keys, locations):
+        """A key seen twice at different coordinates falls back to coordinate keys"""
+        first_seen = {}
+        resolved = []
+        for key, location in zip(keys, locations):
+            known = first_seen.setdefault(key, location)
+            if np.abs(known - location).max() > COORDINATE_TOLERANCE:
+                key = location_key(location[0], location[1])
+                first_seen.setdefault(key, location)
+            resolved.append(key)
+        return resolved
+    
+    def _assign_slots(self, keys, locations):
+        """
+        Map keys to slots, reusing known locations and evicting cold ones
+        
+        Returns:
+            numpy array of slots, or None if the request alone exceeds capacity
+        """
+        # Unknown keys point at a NaN row past the last slot, so one comparison
+        # finds both new and moved locations; known stops usually match exactly
+        slots = np.fromiter(map(self.slots.get, keys, repeat(self.capacity)), dtype=np.int64, count=len(keys))
+        known = self.coordinates[slots]
+        if (known == locations).all():
+            return slots
+        stale = ~(np.abs(known - locations).max(axis=1) <= COORDINATE_TOLERANCE)
+        if not stale.any():
+            return slots
+        
+        unique_keys = set(keys)
+        if len(unique_keys) < len(keys):
+            keys = self._resolve_keys(keys, locations)
+            unique_keys = set(keys)
+            slots = np.fromiter(map(self.slots.get, keys, repeat(self.capacity)), dtype=np.int64, count=len(keys))
+            stale = ~(np.abs(self.coordinates[slots] - locations).max(axis=1) <= COORDINATE_TOLERANCE)
+        if len(unique_keys) > self.capacity:
+            return None
+        
+        for i in np.flatnonzero(stale & (slots < self.capacity)):
+            # Same ID at a new address: its stored distances are stale, so it
+            # moves to a fresh slot and the old one is released with the next batch
+            slot = self.slots.pop(keys[i], None)
+            if slot is not None:
+                self.released.append(slot)
+        
+        new = np.flatnonzero(stale)
+        needed = len({keys[i] for i in new})
+        if needed > len(self.free):
+            self._release_batch(needed - len(self.free), protected=unique_keys)
+        for i in new:
+            slot = self.slots.get(keys[i])
+            if slot is None:
+                slot = self.free.pop()
+                self.slots[keys[i]] = slot
+                self._reset_slot(slot, locations[i])
+            slots[i] = slot
+        return slots
+    
+    def get_matrix(self, keys, locations, compute_fn):
+        """
+        Gather the distance matrix for a list of locations, computing only missing pairs
+        
+        Args:
+            keys: Stable location keys, see location_key (unused when the store is bypassed)
+            locations: List of (latitude, longitude) tuples matching keys
+            compute_fn: Function (sources, targets) -> symmetric distance matrix for missing rows
+        
+        Returns:
+            2D numpy array of distances in km
+        """
+        if isinstance(locations, list):
+            # Cheaper than np.asarray for the usual list of (latitude, longitude) tuples
+            locations = np.fromiter(chain.from_iterable(locations), dtype=np.float64, count=2 * len(locations))
+        locations = np.asarray(locations, dtype=np.float64).reshape(-1, 2)
+        n = len(locations)
+        if not self.uses_store(n):
+            with self.lock:
+                self.bypassed += 1
+            return np.asarray(compute_fn(locations, locations), dtype=np.float64)
+        
+        with self.lock:
+            if not self._open():
+                slots = None
+            else:
+                slots = self._assign_slots(keys, locations)
+                if slots is None:
+                    logger.warning(f"Request with {n} locations exceeds distance store capacity")
+            if slots is None:
+                return np.asarray(compute_fn(locations, locations), dtype=np.float64)
+            
+            # Each pair lives in the row of whichever slot was handed out later
+            epochs = self.epochs[slots]
+            cells = slots[:, np.newaxis] * self.capacity + slots
+            cells = np.where(epochs[:, np.newaxis] > epochs, cells, cells.T)
+            matrix = self.cells.take(cells)
+            # One reduction tells whether anything is missing
+            missing = np.isnan(matrix) if math.isnan(matrix.sum()) else None
+            missing_count = int(np.count_nonzero(missing)) if missing is not None else 0
+            self.misses += missing_count
+            self.hits += n * n - n - missing_count
+            self.clock += 1
+            self.last_used[slots] = self.clock
+            checkpoint_due = (not self.checkpointing and
+                              time.monotonic() - self.saved_at >= CHECKPOINT_INTERVAL_SECONDS)
+            self.checkpointing = self.checkpointing or checkpoint_due
+        
+        if checkpoint_due:
+            threading.Thread(target=self._checkpoint_in_background, name='distance-store-checkpoint',
+                             daemon=True).start()
+        
+        if missing_count:
+            # Computed outside the lock so other requests are not serialized behind it
+            cover = covering_rows(missing)
+            computed = np.asarray(compute_fn(locations[cover], locations), dtype=np.float64)
+            matrix[cover] = np.where(missing[cover], computed, matrix[cover])
+            matrix[:, cover] = np.where(missing[:, cover], computed.T, matrix[:, cover])
+            np.fill_diagonal(matrix, 0.0)
+            # Haversine can differ in the last bit by direction; keep what the store will return
+            lower = np.tril(missing, -1)
+            matrix[lower] = matrix.T[lower]
+            
+            pair_rows, pair_cols = np.nonzero(np.triu(missing, 1))
+            with self.lock:
+                # Skip slots another request gave to a new location in the meantime
+                current = self.epochs[slots] == epochs
+                keep = current[pair_rows] & current[pair_cols]
+                pair_rows, pair_cols = pair_rows[keep], pair_cols[keep]
+                if self.matrix is not None:
+                    self.cells[cells[pair_rows, pair_cols]] = matrix[pair_rows, pair_cols]
+        
+        return matrix
+    
+    def checkpoint(self):
+        """Flush the matrix, then save the slot index it belongs to"""
+        with self.lock:
+            if self.matrix is None:
+                return
+            self.sequence += 1
+            sequence = self.sequence
+            index = self._snapshot()
+            matrix = self.matrix
+        
+        # Slots in the snapshot were reset before it was taken, so their rows
+        # are on disk before the index that maps them
+        matrix.flush()
+        with self.index_lock:
+            # A batch release written meanwhile is newer than this snapshot
+            if sequence > self.saved_sequence:
+                self._write_index(index)
+                self.saved_index = index
+                self.saved_sequence = sequence
+        self.saved_at = time.monotonic()
+    
+    def _checkpoint_in_background(self):
+        """Run a checkpoint off the request path"""
+        try:
+            self.checkpoint()
+        except Exception as e:
+            logger.error(f"Error saving distance store: {e}")
+        finally:
+            self.checkpointing = False
+    
+    def close(self):
+        """Save the store and release the directory"""
+        self.checkpoint()
+        with self.lock:
+            self.matrix = None
+            self.cells = None
+            if self.lock_file is not None:
+                self.lock_file.close()
+                self.lock_file = None
+    
+    def get_stats(self):
+        """
+        Get store statistics
+        
+        Returns:
+            Dictionary with hit rate, size and eviction counts
+        """
+        with self.lock:
+            requested = self.hits + self.misses
+            return {
+                'directory': self.directory,
+                'capacity': self.capacity,
+                'min_locations': self.min_locations,
+                'max_locations': self.max_locations,
+                'in_use_by_other_process': self.disabled,
+                'locations': len(self.slots),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / requested, 4) if requested else None,
+                'evictions': self.evictions,
+                'bypassed_requests': self.bypassed,
+                'file_bytes': os.path.getsize(self.matrix_path) if os.path.exists(self.matrix_path) else 0
+            }
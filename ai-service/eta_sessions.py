@@ -0,0 +1,387 @@
+import numpy as np
+import json
+import logging
+import queue
+import threading
+import time
+import uuid
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger('eta_sessions')
+
+# Constants
+DEFAULT_TTL_SECONDS = 12 * 3600  # Sessions idle longer than a shift are dropped
+HEARTBEAT_SECONDS = 15  # Keep-alive comment interval on idle event streams
+SUBSCRIBER_QUEUE_SIZE = 32  # Updates buffered per slow subscriber before the oldest is dropped
+LONG_POLL_SECONDS = 25  # Longest wait for an update on a long poll, below common proxy idle timeouts
+
+def sse_event(event, data):
+    """
+    Format one server-sent event
+    
+    Args:
+        event: Event name
+        data: JSON-serializable payload
+    
+    Returns:
+        Event text including the blank line that ends it
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+class EtaSession:
+    """
+    ETAs of one postman's route, kept up to date from stop-completed events
+    
+    Travel and service minutes of every stop are fixed when the session is
+    registered, so a completed stop only re-runs the cumulative sums over the
+    stops after it. Every update is pushed to the session's subscribers and
+    wakes its long polls.
+    """
+    
+    def __init__(self, session_id, stop_ids, travel_minutes, service_minutes, start_minute, clock=None):
+        """
+        Initialize the session
+        
+        Args:
+            session_id: Unique session ID
+            stop_ids: Identifier of each stop in visiting order (order or customer ID)
+            travel_minutes: Travel minutes into each stop from the previous one (0 for the first, where the postman starts)
+            service_minutes: Service minutes at each stop
+            start_minute: Departure from the first stop, in minutes after midnight
+            clock: Optional function turning minutes after midnight into a display time
+        """
+        self.session_id = session_id
+        self.stop_ids = list(stop_ids)
+        self.travel = np.asarray(travel_minutes, dtype=np.float64)
+        self.service = np.asarray(service_minutes, dtype=np.float64)
+        self.clock = clock
+        self.arrivals = np.zeros(len(self.stop_ids))
+        self.completed_at = [None] * len(self.stop_ids)
+        self.statuses = ['pending'] * len(self.stop_ids)
+        self.next_position = 0
+        self.version = 0
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.subscribers = []
+        self.closed = False
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+        self._recompute(0, start_minute)
+    
+    @property
+    def finished(self):
+        """Whether every stop is completed or skipped"""
+        return self.next_position >= len(self.stop_ids)
+    
+    def _recompute(self, position, departure_minute):
+        """Arrival times of the stops from position onwards after leaving the previous stop at departure_minute"""
+        suffix = slice(position, len(self.stop_ids))
+        service_before = np.cumsum(self.service[suffix]) - self.service[suffix]
+        self.arrivals[suffix] = departure_minute + np.cumsum(self.travel[suffix]) + service_before
+    
+    def position_of(self, stop_id):
+        """
+        Find a remaining stop by its identifier
+        
+        Args:
+            stop_id: Order or customer ID of the stop
+        
+        Returns:
+            Position in the route
+        """
+        for position in range(self.next_position, len(self.stop_ids)):
+            if self.stop_ids[position] == stop_id:
+                return position
+        raise ValueError(f"Stop {stop_id} is not a remaining stop of session {self.session_id}")
+    
+    def complete_stop(self, position, completed_minute):
+        """
+        Record a completed stop and recompute the ETAs of the stops after it
+        
+        Remaining stops before position are marked skipped.
+        
+        Args:
+            position: Position of the completed stop in the route
+            completed_minute: Minutes after midnight when the postman left the stop
+        
+        Returns:
+            Update dictionary for the remaining stops
+        """
+        with self.lock:
+            if position < self.next_position or position >= len(self.stop_ids):
+                raise ValueError(f"Stop position {position} is not a remaining stop")
+            for skipped in range(self.next_position, position):
+                self.statuses[skipped] = 'skipped'
+            self.statuses[position] = 'completed'
+            self.completed_at[position] = completed_minute
+            self.next_position = position + 1
+            self._recompute(self.next_position, completed_minute)
+            self.version += 1
+            self.updated_at = time.time()
+            update = self._update()
+            subscribers = list(self.subscribers)
+            self.changed.notify_all()
+        
+        for subscriber in subscribers:
+            self._offer(subscriber, update)
+        return update
+    
+    def _format(self, minute):
+        """Display form of a time in minutes after midnight"""
+        return self.clock(minute) if self.clock else round(float(minute), 1)
+    
+    def _update(self):
+        """Update dictionary covering only the remaining stops (caller holds the lock)"""
+        arrivals = self.arrivals[self.next_position:].tolist()
+        departures = (self.arrivals[self.next_position:] + self.service[self.next_position:]).tolist()
+        return {
+            'session_id': self.session_id,
+            'version': self.version,
+            'status': 'finished' if self.finished else 'active',
+            'completed_stops': self.statuses.count('completed'),
+            'skipped_stops': self.statuses.count('skipped'),
+            'remaining_stops': len(arrivals),
+            'etas': [
+                {'position': self.next_position + offset, 'stop_id': self.stop_ids[self.next_position + offset],
+                 'eta': self._format(arrival), 'departure': self._format(departure)}
+                for offset, (arrival, departure) in enumerate(zip(arrivals, departures))
+            ],
+            'end_time': self._format(departures[-1]) if departures else None
+        }
+    
+    def snapshot(self):
+        """
+        Current ETAs of the remaining stops plus the status of every stop
+        
+        Returns:
+            Update dictionary with a 'stops' list covering the whole route
+        """
+        with self.lock:
+            update = self._update()
+            update['stops'] = [
+                {'position': position, 'stop_id': stop_id, 'status': status,
+                 'completed_at': self._format(completed) if completed is not None else None}
+                for position, (stop_id, status, completed) in enumerate(
+                    zip(self.stop_ids, self.statuses, self.completed_at))
+            ]
+        return update
+    
+    @staticmethod
+    def _offer(subscriber, update):
+        """Queue an update for a subscriber, dropping its oldest update when full"""
+        while True:
+            try:
+                subscriber.put_nowait(update)
+                return
+            except queue.Full:
+                try:
+                    subscriber.get_nowait()
+                except queue.Empty:
+                    pass
+    
+    def subscribe(self):
+        """
+        Register a subscriber
+        
+        Returns:
+            Queue receiving every later update, and None when the session is closed
+        """
+        subscriber = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self.lock:
+            self.subscribers.append(subscriber)
+        return subscriber
+    
+    def unsubscribe(self, subscriber):
+        """Remove a subscriber registered with subscribe()"""
+        with self.lock:
+            if subscriber in self.subscribers:
+                self.subscribers.remove(subscriber)
+    
+    def wait_for_update(self, since, timeout=LONG_POLL_SECONDS):
+        """
+        Long poll: wait until the session moves past a version
+        
+        Returns at once if the session is already past since or the route is
+        finished, otherwise after the next update or timeout seconds.
+        
+        Args:
+            since: Last version the caller has seen
+            timeout: Seconds to wait at most
+        
+        Returns:
+            Update dictionary (same version as since on timeout), or None if the session is closed
+        """
+        with self.changed:
+            self.changed.wait_for(lambda: self.version > since or self.finished or self.closed, timeout)
+            if self.closed:
+                return None
+            return self._update()
+    
+    def close(self):
+        """Tell every subscriber and long poll the session is gone"""
+        with self.lock:
+            subscribers, self.subscribers = self.subscribers, []
+            self.closed = True
+            self.changed.notify_all()
+        for subscriber in subscribers:
+            self._offer(subscriber, None)
+    
+    def stream(self, heartbeat_seconds=HEARTBEAT_SECONDS):
+        """
+        Server-sent event stream of the session
+        
+        Sends the current snapshot first, then one 'eta' event per update until
+        the route is finished or the session is closed; idle periods get a
+        keep-alive comment every heartbeat_seconds.
+        
+        Yields:
+            Event text
+        """
+        subscriber = self.subscribe()
+        try:
+            snapshot = self.snapshot()
+            yield sse_event('snapshot', snapshot)
+            if snapshot['status'] == 'finished':
+                return
+            while True:
+                try:
+                    update = subscriber.get(timeout=heartbeat_seconds)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+                if update is None:
+                    yield sse_event('closed', {'session_id': self.session_id})
+                    return
+                yield sse_event('eta', update)
+                if update['status'] == 'finished':
+                    return
+        finally:
+            self.unsubscribe(subscriber)
+
+class EtaSessionStore:
+    """
+    Live ETA sessions kept in memory
+    
+    Sessions not updated for ttl_seconds are dropped.
+    """
+    
+    def __init__(self, ttl_seconds=DEFAULT_TTL_SECONDS, clock=None):
+        """
+        Initialize the store
+        
+        Args:
+            ttl_seconds: Seconds an idle session is kept
+            clock: Optional function turning minutes after midnight into a display time
+        """
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self.sessions = {}
+        self.lock = threading.Lock()
+        self.events = 0
+        self.expired = 0
+    
+    def create(self, stop_ids, travel_minutes, service_minutes, start_minute):
+        """
+        Register a route
+        
+        Args:
+            stop_ids: Identifier of each stop in visiting order
+            travel_minutes: Travel minutes into each stop from the previous one
+            service_minutes: Service minutes at each stop
+            start_minute: Departure from the first stop, in minutes after midnight
+        
+        Returns:
+            EtaSession instance
+        """
+        self.expire()
+        session = EtaSession(uuid.uuid4().hex, stop_ids, travel_minutes, service_minutes, start_minute, self.clock)
+        with self.lock:
+            self.sessions[session.session_id] = session
+        return session
+    
+    def get(self, session_id):
+        """
+        Look up a session
+        
+        Args:
+            session_id: Session ID returned by create()
+        
+        Returns:
+            EtaSession instance, or None if unknown or expired
+        """
+        self.expire()
+        with self.lock:
+            return self.sessions.get(session_id)
+    
+    def complete_stop(self, session_id, position, completed_minute):
+        """
+        Record a completed stop of a session
+        
+        Args:
+            session_id: Session ID returned by create()
+            position: Position of the completed stop in the route
+            completed_minute: Minutes after midnight when the postman left the stop
+        
+        Returns:
+            Update dictionary, or None if the session is unknown or expired
+        """
+        session = self.get(session_id)
+        if session is None:
+            return None
+        update = session.complete_stop(position, completed_minute)
+        with self.lock:
+            self.events += 1
+        return update
+    
+    def delete(self, session_id):
+        """
+        Drop a session and close its event streams
+        
+        Args:
+            session_id: Session ID returned by create()
+        
+        Returns:
+            True if the session existed
+        """
+        with self.lock:
+            session = self.sessions.pop(session_id, None)
+        if session is None:
+            return False
+        session.close()
+        return True
+    
+    def expire(self):
+        """Drop sessions idle for longer than the TTL"""
+        cutoff = time.time() - self.ttl_seconds
+        with self.lock:
+            stale = [session for session in self.sessions.values() if session.updated_at < cutoff]
+            for session in stale:
+                del self.sessions[session.session_id]
+            self.expired += len(stale)
+        for session in stale:
+            session.close()
+    
+    def get_stats(self):
+        """
+        Get store statistics
+        
+        Returns:
+            Dictionary with session, subscriber and event counts
+        """
+        self.expire()
+        with self.lock:
+            sessions = list(self.sessions.values())
+            events = self.events
+        return {
+            'sessions': len(sessions),
+            'active_sessions': sum(1 for session in sessions if not session.finished),
+            'subscribers': sum(len(session.subscribers) for session in sessions),
+            'events': events,
+            'ttl_seconds': self.ttl_seconds,
+            'expired': self.expired
+        }
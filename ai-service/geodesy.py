@@ -0,0 +1,64 @@
+import numpy as np
+
+# Constants
+EARTH_RADIUS_KM = 6371.0088  # Mean earth radius (IUGG)
+
+def haversine_matrix(sources, targets=None, dtype=np.float64):
+    """
+    Vectorized haversine distances between two sets of points
+    
+    Args:
+        sources: Sequence or (n, 2) array of (latitude, longitude) in degrees
+        targets: Sequence or (m, 2) array of (latitude, longitude) in degrees,
+            defaults to sources for a square matrix
+        dtype: Output dtype (np.float64 or np.float32)
+        
+    Returns:
+        (n, m) numpy array of distances in km
+    """
+    src = np.radians(np.asarray(sources, dtype=np.float64).reshape(-1, 2))
+    dst = src if targets is None else np.radians(np.asarray(targets, dtype=np.float64).reshape(-1, 2))
+    
+    # Per-point terms are computed once, the pairwise terms by broadcasting
+    src_lat = src[:, 0:1]
+    dst_lat = dst[:, 0][np.newaxis, :]
+    
+    # Work in place on the (n, m) buffers to keep peak memory at two matrices
+    d = np.subtract(dst_lat, src_lat)
+    d *= 0.5
+    np.sin(d, out=d)
+    d *= d
+    
+    lng_term = np.subtract(dst[:, 1][np.newaxis, :], src[:, 1:2])
+    lng_term *= 0.5
+    np.sin(lng_term, out=lng_term)
+    lng_term *= lng_term
+    lng_term *= np.cos(src_lat)
+    lng_term *= np.cos(dst_lat)
+    d += lng_term
+    del lng_term
+    
+    # Rounding can push d marginally outside [0, 1] for (near) antipodal points
+    np.clip(d, 0.0, 1.0, out=d)
+    np.sqrt(d, out=d)
+    np.arcsin(d, out=d)
+    d *= 2 * EARTH_RADIUS_KM
+    
+    return d.astype(dtype, copy=False)
+
+def haversine_pairs(sources, targets):
+    """
+    Vectorized haversine distances between matching rows of two point arrays
+    
+    Args:
+        sources: (n, 2) array of (latitude, longitude) in degrees
+        targets: (n, 2) array of (latitude, longitude) in degrees
+        
+    Returns:
+        numpy array of n distances in km
+    """
+    src = np.radians(np.asarray(sources, dtype=np.float64).reshape(-1, 2))
+    dst = np.radians(np.asarray(targets, dtype=np.float64).reshape(-1, 2))
+    d = (np.sin((dst[:, 0] - src[:, 0]) * 0.5) ** 2
+         + np.cos(src[:, 0]) * np.cos(dst[:, 0]) * np.sin((dst[:, 1] - src[:, 1]) * 0.5) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(d, 0.0, 1.0)))
@@ -24,6 +24,7 @@ try:
     import timeslot_prediction
     import route_optimization
     from dataset_manager import DatasetManager
+    from territory_index import get_territory_index
     logger.info("Successfully imported all service modules")
 except Exception as e:
     logger.error(f"Error importing modules: {e}")
@@ -33,9 +34,15 @@ except Exception as e:
 app = Flask(__name__)
 CORS(app)
 
+# Event streams and long polls hold their connection open, so they get their own
+# server and thread pool instead of taking API threads
+stream_app = Flask('ai_service_streams')
+CORS(stream_app)
+
 # Create blueprints for the services
 timeslot_blueprint = Blueprint('timeslot', __name__)
 route_blueprint = Blueprint('route', __name__)
+stream_blueprint = Blueprint('route_streams', __name__)
 
 # Copy routes from the timeslot app to the blueprint
 for rule in timeslot_prediction.app.url_map.iter_rules():
@@ -43,15 +50,17 @@ for rule in timeslot_prediction.app.url_map.iter_rules():
         view_func = timeslot_prediction.app.view_functions[rule.endpoint]
         timeslot_blueprint.route(rule.rule, methods=rule.methods)(view_func)
 
-# Copy routes from the route app to the blueprint
+# Copy routes from the route app to the blueprints, held-open endpoints to the stream server
 for rule in route_optimization.app.url_map.iter_rules():
     if rule.endpoint != 'static':
         view_func = route_optimization.app.view_functions[rule.endpoint]
-        route_blueprint.route(rule.rule, methods=rule.methods)(view_func)
+        blueprint = stream_blueprint if rule.endpoint in route_optimization.STREAM_ENDPOINTS else route_blueprint
+        blueprint.route(rule.rule, methods=rule.methods)(view_func)
 
 # Register blueprints
 app.register_blueprint(timeslot_blueprint, url_prefix='/timeslot')
 app.register_blueprint(route_blueprint, url_prefix='/route')
+stream_app.register_blueprint(stream_blueprint, url_prefix='/route')
 
 # Main endpoints
 @app.route('/', methods=['GET'])
@@ -111,8 +120,14 @@ def create_order():
         import random
         order_id = f"ORD{random.randint(1000, 9999)}"
         
-        # Assign postman (would be optimized in real implementation)
-        postman_id = f"POST{random.randint(1, 10):03d}"
+        # Assign the postman who owns the delivery location's territory
+        territory_index = get_territory_index()
+        assignment = territory_index.assign(
+            float(data['latitude']), float(data['longitude']), data.get('delivery_date')
+        ) if territory_index is not None else None
+        if assignment is None:
+            assignment = {'postman_id': f"POST{random.randint(1, 10):03d}", 'method': 'random', 'load': None}
+        postman_id = assignment['postman_id']
         
         # Use timeslot_prediction directly
         prediction_result = timeslot_prediction.predict_optimal_timeslot({
@@ -141,7 +156,9 @@ def create_order():
             'day_of_week': data.get('day_of_week', 0),
             'predicted_time_slot': prediction_result.get('predicted_time_slot', 1),
             'confidence': prediction_result.get('confidence', 0.0),
-            'explanation': prediction_result.get('explanation', '')
+            'explanation': prediction_result.get('explanation', ''),
+            'assignment_method': assignment['method'],
+            'postman_load': assignment['load']
         }
         
         logger.info(f"Created order: {order_id} with time slot {order['predicted_time_slot']}")
@@ -177,6 +194,21 @@ def get_sample_data():
         logger.error(f"Error retrieving sample data: {e}")
         return jsonify({'error': str(e)}), 500
 
+def start_stream_server(host, port, threads):
+    """
+    Serve ETA event streams and long polls in the background
+    
+    Args:
+        host: Interface to listen on
+        port: Port of the stream server
+        threads: Worker threads, i.e. streams and long polls open at once before new ones queue
+    """
+    logger.info(f"Serving ETA streams on http://{host}:{port} with {threads} threads")
+    server = threading.Thread(target=serve, args=(stream_app,), kwargs={'host': host, 'port': port, 'threads': threads},
+                              name='eta-stream-server', daemon=True)
+    server.start()
+    return server
+
 def initialize_services():
     """Initialize all service components"""
     try:
@@ -190,6 +222,9 @@ def initialize_services():
         # Initialize timeslot prediction
         timeslot_prediction.initialize()
         
+        # Load postman territories so order assignment never clusters on the request path
+        get_territory_index()
+        
         logger.info("All services initialized successfully")
         return True
     except Exception as e:
@@ -205,12 +240,19 @@ if __name__ == '__main__':
         host = os.environ.get('HOST', '0.0.0.0')
         port = int(os.environ.get('PORT', 5000))
         debug_mode = os.environ.get('DEBUG', 'False').lower() == 'true'
+        stream_port = int(os.environ.get('STREAM_PORT', port + 1))
+        stream_threads = int(os.environ.get('STREAM_THREADS', 64))
+        
+        # The debug reloader runs this block twice; only its child serves requests
+        if not debug_mode or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+            start_stream_server(host, stream_port, stream_threads)
         
         if debug_mode:
             logger.info(f"Starting AI Service in DEBUG mode on http://{host}:{port}")
             app.run(host=host, port=port, debug=True)
         else:
             logger.info(f"Starting AI Service in PRODUCTION mode on http://{host}:{port}")
-            serve(app, host=host, port=port, threads=4)
+            threads = int(os.environ.get('SERVER_THREADS', 4))
+            serve(app, host=host, port=port, threads=threads)
     else:
         logger.error("Failed to start AI Service due to initialization errors") 
\ No newline at end of file
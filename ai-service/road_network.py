@@ -0,0 +1,585 @@
+import numpy as np
+import hashlib
+import os
+import re
+import logging
+import threading
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components, dijkstra
+from scipy.spatial import cKDTree
+from geodesy import haversine_matrix, haversine_pairs
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger('road_network')
+
+# Constants
+ROAD_NETWORK_PATH = os.environ.get('ROAD_NETWORK_PATH', '')  # GraphML road extract; empty disables the road backend
+ROAD_ROW_CACHE_SIZE = int(os.environ.get('ROAD_ROW_CACHE_SIZE', 256))  # Shortest-path rows kept per network
+ROAD_LANDMARKS = int(os.environ.get('ROAD_LANDMARKS', 8))  # Landmarks whose distances bound paths leaving a search region
+LANDMARKS_SUFFIX = '.landmarks.npz'  # Landmark distances are saved next to the extract under this suffix
+DIJKSTRA_CHUNK = 64  # Sources per Dijkstra call, bounds the (sources x nodes) work array
+DETOUR_FACTOR = 1.4  # Haversine multiplier for pairs the network cannot connect
+REGION_MARGIN_KM = 1.0  # Searches stay within the stops' bounding box grown by this much (or a quarter of its size)
+REGION_MAX_SHARE = 0.5  # Regions covering more of the network search the whole graph instead
+DEFAULT_ROAD_SPEED_KM_PER_HOUR = 25
+HIGHWAY_SPEEDS_KM_PER_HOUR = {
+    'motorway': 80, 'trunk': 60, 'primary': 50, 'secondary': 40, 'tertiary': 30,
+    'unclassified': 25, 'residential': 20, 'living_street': 10, 'service': 15
+}
+GRAPHML_NS = '{http://graphml.graphdrawing.org/xmlns}'
+
+# Shared network, loaded from ROAD_NETWORK_PATH on first use
+_road_network = None
+_road_network_lock = threading.Lock()
+
+def parse_speed(maxspeed, highway=None):
+    """
+    Speed of a road segment from OSM tags
+    
+    Args:
+        maxspeed: OSM maxspeed value ('40', '30 mph', "['40', '50']") or None
+        highway: OSM highway value, used when maxspeed is missing
+    
+    Returns:
+        Speed in km/h
+    """
+    if maxspeed:
+        match = re.search(r'\d+(\.\d+)?', str(maxspeed))
+        if match:
+            speed = float(match.group(0))
+            return speed * 1.609 if 'mph' in str(maxspeed) else speed
+    if highway:
+        # OSMnx writes lists for merged edges; '_link' roads take their parent's speed
+        highway = re.sub(r"[\[\]' ]", '', str(highway)).split(',')[0].replace('_link', '')
+        return HIGHWAY_SPEEDS_KM_PER_HOUR.get(highway, DEFAULT_ROAD_SPEED_KM_PER_HOUR)
+    return DEFAULT_ROAD_SPEED_KM_PER_HOUR
+
+class RoadNetwork:
+    """
+    Shortest road distances and travel times from a local road extract
+    
+    Loading builds a CSR graph of edge lengths in km (with the minutes of each
+    edge at its road speed alongside), restricts snapping to the largest
+    strongly connected component and indexes its nodes in a KD-tree. Matrices
+    come from scipy's compiled Dijkstra, run once per distinct snapped source
+    node on the shortest-distance graph; travel minutes are summed along the
+    same paths, so both come from one search. Rows of whole-network searches
+    are kept in an LRU cache so the depot and re-planned stops are not searched again.
+    
+    A postman's stops are close together, so their matrix is searched on the
+    subgraph around them. Landmark distances computed at load time (ALT)
+    prove those rows exact: a path leaving the region must cross one of its
+    boundary edges, and the landmarks bound what is left of it from below.
+    Sources the bound cannot settle are searched again on the whole network.
+    """
+    
+    def __init__(self, node_ids, coordinates, edges, row_cache_size=ROAD_ROW_CACHE_SIZE,
+                 landmark_count=ROAD_LANDMARKS, landmarks_path=None):
+        """
+        Initialize the network
+        
+        Args:
+            node_ids: Identifier of each node
+            coordinates: (n, 2) array of node (latitude, longitude)
+            edges: List of (source index, target index, length km, speed km/h) directed edges
+            row_cache_size: Shortest-path rows kept in memory
+            landmark_count: Landmarks used to bound paths leaving a search region
+            landmarks_path: File the landmark distances are loaded from and saved to; None keeps them in memory only
+        """
+        self.node_ids = list(node_ids)
+        self.coordinates = np.asarray(coordinates, dtype=np.float64).reshape(-1, 2)
+        n = len(self.node_ids)
+        edges = np.asarray(edges, dtype=np.float64).reshape(-1, 4)
+        sources, targets = edges[:, 0].astype(np.int64), edges[:, 1].astype(np.int64)
+        lengths = edges[:, 2]
+        minutes = lengths / np.maximum(edges[:, 3], 1.0) * 60
+        self.graph, self.minutes = self._csr(sources, targets, lengths, minutes, n)
+        
+        # Snap only to the largest strongly connected component so every pair is reachable
+        _, labels = connected_components(self.graph, directed=True, connection='strong')
+        largest = np.bincount(labels).argmax() if n else 0
+        self.snap_nodes = np.flatnonzero(labels == largest)
+        self.tree = cKDTree(self._scaled(self.coordinates[self.snap_nodes])) if len(self.snap_nodes) else None
+        
+        self.landmarks, self.from_landmarks, self.to_landmarks = self._load_landmarks(landmark_count, landmarks_path)
+        
+        self.row_cache_size = row_cache_size
+        self.rows = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.region_searches = 0
+        self.network_searches = 0
+        logger.info(f"Road network with {n} nodes, {len(edges)} edges "
+                    f"({len(self.snap_nodes)} nodes in the largest component, {len(self.landmarks)} landmarks)")
+    
+    @staticmethod
+    def _csr(sources, targets, lengths, minutes, n):
+        """Sparse adjacency in km keeping the shortest of parallel edges, and the minutes of the kept edges"""
+        order = np.lexsort((lengths, targets, sources))
+        sources, targets, lengths, minutes = sources[order], targets[order], lengths[order], minutes[order]
+        first = np.ones(len(sources), dtype=bool)
+        first[1:] = (sources[1:] != sources[:-1]) | (targets[1:] != targets[:-1])
+        # Zero-length edges would vanish from a sparse matrix; keep them as tiny weights
+        pairs = (sources[first], targets[first])
+        graph = csr_matrix((np.maximum(lengths[first], 1e-9), pairs), shape=(n, n))
+        graph_minutes = csr_matrix((np.maximum(minutes[first], 1e-9), pairs), shape=(n, n))
+        # Same pattern in the same order, so slices of the two line up entry for entry
+        graph.sort_indices()
+        graph_minutes.sort_indices()
+        return graph, graph_minutes
+    
+    @staticmethod
+    def _scaled(locations):
+        """Scale longitude by cos(latitude) so KD-tree distances follow ground distance"""
+        locations = np.asarray(locations, dtype=np.float64).reshape(-1, 2)
+        return np.column_stack([locations[:, 0], locations[:, 1] * np.cos(np.radians(locations[:, 0]))])
+    
+    @classmethod
+    def from_graphml(cls, path, row_cache_size=ROAD_ROW_CACHE_SIZE, landmarks_path=None):
+        """
+        Load a GraphML road extract, e.g. one saved with osmnx.save_graphml
+        
+        Nodes need 'y' (latitude) and 'x' (longitude); edges use 'length' in
+        meters (great-circle distance when missing) and 'maxspeed' or 'highway'
+        for their speed. Undirected graphs get both directions of every edge.
+        
+        Args:
+            path: Path to the GraphML file
+            row_cache_size: Shortest-path rows kept in memory
+            landmarks_path: Landmark file, defaults to the extract's path plus
+                            LANDMARKS_SUFFIX; '' keeps the landmarks in memory only
+        
+        Returns:
+            RoadNetwork instance
+        """
+        root = ET.parse(path).getroot()
+        keys = {key.get('id'): key.get('attr.name') for key in root.iter(f'{GRAPHML_NS}key')}
+        graph = root.find(f'{GRAPHML_NS}graph')
+        if graph is None:
+            raise ValueError(f"No graph in {path}")
+        undirected = graph.get('edgedefault') == 'undirected'
+        
+        def attributes(element):
+            return {keys.get(data.get('key'), data.get('key')): data.text for data in element.findall(f'{GRAPHML_NS}data')}
+        
+        node_ids, coordinates, index = [], [], {}
+        for node in graph.iter(f'{GRAPHML_NS}node'):
+            attrs = attributes(node)
+            index[node.get('id')] = len(node_ids)
+            node_ids.append(node.get('id'))
+            coordinates.append((float(attrs['y']), float(attrs['x'])))
+        coordinates = np.asarray(coordinates, dtype=np.float64).reshape(-1, 2)
+        
+        edges = []
+        for edge in graph.iter(f'{GRAPHML_NS}edge'):
+            attrs = attributes(edge)
+            source, target = index[edge.get('source')], index[edge.get('target')]
+            if attrs.get('length'):
+                length = float(attrs['length']) / 1000
+            else:
+                length = float(haversine_pairs(coordinates[source], coordinates[target])[0])
+            speed = parse_speed(attrs.get('maxspeed'), attrs.get('highway'))
+            edges.append((source, target, length, speed))
+            if undirected or str(edge.get('directed', '')).lower() == 'false':
+                edges.append((target, source, length, speed))
+        
+        if landmarks_path is None:
+            landmarks_path = path + LANDMARKS_SUFFIX
+        return cls(node_ids, coordinates, edges, row_cache_size, landmarks_path=landmarks_path or None)
+    
+    def _signature(self, landmark_count):
+        """Digest of the graph and landmark count, so a landmark file saved for another extract is ignored"""
+        digest = hashlib.sha1(str(landmark_count).encode())
+        for array in (self.coordinates, self.graph.indptr, self.graph.indices, self.graph.data):
+            digest.update(np.ascontiguousarray(array).tobytes())
+        return digest.hexdigest()
+    
+    def _load_landmarks(self, count, path):
+        """
+        Load the landmark distances saved for this graph, or select and save them
+        
+        Returns:
+            Tuple of (landmark nodes, distances from each landmark, distances to each landmark)
+        """
+        signature = self._signature(count)
+        if path and os.path.exists(path):
+            try:
+                with np.load(path) as saved:
+                    if str(saved['signature']) == signature:
+                        logger.info(f"Loaded road network landmarks from {path}")
+                        return saved['landmarks'], saved['from_landmarks'], saved['to_landmarks']
+                logger.info(f"Road network changed since {path} was saved, selecting new landmarks")
+            except Exception as e:
+                logger.error(f"Error loading road network landmarks from {path}: {e}")
+        
+        landmarks, from_landmarks, to_landmarks = self._select_landmarks(count)
+        if path:
+            try:
+                tmp_path = path + '.tmp'
+                with open(tmp_path, 'wb') as f:
+                    np.savez(f, signature=signature, landmarks=landmarks,
+                             from_landmarks=from_landmarks, to_landmarks=to_landmarks)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                logger.warning(f"Could not save road network landmarks to {path}: {e}")
+        return landmarks, from_landmarks, to_landmarks
+    
+    def _select_landmarks(self, count):
+        """
+        Pick landmarks by farthest-point selection and search from and to each
+        
+        Returns:
+            Tuple of (landmark nodes, (k, n) distances from each landmark, (k, n) distances to each landmark)
+        """
+        n = len(self.node_ids)
+        landmarks, from_landmarks, to_landmarks = [], [], []
+        if count > 0 and len(self.snap_nodes):
+            reverse = self.graph.T.tocsr()
+            # The first landmark is the node farthest from an arbitrary one, each
+            # next one the node farthest from the landmarks picked so far
+            closest = dijkstra(self.graph, directed=True, indices=int(self.snap_nodes[0]))
+            for _ in range(min(count, len(self.snap_nodes))):
+                landmark = int(self.snap_nodes[np.argmax(closest[self.snap_nodes])])
+                if landmark in landmarks:
+                    break
+                landmarks.append(landmark)
+                from_landmarks.append(dijkstra(self.graph, directed=True, indices=landmark))
+                to_landmarks.append(dijkstra(reverse, directed=True, indices=landmark))
+                closest = from_landmarks[-1] if len(landmarks) == 1 else np.minimum(closest, from_landmarks[-1])
+        return (np.array(landmarks, dtype=np.int64),
+                np.array(from_landmarks, dtype=np.float64).reshape(-1, n),
+                np.array(to_landmarks, dtype=np.float64).reshape(-1, n))
+    
+    def lower_bounds(self, sources, targets):
+        """
+        Landmark lower bounds on the road distance between nodes
+        
+        By the triangle inequality d(s, t) >= d(L, t) - d(L, s) and
+        d(s, t) >= d(s, L) - d(t, L) for every landmark L.
+        
+        Args:
+            sources: Source node indices
+            targets: Target node indices
+        
+        Returns:
+            (len(sources), len(targets)) array of lower bounds in km
+        """
+        sources, targets = np.asarray(sources, dtype=np.int64), np.asarray(targets, dtype=np.int64)
+        bounds = np.zeros((len(sources), len(targets)))
+        if len(self.landmarks) == 0:
+            return bounds
+        with np.errstate(invalid='ignore'):
+            forward = self.from_landmarks[:, targets][:, None, :] - self.from_landmarks[:, sources][:, :, None]
+            backward = self.to_landmarks[:, sources][:, :, None] - self.to_landmarks[:, targets][:, None, :]
+            bounds = np.maximum(bounds, np.maximum(forward.max(axis=0), backward.max(axis=0)))
+        # Pairs the landmarks know nothing about (both ends unreachable) keep a bound of zero
+        bounds[np.isnan(bounds)] = 0.0
+        return bounds
+    
+    def snap(self, locations):
+        """
+        Nearest connected road node of each location
+        
+        Args:
+            locations: List of (latitude, longitude) tuples
+        
+        Returns:
+            Tuple of (node indices, access distances in km from each location to its node)
+        """
+        if self.tree is None:
+            raise ValueError("Road network has no nodes")
+        locations = np.asarray(locations, dtype=np.float64).reshape(-1, 2)
+        _, nearest = self.tree.query(self._scaled(locations))
+        nodes = self.snap_nodes[nearest]
+        access = haversine_pairs(locations, self.coordinates[nodes])
+        return nodes, access
+    
+    @staticmethod
+    def _path_minutes(predecessors, minutes):
+        """
+        Minutes along the paths of shortest-path trees
+        
+        Args:
+            predecessors: (sources, nodes) predecessor array from scipy's dijkstra, negative for none
+            minutes: CSR matrix of edge minutes over the same nodes
+        
+        Returns:
+            (sources, nodes) array of minutes from each tree's root
+        """
+        shape = np.shape(predecessors)
+        parents = np.asarray(predecessors, dtype=np.int64).ravel()
+        active = np.flatnonzero(parents >= 0)
+        children = active % shape[1]
+        totals = np.zeros(parents.size)
+        if len(active):
+            totals[active] = np.asarray(minutes[parents[active], children]).ravel()
+        # Work on flat positions; each pointer-jumping round doubles the stretch
+        # of path already summed into a node
+        parents[active] += active - children
+        while len(active):
+            ancestors = parents[active]
+            totals[active] += totals[ancestors]
+            parents[active] = parents[ancestors]
+            active = active[parents[active] >= 0]
+        return totals.reshape(shape)
+    
+    def shortest_rows(self, nodes):
+        """
+        Shortest-path rows from each node to every node of the network
+        
+        Args:
+            nodes: Source node indices
+        
+        Returns:
+            Dictionary of node index -> (2, n) float32 array of km and the minutes along those paths
+        """
+        rows = {}
+        with self.lock:
+            for node in set(int(node) for node in nodes):
+                if node in self.rows:
+                    self.rows.move_to_end(node)
+                    rows[node] = self.rows[node]
+                    self.hits += 1
+            missing = [int(node) for node in dict.fromkeys(int(node) for node in nodes) if int(node) not in rows]
+            self.misses += len(missing)
+        
+        for start in range(0, len(missing), DIJKSTRA_CHUNK):
+            chunk = missing[start:start + DIJKSTRA_CHUNK]
+            km, predecessors = dijkstra(self.graph, directed=True, indices=chunk, return_predecessors=True)
+            minutes = self._path_minutes(predecessors, self.minutes)
+            for position, node in enumerate(chunk):
+                rows[node] = np.vstack([km[position], minutes[position]]).astype(np.float32)
+        
+        if missing and self.row_cache_size > 0:
+            with self.lock:
+                for node in missing:
+                    self.rows[node] = rows[node]
+                    self.rows.move_to_end(node)
+                while len(self.rows) > self.row_cache_size:
+                    self.rows.popitem(last=False)
+        return rows
+    
+    def matrices(self, locations, speed_km_per_hour=None):
+        """
+        Many-to-many road distances and the travel minutes along the same paths
+        
+        Each location is snapped to its nearest road node; the access legs to and
+        from the network are added at the given speed (or the default road speed).
+        
+        Args:
+            locations: List of (latitude, longitude) tuples
+            speed_km_per_hour: Speed of access legs and unreachable pairs
+        
+        Returns:
+            Tuple of two (n, n) numpy arrays, km and minutes; directed, so one-way
+            streets can make them asymmetric
+        """
+        locations = np.asarray(locations, dtype=np.float64).reshape(-1, 2)
+        if len(locations) == 0:
+            return np.zeros((0, 0)), np.zeros((0, 0))
+        
+        nodes, access = self.snap(locations)
+        unique, inverse = np.unique(nodes, return_inverse=True)
+        km, minutes = self._node_matrices(unique)
+        km, minutes = km[inverse][:, inverse], minutes[inverse][:, inverse]
+        
+        to_minutes = 60 / (speed_km_per_hour or DEFAULT_ROAD_SPEED_KM_PER_HOUR)
+        access = access[:, None] + access[None, :]
+        km += access
+        minutes += access * to_minutes
+        
+        unreachable = ~np.isfinite(km)
+        if unreachable.any():
+            detour = haversine_matrix(locations) * DETOUR_FACTOR
+            km[unreachable] = detour[unreachable]
+            minutes[unreachable] = detour[unreachable] * to_minutes
+        np.fill_diagonal(km, 0)
+        np.fill_diagonal(minutes, 0)
+        return km, minutes
+    
+    def matrix(self, locations, weight='distance', speed_km_per_hour=None):
+        """
+        Many-to-many road matrix between locations, see matrices
+        
+        Args:
+            locations: List of (latitude, longitude) tuples
+            weight: 'distance' for km, 'time' for minutes along the shortest paths
+            speed_km_per_hour: Speed of access legs and unreachable pairs
+        
+        Returns:
+            2D numpy array of shape (n, n)
+        """
+        if weight not in ('distance', 'time'):
+            raise ValueError(f"Unknown road weight: {weight}")
+        km, minutes = self.matrices(locations, speed_km_per_hour)
+        return km if weight == 'distance' else minutes
+    
+    def _region(self, nodes):
+        """Nodes in the bounding box of nodes grown by the region margin, or None if that is most of the network"""
+        lower, upper = self.coordinates[nodes].min(axis=0), self.coordinates[nodes].max(axis=0)
+        span_km = float(haversine_pairs(lower, upper)[0])
+        margin_deg = max(REGION_MARGIN_KM, span_km / 4) / 111.0
+        margin = np.array([margin_deg, margin_deg / max(np.cos(np.radians(upper[0])), 0.1)])
+        inside = np.all((self.coordinates >= lower - margin) & (self.coordinates <= upper + margin), axis=1)
+        region = np.flatnonzero(inside)
+        return region if len(region) <= REGION_MAX_SHARE * len(self.node_ids) else None
+    
+    def _node_matrices(self, nodes):
+        """
+        Shortest distances between distinct network nodes, and the minutes along those paths
+        
+        The region search is exact for a source s when, for every target t, no
+        path leaving the region can be shorter. Such a path crosses a boundary
+        edge (u, w) with u inside, so it is at least
+        d_region(s, u) + length(u, w) + lower_bound(w, t). Sources where that
+        exit bound is below an in-region distance are searched on the whole network.
+        
+        Returns:
+            Tuple of (km, minutes) arrays of shape (len(nodes), len(nodes))
+        """
+        region = self._region(nodes)
+        if region is None:
+            exact = np.zeros(len(nodes), dtype=bool)
+            km, minutes = np.empty((len(nodes), len(nodes))), np.empty((len(nodes), len(nodes)))
+        else:
+            position = np.full(len(self.node_ids), -1, dtype=np.int64)
+            position[region] = np.arange(len(region))
+            local = position[nodes]
+            
+            # Edges out of the region's nodes, split into inner edges and boundary crossings
+            block, block_minutes = self.graph[region].tocoo(), self.minutes[region].tocoo()
+            inner = position[block.col] >= 0
+            shape = (len(region), len(region))
+            subgraph = csr_matrix((block.data[inner], (block.row[inner], position[block.col[inner]])), shape=shape)
+            subgraph_minutes = csr_matrix((block_minutes.data[inner],
+                                           (block.row[inner], position[block.col[inner]])), shape=shape)
+            
+            distances, predecessors = dijkstra(subgraph, directed=True, indices=local, return_predecessors=True)
+            km = distances[:, local]
+            minutes = self._path_minutes(predecessors, subgraph_minutes)[:, local]
+            
+            exits = ~inner
+            if exits.any():
+                # Shortest way from each source out of the region through each boundary edge,
+                # plus the landmark bound on the rest of the way to each target
+                leave = distances[:, block.row[exits]] + block.data[exits]
+                remaining = self.lower_bounds(block.col[exits], nodes)
+                exit_bound = np.vstack([np.min(row[:, None] + remaining, axis=0) for row in leave])
+                exact = np.all(km <= exit_bound, axis=1)
+            else:
+                exact = np.ones(len(nodes), dtype=bool)
+            with self.lock:
+                self.region_searches += 1
+        
+        inexact = np.flatnonzero(~exact)
+        if len(inexact):
+            rows = self.shortest_rows(nodes[inexact])
+            with self.lock:
+                self.network_searches += len(inexact)
+            for position, node in zip(inexact, nodes[inexact]):
+                km[position] = rows[int(node)][0, nodes]
+                minutes[position] = rows[int(node)][1, nodes]
+        return km, minutes
+    
+    def distance_matrix(self, locations):
+        """
+        Road distance matrix in km, symmetrized for the route heuristics
+        
+        2-opt and Or-opt reverse route segments and assume d(i, j) == d(j, i), so
+        the two directions of each pair are averaged.
+        
+        Args:
+            locations: List of (latitude, longitude) tuples
+        
+        Returns:
+            2D numpy array of distances in km
+        """
+        return self.route_matrices(locations)[0]
+    
+    def route_matrices(self, locations):
+        """
+        Symmetrized road distances and directed travel minutes from one search per location
+        
+        Args:
+            locations: List of (latitude, longitude) tuples
+        
+        Returns:
+            Tuple of (distance matrix in km as in distance_matrix, travel minutes
+            along the shortest paths at each road's speed)
+        """
+        km, minutes = self.matrices(locations)
+        return (km + km.T) / 2, minutes
+    
+    def travel_time_matrix(self, locations, speed_km_per_hour=None):
+        """
+        Directed travel time matrix in minutes along the shortest road paths
+        
+        Args:
+            locations: List of (latitude, longitude) tuples
+            speed_km_per_hour: Travel at one speed along the shortest road path (a
+                               postman riding below the speed limits); None uses each road's speed
+        
+        Returns:
+            2D numpy array of travel minutes
+        """
+        if speed_km_per_hour is None:
+            return self.matrix(locations, 'time')
+        return self.matrix(locations, 'distance') / speed_km_per_hour * 60
+    
+    def get_stats(self):
+        """
+        Get network and row cache statistics
+        
+        Returns:
+            Dictionary with node, edge and cache counts
+        """
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'nodes': len(self.node_ids),
+                'edges': int(self.graph.nnz),
+                'connected_nodes': int(len(self.snap_nodes)),
+                'landmarks': int(len(self.landmarks)),
+                'region_searches': self.region_searches,
+                'network_searches': self.network_searches,
+                'cached_rows': len(self.rows),
+                'row_cache_size': self.row_cache_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+def get_road_network():
+    """
+    Get the shared road network loaded from ROAD_NETWORK_PATH
+    
+    Returns:
+        RoadNetwork instance, or None if no road extract is configured or it failed to load
+    """
+    global _road_network
+    with _road_network_lock:
+        if _road_network is None and ROAD_NETWORK_PATH:
+            try:
+                _road_network = RoadNetwork.from_graphml(ROAD_NETWORK_PATH)
+            except Exception as e:
+                logger.error(f"Error loading road network from {ROAD_NETWORK_PATH}: {e}")
+        return _road_network
+
+def set_road_network(network):
+    """
+    Replace the shared road network, e.g. with one loaded from another file
+    
+    Args:
+        network: RoadNetwork instance or None
+    """
+    global _road_network
+    with _road_network_lock:
+        _road_network = network
@@ -0,0 +1,117 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger('route_cache')
+
+# Constants
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_TTL_SECONDS = 300
+
+def fingerprint(payload):
+    """
+    Canonical hash of a route request
+    
+    Args:
+        payload: JSON-serializable request description
+    
+    Returns:
+        Hex SHA-256 digest that ignores key order and whitespace
+    """
+    canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+class RouteResultCache:
+    """
+    In-memory cache of serialized route responses with TTL and LRU eviction
+    
+    Entries hold the response body as bytes, so a hit is served without
+    re-running clustering, routing or JSON encoding.
+    """
+    
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl_seconds=DEFAULT_TTL_SECONDS):
+        """
+        Initialize the cache
+        
+        Args:
+            max_entries: Maximum number of cached responses
+            ttl_seconds: Seconds a response stays valid
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key):
+        """
+        Look up a cached response
+        
+        Args:
+            key: Request fingerprint
+        
+        Returns:
+            Tuple of (body bytes, age in seconds), or None on a miss
+        """
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or now - entry[1] > self.ttl_seconds:
+                if entry is not None:
+                    del self.entries[key]
+                self.misses += 1
+                return None
+            
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0], now - entry[1]
+    
+    def put(self, key, body):
+        """
+        Store a response body, evicting the least recently used entries when full
+        
+        Args:
+            key: Request fingerprint
+            body: Serialized response bytes
+        """
+        with self.lock:
+            self.entries[key] = (body, time.monotonic())
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+    
+    def clear(self):
+        """Drop every cached response"""
+        with self.lock:
+            self.entries.clear()
+    
+    def get_stats(self):
+        """
+        Get cache statistics
+        
+        Returns:
+            Dictionary with size, hit rate and eviction counts
+        """
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+                'evictions': self.evictions
+            }
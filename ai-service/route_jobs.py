@@ -0,0 +1,229 @@
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger('route_jobs')
+
+# Constants
+DEFAULT_MAX_WORKERS = 2
+DEFAULT_TTL_SECONDS = 3600
+JOB_STATUSES = ('queued', 'running', 'succeeded', 'failed', 'cancelled')
+FINISHED_STATUSES = ('succeeded', 'failed', 'cancelled')
+
+class JobCancelled(Exception):
+    """Raised from a progress report once the job has been cancelled"""
+
+class RouteJob:
+    """
+    One submitted route optimization and its progress
+    
+    The solver reports progress through report_progress(), which also raises
+    JobCancelled once cancel() has been called, so work stops at the next
+    finished cluster.
+    """
+    
+    def __init__(self, job_id):
+        """
+        Initialize the job
+        
+        Args:
+            job_id: Unique job ID
+        """
+        self.job_id = job_id
+        self.status = 'queued'
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.progress = {'routes_done': 0, 'routes_total': None, 'distance_km': 0.0}
+        self.result = None
+        self.error = None
+        self.cancel_event = threading.Event()
+        self.future = None
+        self.lock = threading.Lock()
+    
+    def report_progress(self, done, total, route):
+        """
+        Record a finished route
+        
+        Args:
+            done: Routes finished so far
+            total: Routes in the plan
+            route: The finished route dictionary
+        """
+        with self.lock:
+            self.progress = {
+                'routes_done': done,
+                'routes_total': total,
+                'distance_km': round(self.progress['distance_km'] + route['statistics']['total_distance_km'], 2)
+            }
+        if self.cancel_event.is_set():
+            raise JobCancelled(f"Job {self.job_id} cancelled")
+    
+    def to_dict(self):
+        """
+        Describe the job without its result
+        
+        Returns:
+            Dictionary with status, timestamps and progress
+        """
+        with self.lock:
+            info = {
+                'job_id': self.job_id,
+                'status': self.status,
+                'created_at': self.created_at,
+                'started_at': self.started_at,
+                'finished_at': self.finished_at,
+                'progress': dict(self.progress)
+            }
+            if self.started_at is not None:
+                info['elapsed_ms'] = round(((self.finished_at or time.time()) - self.started_at) * 1000, 2)
+            if self.error is not None:
+                info['error'] = self.error
+        return info
+
+class RouteJobQueue:
+    """
+    Background route optimization jobs on a local thread pool
+    
+    Jobs and their results live in memory; finished jobs are dropped
+    ttl_seconds after they finish.
+    """
+    
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS, ttl_seconds=DEFAULT_TTL_SECONDS):
+        """
+        Initialize the queue
+        
+        Args:
+            max_workers: Jobs run at the same time
+            ttl_seconds: Seconds a finished job and its result are kept
+        """
+        self.max_workers = max_workers
+        self.ttl_seconds = ttl_seconds
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='route-job')
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.expired = 0
+    
+    def submit(self, func, *args):
+        """
+        Queue a job
+        
+        Args:
+            func: Callable run as func(*args, progress=job.report_progress); returns
+                  a result dictionary, with an 'error' key on failure
+            *args: Positional arguments for func
+        
+        Returns:
+            RouteJob instance
+        """
+        self.expire()
+        job = RouteJob(uuid.uuid4().hex)
+        with self.lock:
+            self.jobs[job.job_id] = job
+        job.future = self.executor.submit(self._run, job, func, args)
+        return job
+    
+    def _run(self, job, func, args):
+        """Run a job and record its outcome"""
+        with job.lock:
+            if job.cancel_event.is_set():
+                return
+            job.status = 'running'
+            job.started_at = time.time()
+        
+        try:
+            result = func(*args, progress=job.report_progress)
+            error = result.get('error') if isinstance(result, dict) else None
+        except Exception as e:
+            result, error = None, str(e)
+        
+        with job.lock:
+            job.finished_at = time.time()
+            if job.cancel_event.is_set():
+                job.status = 'cancelled'
+            elif error is not None:
+                job.status = 'failed'
+                job.error = error
+            else:
+                job.status = 'succeeded'
+                job.result = result
+        logger.info(f"Route job {job.job_id} {job.status} in {(job.finished_at - job.started_at) * 1000:.0f} ms")
+    
+    def get(self, job_id):
+        """
+        Look up a job
+        
+        Args:
+            job_id: Job ID returned by submit()
+        
+        Returns:
+            RouteJob instance, or None if unknown or expired
+        """
+        self.expire()
+        with self.lock:
+            return self.jobs.get(job_id)
+    
+    def cancel(self, job_id):
+        """
+        Cancel a queued or running job
+        
+        A queued job never starts; a running job stops after its current cluster.
+        
+        Args:
+            job_id: Job ID returned by submit()
+        
+        Returns:
+            RouteJob instance, or None if unknown or expired
+        """
+        job = self.get(job_id)
+        if job is None:
+            return None
+        with job.lock:
+            if job.status in FINISHED_STATUSES:
+                return job
+            job.cancel_event.set()
+            if job.status == 'queued':
+                job.status = 'cancelled'
+                job.finished_at = time.time()
+                if job.future is not None:
+                    job.future.cancel()
+        return job
+    
+    def expire(self):
+        """Drop finished jobs older than the TTL"""
+        cutoff = time.time() - self.ttl_seconds
+        with self.lock:
+            stale = [job_id for job_id, job in self.jobs.items()
+                     if job.finished_at is not None and job.finished_at < cutoff]
+            for job_id in stale:
+                del self.jobs[job_id]
+            self.expired += len(stale)
+    
+    def get_stats(self):
+        """
+        Get queue statistics
+        
+        Returns:
+            Dictionary with job counts per status
+        """
+        self.expire()
+        with self.lock:
+            jobs = list(self.jobs.values())
+        counts = {status: 0 for status in JOB_STATUSES}
+        for job in jobs:
+            counts[job.status] += 1
+        return {
+            'jobs': len(jobs),
+            'by_status': counts,
+            'max_workers': self.max_workers,
+            'ttl_seconds': self.ttl_seconds,
+            'expired': self.expired
+        }
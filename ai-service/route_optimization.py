@@ -1,13 +1,32 @@
 import numpy as np
 import pandas as pd
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
-from haversine import haversine
 import logging
 import json
+import math
 import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime, timedelta
-from sklearn.cluster import KMeans
+from sklearn.cluster import KMeans, MiniBatchKMeans, kmeans_plusplus
+from scipy.spatial import cKDTree
+from distance_store import DistanceStore, location_key
+from geodesy import EARTH_RADIUS_KM, haversine_matrix, haversine_pairs
+from route_cache import RouteResultCache, fingerprint
+from route_jobs import RouteJobQueue
+from eta_sessions import LONG_POLL_SECONDS, EtaSessionStore
+from road_network import ROAD_NETWORK_PATH, get_road_network
+from speed_tables import get_speed_table
+from solver_registry import solver_registry
+
+try:
+    from ortools.constraint_solver import pywrapcp, routing_enums_pb2
+except ImportError:  # Optional: the 'ortools' solver is only registered when OR-Tools is installed
+    pywrapcp = routing_enums_pb2 = None
 
 # Set up logging
 logging.basicConfig(
@@ -32,315 +51,3989 @@ DELIVERY_TIME_MINUTES = {
     3: 5,   # Educational: 5 minutes
     4: 8    # Government: 8 minutes
 }
+CONSTRUCTION_STRATEGIES = ('nearest_neighbor', 'grid_nearest_neighbor', 'greedy_edge', 'hilbert')
+IMPROVEMENT_STRATEGIES = ('two_opt', 'neighbor_two_opt', 'local_search')
+LOCAL_SEARCH_OPERATORS = ('two_opt', 'or_opt', 'three_opt')
+OR_OPT_MAX_SEGMENT = 3  # Or-opt relocates chains of 1-3 stops
+DEFAULT_TIME_BUDGET_MS = 200  # Local search budget per postman route
+GREEDY_EDGE_CANDIDATES = 10  # Nearest neighbors offered as candidate edges to greedy-edge
+HILBERT_ORDER = 16  # Hilbert curve resolution: 2^16 x 2^16 cells over the bounding box
+DEFAULT_NEIGHBOR_K = 8  # Candidate neighbors per stop for neighbor-list local search
+IMPROVEMENT_EPSILON = 1e-9  # Minimum gain (km) for a move to count as an improvement
+DEFAULT_REPAIR_TIME_BUDGET_MS = 20  # Local repair budget per route touched by an insertion
+REPAIR_OPERATORS = ('two_opt', 'or_opt')
+CLUSTERING_STRATEGIES = ('kmeans', 'minibatch', 'balanced')
+MINIBATCH_BATCH_SIZE = 1024
+PLANNERS = ('flat', 'hierarchical')
+REGION_MAX_DELIVERIES = 1500  # Hierarchical planner splits regions until they are this small
+CLEANUP_MAX_PASSES = 3  # Boundary relocation sweeps after stitching regions
+CLEANUP_TIME_BUDGET_MS = 1000
+BALANCE_MODES = ('deliveries', 'service_time')
+BALANCED_KMEANS_ITERATIONS = 8  # Assignment/centroid rounds for balanced clustering
+BALANCED_CANDIDATES = 16  # Nearest centroids tried per delivery before a full scan
+SERVICE_TIME_TOLERANCE = 1.1  # Allowed service minutes per postman relative to the mean
+MULTI_START_MAX = 64  # Upper bound on starts per route
+MULTI_START_CANDIDATES = 3  # Randomized nearest neighbor picks among this many closest stops
+TIME_WINDOW_MODES = ('soft', 'hard')
+SHIFT_START_TIME = '10:00'  # Start of the first time slot
+SOFT_WINDOW_PENALTY_KM_PER_MINUTE = 0.5  # Detour worth avoiding one minute of lateness
+HARD_WINDOW_PENALTY_KM_PER_MINUTE = 1e6  # Lateness outweighs any detour
+TIME_WINDOW_MAX_EVALUATIONS = 100000  # Simulated candidates per shift when neither a time budget nor a deadline bounds the search
+MATRIX_MODES = ('auto', 'dense', 'sparse')
+SPARSE_MATRIX_THRESHOLD = 2000  # Stops per route above which 'auto' switches to the sparse graph
+DISTANCE_BACKENDS = ('haversine', 'road')  # 'road' needs a GraphML extract at ROAD_NETWORK_PATH
+EXECUTION_MODES = ('serial', 'process')
+DEFAULT_SOLVER = os.environ.get('ROUTE_SOLVER', 'default')  # Solver when a request names none
+OFFICE_SOLVERS = os.environ.get('ROUTE_OFFICE_SOLVERS', '')  # JSON object depot_id -> solver, checked at startup
+ORTOOLS_DEFAULT_TIME_LIMIT_MS = 1000  # Guided local search limit per route without a time budget
+DEFAULT_EXECUTION_MODE = os.environ.get('ROUTE_EXECUTION_MODE', 'serial')
+MAX_ROUTE_WORKERS = max(1, int(os.environ.get('ROUTE_MAX_WORKERS', os.cpu_count() or 1)))
 
-class RouteOptimizer:
-    def __init__(self):
-        self.service_name = "OptiDeliver Route Optimization Service"
+DISTANCE_CACHE_DIR = os.environ.get('DISTANCE_CACHE_DIR', '')  # Directory of the persistent distance store; empty disables it
+DISTANCE_CACHE_CAPACITY = int(os.environ.get('DISTANCE_CACHE_CAPACITY', 4096))
+CLUSTER_CENTROIDS_PATH = os.environ.get('CLUSTER_CENTROIDS_PATH', '')  # Warm-start centroids file; empty keeps them in memory only
+ROUTE_CACHE_TTL_SECONDS = float(os.environ.get('ROUTE_CACHE_TTL_SECONDS', 300))
+ROUTE_CACHE_MAX_ENTRIES = int(os.environ.get('ROUTE_CACHE_MAX_ENTRIES', 256))  # 0 disables the result cache
+ROUTE_JOB_WORKERS = int(os.environ.get('ROUTE_JOB_WORKERS', 2))  # Background route jobs run at once
+ROUTE_JOB_TTL_SECONDS = float(os.environ.get('ROUTE_JOB_TTL_SECONDS', 3600))  # Finished jobs kept for polling
+ROUTE_SYNC_MAX_DELIVERIES = int(os.environ.get('ROUTE_SYNC_MAX_DELIVERIES', 0))  # Larger requests must use /jobs; 0 = no limit
+ETA_SESSION_TTL_SECONDS = float(os.environ.get('ETA_SESSION_TTL_SECONDS', 12 * 3600))  # Idle live ETA sessions are dropped
+STREAM_ENDPOINTS = ('eta_session_stream', 'eta_session_updates')  # Held-open endpoints main.py serves off the API threads
+RESULT_NEUTRAL_OPTIONS = ('execution_mode', 'max_workers', 'deadline_at')  # Left out of the result cache key
+
+# Shared process pool for CPU-bound per-cluster work, created on first use
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+def nearest_neighbor_lists(distance_matrix, k=DEFAULT_NEIGHBOR_K):
+    """
+    Build the k nearest neighbors of every point from a distance matrix
+    
+    Args:
+        distance_matrix: 2D array of distances between points
+        k: Number of neighbors to keep per point
+        
+    Returns:
+        List of neighbor index lists, each sorted by increasing distance
+    """
+    n = distance_matrix.shape[0]
+    k = min(k, n - 1)
+    if k <= 0:
+        return [[] for _ in range(n)]
+    
+    # Mask the diagonal so a point is never its own neighbor
+    masked = np.array(distance_matrix, dtype=np.float64)
+    np.fill_diagonal(masked, np.inf)
+    if k < n - 1:
+        candidates = np.argpartition(masked, k, axis=1)[:, :k]
+    else:
+        candidates = np.tile(np.arange(n), (n, 1))[~np.eye(n, dtype=bool)].reshape(n, n - 1)
     
-    def calculate_distance_matrix(self, locations):
+    order = np.argsort(np.take_along_axis(masked, candidates, axis=1), axis=1, kind='stable')
+    return np.take_along_axis(candidates, order, axis=1).tolist()
+
+def arrival_minutes(locations, service_minutes, speed_km_per_hour=POSTMAN_SPEED_KM_PER_HOUR):
+    """
+    Minutes from departure until arrival at each stop of a path
+    
+    Args:
+        locations: (n + 1, 2) array, start position first, then the stops in visiting order
+        service_minutes: Service time in minutes at each of the n stops
+        speed_km_per_hour: Travel speed
+    
+    Returns:
+        Tuple of (arrival minutes per stop, leg distances in km)
+    """
+    locations = np.asarray(locations, dtype=np.float64).reshape(-1, 2)
+    legs = haversine_pairs(locations[:-1], locations[1:])
+    service_minutes = np.asarray(service_minutes, dtype=np.float64)
+    service_before = np.concatenate(([0.0], np.cumsum(service_minutes)[:-1]))
+    return np.cumsum(legs / speed_km_per_hour * 60) + service_before, legs
+
+def earliest_deadline(*deadlines):
+    """Earliest of several time.perf_counter() deadlines, ignoring None"""
+    deadlines = [deadline for deadline in deadlines if deadline is not None]
+    return min(deadlines) if deadlines else None
+
+class SearchDeadline:
+    """
+    Wall-clock deadline shared by every stage of one request
+    
+    The deadline is a time.time() value, so worker processes can check the
+    same instant; search loops take its time.perf_counter() equivalent from
+    perf_deadline().
+    """
+    
+    def __init__(self, at=None):
         """
-        Calculate distance matrix between all locations using haversine formula
+        Initialize the deadline
         
         Args:
-            locations: List of (latitude, longitude) tuples
-            
+            at: time.time() value at which searching must stop, or None for no deadline
+        """
+        self.at = at
+    
+    @classmethod
+    def from_options(cls, options):
+        """Deadline of a request, see route_options_from_request"""
+        return cls((options or {}).get('deadline_at'))
+    
+    def expired(self):
+        """Whether the deadline has passed"""
+        return self.at is not None and time.time() >= self.at
+    
+    def remaining_ms(self):
+        """Milliseconds left, or None for no deadline"""
+        if self.at is None:
+            return None
+        return max((self.at - time.time()) * 1000, 0.0)
+    
+    def perf_deadline(self, time_budget_ms=None):
+        """
+        time.perf_counter() value at which a search step must stop
+        
+        Args:
+            time_budget_ms: Optional budget of the step, the earlier of the two wins
+        
         Returns:
-            2D numpy array of distances in km
+            perf_counter deadline, or None if neither limit applies
         """
-        n = len(locations)
-        distance_matrix = np.zeros((n, n))
+        now = time.perf_counter()
+        return earliest_deadline(
+            now + time_budget_ms / 1000 if time_budget_ms else None,
+            now + (self.at - time.time()) if self.at is not None else None
+        )
+
+def deadline_report(options, routes):
+    """
+    Summarize how the routes of a plan fared against the request deadline
+    
+    Args:
+        options: Solver settings with deadline_ms
+        routes: Route dictionaries whose improvement statistics carry cut_off
+    
+    Returns:
+        Dictionary with the deadline, whether every search converged and the routes cut off
+    """
+    cut_off = sum(1 for route in routes if route.get('improvement', {}).get('cut_off'))
+    remaining_ms = SearchDeadline.from_options(options).remaining_ms()
+    return {
+        'deadline_ms': options.get('deadline_ms'),
+        'converged': cut_off == 0,
+        'cut_off': cut_off > 0,
+        'routes_cut_off': cut_off,
+        'remaining_ms': round(remaining_ms, 2) if remaining_ms is not None else None
+    }
+
+def multi_start_seeds(options):
+    """
+    Seeds of the starts of a multi-start search
+    
+    Args:
+        options: Solver settings (multi_start, seed)
+    
+    Returns:
+        List of seeds; the first one is the deterministic construction
+    """
+    base_seed = options.get('seed', 0)
+    return [base_seed + k for k in range(options.get('multi_start', 1))]
+
+def multi_start_summary(seeds, lengths, best_seed, cpu_time_ms):
+    """
+    Spread of tour lengths over the starts of a multi-start search
+    
+    Args:
+        seeds: Seeds of the finished starts
+        lengths: Tour length in km of each start
+        best_seed: Seed of the kept tour
+        cpu_time_ms: Summed solve time of all starts
+    
+    Returns:
+        Dictionary with per-start lengths and their min, max, mean and standard deviation
+    """
+    lengths = np.asarray(lengths, dtype=np.float64)
+    return {
+        'starts': len(seeds),
+        'seeds': list(seeds),
+        'lengths_km': [round(float(length), 3) for length in lengths],
+        'best_seed': best_seed,
+        'best_km': round(float(lengths.min()), 3),
+        'worst_km': round(float(lengths.max()), 3),
+        'mean_km': round(float(lengths.mean()), 3),
+        'std_km': round(float(lengths.std()), 3),
+        'first_start_km': round(float(lengths[0]), 3),
+        'cpu_time_ms': round(cpu_time_ms, 2)
+    }
+
+def clock_minutes(value):
+    """
+    Minutes after midnight of an 'HH:MM' time
+    
+    Args:
+        value: Time string such as '10:00'
+    
+    Returns:
+        Minutes after midnight
+    """
+    hours, minutes = map(int, str(value).split(':'))
+    if not (0 <= hours < 24 and 0 <= minutes < 60):
+        raise ValueError(f"Invalid time: {value}")
+    return hours * 60 + minutes
+
+def format_clock(minutes):
+    """Format minutes after midnight as 'HH:MM'"""
+    minutes = int(round(minutes))
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+def time_slot_window(time_slot):
+    """
+    Delivery window of a time slot
+    
+    Args:
+        time_slot: Slot number (1 for TIME_SLOTS[0]) or a slot label such as '12-13'
+    
+    Returns:
+        Tuple of (opening, closing) minutes after midnight, or None for no slot
+    """
+    if time_slot is None or time_slot == '':
+        return None
+    label = str(time_slot)
+    if label.isdigit():
+        slot = int(label)
+        if not 1 <= slot <= len(TIME_SLOTS):
+            raise ValueError(f"Unknown time slot: {time_slot}. Expected 1-{len(TIME_SLOTS)}")
+        label = TIME_SLOTS[slot - 1]
+    try:
+        start, end = (int(hour) for hour in label.split('-'))
+    except ValueError:
+        raise ValueError(f"Unknown time slot: {time_slot}")
+    if not 0 <= start < end <= 24:
+        raise ValueError(f"Unknown time slot: {time_slot}")
+    return start * 60, end * 60
+
+def time_slot_number(time_slot):
+    """Slot number (1 for TIME_SLOTS[0]) of a slot number or label, or None for no or an unknown slot"""
+    try:
+        window = time_slot_window(time_slot)
+    except ValueError:
+        return None
+    return time_slot_at(window[0]) if window else None
+
+def time_slot_at(minute):
+    """Slot number containing a minute after midnight, or None outside every slot"""
+    for slot, label in enumerate(TIME_SLOTS, start=1):
+        start, end = (int(hour) * 60 for hour in label.split('-'))
+        if start <= minute < end:
+            return slot
+    return None
+
+def speed_conditions_from_request(data):
+    """
+    Extract traffic-aware speed settings from a request body
+    
+    Args:
+        data: Parsed JSON request body with optional traffic_aware, traffic and weather
+    
+    Returns:
+        Dictionary with traffic_aware and, when given, traffic and weather codes (1-3)
+    """
+    conditions = {'traffic_aware': bool(data.get('traffic_aware', False))}
+    for key in ('traffic', 'weather'):
+        if data.get(key) is not None:
+            code = int(data[key])
+            if not 1 <= code <= 3:
+                raise ValueError(f"{key} must be between 1 and 3")
+            conditions[key] = code
+            conditions['traffic_aware'] = True
+    if conditions['traffic_aware'] and get_speed_table() is None:
+        raise ValueError("No speed table available, run speed_tables.py or provide Dataset.csv")
+    return conditions
+
+def speed_multipliers(locations, time_slot, options):
+    """
+    Speed multiplier at each location for traffic-aware options
+    
+    Args:
+        locations: List of (latitude, longitude) tuples
+        time_slot: Slot number (or one per location), or None when unknown
+        options: Options with traffic_aware, traffic and weather
+    
+    Returns:
+        float64 array of multipliers, or None when traffic-aware speeds are off
+    """
+    if not options or not options.get('traffic_aware'):
+        return None
+    speed_table = get_speed_table()
+    if speed_table is None:
+        return None
+    return speed_table.location_multipliers(locations, time_slot, options.get('traffic'), options.get('weather'))
+
+def project_coordinates(locations):
+    """
+    Project (latitude, longitude) points onto a local plane in km
+    
+    Uses an equirectangular projection around the mean latitude, which is
+    accurate to well under a percent at city scale.
+    
+    Args:
+        locations: Sequence or (n, 2) array of (latitude, longitude) in degrees
         
-        for i in range(n):
-            for j in range(i+1, n):
-                dist = haversine(locations[i], locations[j])
-                distance_matrix[i, j] = dist
-                distance_matrix[j, i] = dist
+    Returns:
+        (n, 2) numpy array of (x, y) coordinates in km
+    """
+    coords = np.radians(np.asarray(locations, dtype=np.float64).reshape(-1, 2))
+    if len(coords) == 0:
+        return np.zeros((0, 2))
+    cos_lat = np.cos(coords[:, 0].mean())
+    return np.column_stack((coords[:, 1] * cos_lat, coords[:, 0])) * EARTH_RADIUS_KM
+
+def hilbert_index(points, order=HILBERT_ORDER):
+    """
+    Position of each point along a Hilbert space-filling curve
+    
+    Args:
+        points: (n, 2) array of planar coordinates
+        order: Curve resolution, the bounding box is split into 2^order cells per side
         
-        return distance_matrix
+    Returns:
+        numpy array of curve positions (int64)
+    """
+    points = np.asarray(points, dtype=np.float64)
+    side = 1 << order
+    low = points.min(axis=0)
+    extent = max(float((points.max(axis=0) - low).max()), 1e-12)
+    cells = np.clip(((points - low) / extent * (side - 1)).astype(np.int64), 0, side - 1)
+    x = cells[:, 0].copy()
+    y = cells[:, 1].copy()
+    d = np.zeros(len(points), dtype=np.int64)
     
-    def nearest_neighbor_route(self, distance_matrix, start_idx=0):
+    s = side >> 1
+    while s > 0:
+        rx = (x & s) > 0
+        ry = (y & s) > 0
+        d += s * s * ((3 * rx.astype(np.int64)) ^ ry.astype(np.int64))
+        
+        # Rotate the quadrant so the curve stays continuous
+        flip = ~ry & rx
+        x[flip] = side - 1 - x[flip]
+        y[flip] = side - 1 - y[flip]
+        swap = ~ry
+        x[swap], y[swap] = y[swap], x[swap]
+        s >>= 1
+    
+    return d
+
+def open_route_from_cycle(cycle, points, start_idx=0):
+    """
+    Turn a closed tour into an open route that starts at start_idx
+    
+    The longer of the two cycle edges at the start point is dropped, since
+    routes end at the last delivery rather than returning to the depot.
+    
+    Args:
+        cycle: List of indices forming a closed tour
+        points: (n, 2) array of planar coordinates
+        start_idx: Index the route must start from
+        
+    Returns:
+        List of indices representing the route
+    """
+    n = len(cycle)
+    if n <= 2:
+        return [start_idx] + [idx for idx in cycle if idx != start_idx]
+    
+    at = cycle.index(start_idx)
+    forward = cycle[at:] + cycle[:at]
+    prev_gap = np.hypot(*(points[start_idx] - points[forward[-1]]))
+    next_gap = np.hypot(*(points[start_idx] - points[forward[1]]))
+    if prev_gap >= next_gap:
+        return forward
+    return [start_idx] + forward[:0:-1]
+
+class SpatialGrid:
+    """
+    Uniform grid over planar points supporting removal and nearest-point queries
+    
+    Cells are sized to hold about two points each, so a nearest query usually
+    looks at a handful of cells instead of every remaining point.
+    """
+    
+    def __init__(self, points, points_per_cell=2.0):
         """
-        Implement nearest neighbor algorithm for route planning
+        Build the grid
         
         Args:
-            distance_matrix: 2D array of distances between points
-            start_idx: Index of starting point
+            points: (n, 2) array of planar coordinates
+            points_per_cell: Target average occupancy of a cell
+        """
+        self.points = np.asarray(points, dtype=np.float64)
+        n = len(self.points)
+        self.low = self.points.min(axis=0) if n else np.zeros(2)
+        extent = (self.points.max(axis=0) - self.low) if n else np.ones(2)
+        area = max(float(extent[0] * extent[1]), 1e-12)
+        self.cell_size = max(np.sqrt(area * points_per_cell / max(n, 1)), float(extent.max()) / 4096, 1e-9)
+        
+        keys = np.floor((self.points - self.low) / self.cell_size).astype(np.int64)
+        self.xy = self.points.tolist()
+        self.cells = {}
+        for idx, (cx, cy) in enumerate(keys.tolist()):
+            self.cells.setdefault((cx, cy), []).append(idx)
+        self.cell_of = [tuple(key) for key in keys.tolist()]
+        self.size = n
+    
+    def __len__(self):
+        return self.size
+    
+    def remove(self, idx):
+        """Remove a point from the grid"""
+        key = self.cell_of[idx]
+        bucket = self.cells[key]
+        bucket.remove(idx)
+        if not bucket:
+            del self.cells[key]
+        self.size -= 1
+    
+    def nearest(self, x, y):
+        """
+        Find the nearest remaining point to (x, y)
+        
+        Args:
+            x, y: Planar query coordinates
             
         Returns:
-            List of indices representing the route
+            Index of the nearest point, or None if the grid is empty
         """
-        n = distance_matrix.shape[0]
-        unvisited = set(range(n))
-        unvisited.remove(start_idx)
-        route = [start_idx]
-        current = start_idx
+        if not self.size:
+            return None
         
-        while unvisited:
-            next_point = min(unvisited, key=lambda x: distance_matrix[current, x])
-            route.append(next_point)
-            unvisited.remove(next_point)
-            current = next_point
+        xy = self.xy
+        cell = self.cell_size
+        cx = int(np.floor((x - self.low[0]) / cell))
+        cy = int(np.floor((y - self.low[1]) / cell))
+        best = None
+        best_dist = float('inf')
         
-        return route
+        ring = 0
+        while True:
+            # Once a ring would cover more cells than are occupied, scan those directly
+            exhaustive = (2 * ring + 1) ** 2 > 4 * len(self.cells)
+            if exhaustive:
+                keys = list(self.cells)
+            elif ring == 0:
+                keys = [(cx, cy)]
+            else:
+                keys = [(cx + dx, cy - ring) for dx in range(-ring, ring + 1)]
+                keys += [(cx + dx, cy + ring) for dx in range(-ring, ring + 1)]
+                keys += [(cx - ring, cy + dy) for dy in range(-ring + 1, ring)]
+                keys += [(cx + ring, cy + dy) for dy in range(-ring + 1, ring)]
+            
+            for key in keys:
+                for idx in self.cells.get(key, ()):
+                    px, py = xy[idx]
+                    dist = (px - x) ** 2 + (py - y) ** 2
+                    if dist < best_dist or (dist == best_dist and idx < best):
+                        best = idx
+                        best_dist = dist
+            
+            # Points outside the scanned rings are at least ring * cell away
+            if exhaustive or (best is not None and best_dist <= (ring * cell) ** 2):
+                return best
+            ring += 1
+
+def relinked_stops(before, after):
+    """
+    Stops whose predecessor or successor differs between two orders of the same stops
+    
+    Args:
+        before: Route as a list of indices
+        after: Reordered route
+    
+    Returns:
+        Set of stop indices
+    """
+    def links(route):
+        return {node: (route[idx - 1] if idx else None, route[idx + 1] if idx + 1 < len(route) else None)
+                for idx, node in enumerate(route)}
+    
+    old_links = links(before)
+    return {node for node, link in links(after).items() if old_links.get(node) != link}
+
+class SparseDistanceGraph:
+    """
+    k-nearest-neighbor distance graph stored in CSR arrays
+    
+    Only each stop's k nearest neighbors are stored (memory grows as O(n*k));
+    any other distance is computed on demand from the coordinates. Indexing
+    mirrors a dense matrix, so graph[i, j] and graph[i][j] both return km.
+    """
     
-    def two_opt_improvement(self, route, distance_matrix, max_iterations=100):
+    def __init__(self, locations, k=DEFAULT_NEIGHBOR_K):
         """
-        Implement 2-opt algorithm to improve TSP route
+        Build the neighbor graph
         
         Args:
-            route: Initial route
-            distance_matrix: 2D array of distances between points
-            max_iterations: Maximum number of improvement iterations
+            locations: List of (latitude, longitude) tuples
+            k: Number of nearest neighbors stored per stop
+        """
+        coords = np.asarray(locations, dtype=np.float64).reshape(-1, 2)
+        n = len(coords)
+        self.shape = (n, n)
+        self.k = min(k, n - 1) if n > 1 else 0
+        
+        radians = np.radians(coords)
+        self._lat = radians[:, 0].tolist()
+        self._lng = radians[:, 1].tolist()
+        self._cos_lat = np.cos(radians[:, 0]).tolist()
+        
+        if self.k == 0:
+            self.indptr = np.zeros(n + 1, dtype=np.int64)
+            self.indices = np.zeros(0, dtype=np.int32)
+            self.data = np.zeros(0, dtype=np.float32)
+            return
+        
+        # Over-query the planar KD-tree, then keep the k exact haversine nearest
+        # (excluding the point itself) so projection error cannot reorder them
+        query_k = min(n, self.k + 4)
+        points = project_coordinates(coords)
+        _, nbrs = cKDTree(points).query(points, k=query_k)
+        dists = haversine_pairs(np.repeat(coords, query_k, axis=0), coords[nbrs.ravel()]).reshape(n, query_k)
+        dists[nbrs == np.arange(n)[:, np.newaxis]] = np.inf
+        order = np.argsort(dists, axis=1, kind='stable')[:, :self.k]
+        
+        self.indices = np.take_along_axis(nbrs, order, axis=1).ravel().astype(np.int32)
+        self.data = np.take_along_axis(dists, order, axis=1).ravel().astype(np.float32)
+        self.indptr = np.arange(0, n * self.k + 1, self.k, dtype=np.int64)
+    
+    @property
+    def nbytes(self):
+        """Memory held by the CSR arrays"""
+        return int(self.indptr.nbytes + self.indices.nbytes + self.data.nbytes)
+    
+    def distance(self, i, j):
+        """Haversine distance between stops i and j in km"""
+        if i == j:
+            return 0.0
+        d = (math.sin((self._lat[j] - self._lat[i]) * 0.5) ** 2
+             + self._cos_lat[i] * self._cos_lat[j] * math.sin((self._lng[j] - self._lng[i]) * 0.5) ** 2)
+        return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(max(d, 0.0), 1.0)))
+    
+    def neighbors(self, i):
+        """Indices of the stored nearest neighbors of stop i, nearest first"""
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+    
+    def neighbor_lists(self, k=None):
+        """Nearest neighbor lists for every stop, optionally truncated to k"""
+        k = self.k if k is None else min(k, self.k)
+        return self.indices.reshape(-1, self.k)[:, :k].tolist() if self.k else [[] for _ in range(self.shape[0])]
+    
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            return self.distance(int(key[0]), int(key[1]))
+        return _GraphRow(self, int(key))
+
+class _GraphRow:
+    """Row view of a SparseDistanceGraph so graph[i][j] works like a matrix row"""
+    
+    __slots__ = ('graph', 'i')
+    
+    def __init__(self, graph, i):
+        self.graph = graph
+        self.i = i
+    
+    def __getitem__(self, j):
+        return self.graph.distance(self.i, j)
+
+class LocalSearch:
+    """
+    Neighbor-list local search for open routes that start at a fixed depot
+    
+    Moves are scored in O(1) from the edges they add and remove, candidate
+    moves are limited to each stop's k nearest neighbors and don't-look bits
+    skip stops whose neighborhood has not changed since they were last checked.
+    """
+    
+    def __init__(self, distance_matrix, neighbor_k=DEFAULT_NEIGHBOR_K):
+        """
+        Initialize the local search
+        
+        Args:
+            distance_matrix: 2D array of distances between points or a SparseDistanceGraph
+            neighbor_k: Number of nearest neighbors considered per stop
+        """
+        if isinstance(distance_matrix, SparseDistanceGraph):
+            # The graph computes distances on demand through graph[i][j]
+            self.rows = distance_matrix
+            self.neighbors = distance_matrix.neighbor_lists(neighbor_k)
+        else:
+            # Plain lists index much faster than numpy scalars in the move loops
+            self.rows = np.asarray(distance_matrix, dtype=np.float64).tolist()
+            self.neighbors = nearest_neighbor_lists(distance_matrix, neighbor_k)
+    
+    def route_distance(self, route):
+        """Total distance of an open route"""
+        rows = self.rows
+        return sum(rows[route[i]][route[i + 1]] for i in range(len(route) - 1))
+    
+    def two_opt(self, route, deadline=None, focus=None):
+        """
+        Improve a route with delta-evaluated 2-opt moves
+        
+        A move (i, j) reverses route[i+1..j], replacing the edges
+        (route[i], route[i+1]) and (route[j], route[j+1]) with
+        (route[i], route[j]) and (route[i+1], route[j+1]). The first stop never moves.
+        
+        Args:
+            route: List of indices representing the route
+            deadline: Optional time.perf_counter() value at which to stop searching
+            focus: Optional stops to start from; other stops are checked once a move touches them
             
         Returns:
-            Improved route
+            Tuple of (improved route, number of applied moves)
         """
-        best_route = route.copy()
-        improved = True
-        iteration = 0
+        route = list(route)
+        n = len(route)
+        if n < 3:
+            return route, 0
         
-        while improved and iteration < max_iterations:
-            improved = False
-            best_distance = self.calculate_route_distance(best_route, distance_matrix)
+        rows = self.rows
+        neighbors = self.neighbors
+        pos = {node: idx for idx, node in enumerate(route)}
+        queue = deque(route if focus is None else [node for node in route if node in focus])
+        queued = set(queue)
+        moves = 0
+        
+        while queue:
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+            a = queue.popleft()
+            queued.discard(a)
             
-            for i in range(1, len(route) - 2):
-                for j in range(i + 1, len(route) - 1):
-                    new_route = best_route.copy()
-                    # Reverse the route between positions i and j
-                    new_route[i:j+1] = reversed(new_route[i:j+1])
-                    new_distance = self.calculate_route_distance(new_route, distance_matrix)
+            for c in neighbors[a]:
+                pa = pos[a]
+                pc = pos[c]
+                lo, hi = (pa, pc) if pa < pc else (pc, pa)
+                
+                # Both moves that create the edge (a, c): as (route[i], route[j])
+                # or as (route[i+1], route[j+1])
+                applied = False
+                for i, j in ((lo, hi), (lo - 1, hi - 1)):
+                    if i < 0 or j - i < 2:
+                        continue
                     
-                    if new_distance < best_distance:
-                        best_distance = new_distance
-                        best_route = new_route
-                        improved = True
+                    p1 = route[i]
+                    p2 = route[i + 1]
+                    p3 = route[j]
+                    delta = rows[p1][p3] - rows[p1][p2]
+                    p4 = None
+                    if j + 1 < n:
+                        p4 = route[j + 1]
+                        delta += rows[p2][p4] - rows[p3][p4]
+                    
+                    if delta < -IMPROVEMENT_EPSILON:
+                        route[i + 1:j + 1] = route[j:i:-1]
+                        for idx in range(i + 1, j + 1):
+                            pos[route[idx]] = idx
+                        moves += 1
+                        
+                        # Reset the don't-look bits of the touched endpoints
+                        for node in (p1, p2, p3, p4):
+                            if node is not None and node not in queued:
+                                queue.append(node)
+                                queued.add(node)
+                        applied = True
+                        break
+                
+                if applied:
+                    break
+        
+        return route, moves
+    
+    def or_opt(self, route, deadline=None, focus=None):
+        """
+        Improve a route by relocating chains of 1-3 consecutive stops
+        
+        Each chain is tried in both orientations next to the nearest neighbors
+        of its end stops; the best relocation for a chain is applied if it
+        shortens the route.
+        
+        Args:
+            route: List of indices representing the route
+            deadline: Optional time.perf_counter() value at which to stop searching
+            focus: Optional stops to start from; other stops are checked once a move touches them
             
-            iteration += 1
+        Returns:
+            Tuple of (improved route, number of applied moves)
+        """
+        route = list(route)
+        n = len(route)
+        if n < 3:
+            return route, 0
         
-        logger.info(f"Route improved with 2-opt algorithm in {iteration} iterations")
-        return best_route
+        rows = self.rows
+        neighbors = self.neighbors
+        pos = {node: idx for idx, node in enumerate(route)}
+        queue = deque(route[1:] if focus is None else [node for node in route[1:] if node in focus])
+        queued = set(queue)
+        moves = 0
+        
+        while queue:
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+            a = queue.popleft()
+            queued.discard(a)
+            
+            s = pos[a]
+            best = None
+            for length in range(1, OR_OPT_MAX_SEGMENT + 1):
+                e = s + length - 1
+                if e >= n:
+                    break
+                
+                first = route[s]
+                last = route[e]
+                prev = route[s - 1]
+                nxt = route[e + 1] if e + 1 < n else None
+                
+                # Gain from closing the gap left by the chain
+                removal_gain = rows[prev][first]
+                if nxt is not None:
+                    removal_gain += rows[last][nxt] - rows[prev][nxt]
+                
+                for end in (first, last):
+                    for c in neighbors[end]:
+                        pc = pos[c]
+                        if s <= pc <= e:
+                            continue
+                        
+                        # Insert between (route[k], route[k+1]) with c on either side
+                        for k in (pc, pc - 1):
+                            if k < 0 or s - 1 <= k <= e:
+                                continue
+                            u = route[k]
+                            v = route[k + 1] if k + 1 < n else None
+                            
+                            forward = rows[u][first]
+                            backward = rows[u][last]
+                            if v is not None:
+                                forward += rows[last][v] - rows[u][v]
+                                backward += rows[first][v] - rows[u][v]
+                            
+                            for cost, reverse in ((forward, False), (backward, True)):
+                                delta = cost - removal_gain
+                                if delta < -IMPROVEMENT_EPSILON and (best is None or delta < best[0]):
+                                    best = (delta, e, k, reverse)
+            
+            if best is None:
+                continue
+            
+            _, e, k, reverse = best
+            touched = [route[s - 1], route[s], route[e], route[k]]
+            if e + 1 < n:
+                touched.append(route[e + 1])
+            if k + 1 < n:
+                touched.append(route[k + 1])
+            
+            segment = route[s:e + 1]
+            if reverse:
+                segment.reverse()
+            del route[s:e + 1]
+            insert_at = k + 1 if k < s else k + 1 - len(segment)
+            route[insert_at:insert_at] = segment
+            
+            for idx in range(min(s, insert_at), max(e, insert_at + len(segment) - 1) + 1):
+                pos[route[idx]] = idx
+            moves += 1
+            
+            for node in touched:
+                if node != route[0] and node not in queued:
+                    queue.append(node)
+                    queued.add(node)
+        
+        return route, moves
     
-    def calculate_route_distance(self, route, distance_matrix):
+    def three_opt(self, route, deadline=None, focus=None):
         """
-        Calculate total distance of a route
+        Improve a route with segment-insertion 3-opt moves
+        
+        A move swaps two adjacent segments without reversing them:
+        a-[b..c]-[d..e]-f becomes a-[d..e]-[b..c]-f, which relocates
+        chains of any length in O(1) per evaluated candidate.
         
         Args:
             route: List of indices representing the route
-            distance_matrix: 2D array of distances between points
+            deadline: Optional time.perf_counter() value at which to stop searching
+            focus: Optional stops to start from; other stops are checked once a move touches them
             
         Returns:
-            Total distance in km
+            Tuple of (improved route, number of applied moves)
         """
-        total_distance = 0
-        for i in range(len(route) - 1):
-            total_distance += distance_matrix[route[i], route[i+1]]
-        return total_distance
+        route = list(route)
+        n = len(route)
+        if n < 4:
+            return route, 0
+        
+        rows = self.rows
+        neighbors = self.neighbors
+        pos = {node: idx for idx, node in enumerate(route)}
+        queue = deque(route if focus is None else [node for node in route if node in focus])
+        queued = set(queue)
+        moves = 0
+        
+        while queue:
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+            a = queue.popleft()
+            queued.discard(a)
+            
+            i = pos[a]
+            if i + 2 >= n:
+                continue
+            b = route[i + 1]
+            
+            applied = None
+            for d in neighbors[a]:
+                j = pos[d]
+                if j < i + 2:
+                    continue
+                c = route[j - 1]
+                partial = rows[a][d] - rows[a][b] - rows[c][d]
+                
+                # The moved segment [d..e] either runs to the end of the route
+                # or ends just before a neighbor f of c
+                candidates = [(n - 1, None)]
+                for f in neighbors[c]:
+                    pf = pos[f]
+                    if pf > j:
+                        candidates.append((pf - 1, f))
+                
+                for k, f in candidates:
+                    e = route[k]
+                    delta = partial + rows[e][b]
+                    if f is not None:
+                        delta += rows[c][f] - rows[e][f]
+                    if delta < -IMPROVEMENT_EPSILON:
+                        applied = (j, k, (a, b, c, d, e, f))
+                        break
+                
+                if applied:
+                    break
+            
+            if applied is None:
+                continue
+            
+            j, k, touched = applied
+            route[i + 1:k + 1] = route[j:k + 1] + route[i + 1:j]
+            for idx in range(i + 1, k + 1):
+                pos[route[idx]] = idx
+            moves += 1
+            
+            for node in touched:
+                if node is not None and node not in queued:
+                    queue.append(node)
+                    queued.add(node)
+        
+        return route, moves
     
-    def cluster_deliveries(self, deliveries, num_clusters):
+    def run(self, route, operators=LOCAL_SEARCH_OPERATORS, time_budget_ms=None, deadline=None, focus=None):
         """
-        Cluster deliveries geographically to assign to different postmen
+        Run the local search operators in turn until none improves or time runs out
+        
+        With focus, each operator only starts from the given stops and from stops
+        whose neighbors in the route changed since it last ran, so a route that
+        was optimized before and then edited locally costs work near the edits.
         
         Args:
-            deliveries: List of delivery points with coordinates
-            num_clusters: Number of clusters (postmen)
+            route: Initial route
+            operators: Names of the operators to apply, in order
+            time_budget_ms: Optional wall-clock budget in milliseconds
+            deadline: Optional time.perf_counter() value at which to stop, whichever comes first
+            focus: Optional stops whose neighborhood changed; all stops are checked by default
             
         Returns:
-            List of delivery clusters
+            Tuple of (improved route, statistics dictionary)
         """
-        if len(deliveries) <= num_clusters:
-            # If we have fewer deliveries than clusters, assign one delivery per cluster
-            return [[delivery] for delivery in deliveries[:num_clusters]]
+        for name in operators:
+            if name not in LOCAL_SEARCH_OPERATORS:
+                raise ValueError(f"Unknown local search operator: {name}")
         
-        # Extract coordinates
-        coordinates = np.array([[d['latitude'], d['longitude']] for d in deliveries])
+        start = time.perf_counter()
+        deadline = earliest_deadline(start + time_budget_ms / 1000 if time_budget_ms else None, deadline)
+        initial_distance = self.route_distance(route)
+        move_counts = {name: 0 for name in operators}
+        converged = False
+        pending = None if focus is None else {name: set(focus) for name in operators}
         
-        # Perform K-means clustering
-        kmeans = KMeans(n_clusters=num_clusters, random_state=42)
-        clusters = kmeans.fit_predict(coordinates)
+        while True:
+            improved = False
+            for name in operators:
+                if pending is None:
+                    route, moves = getattr(self, name)(route, deadline)
+                else:
+                    previous = route
+                    route, moves = getattr(self, name)(route, deadline, pending[name])
+                    pending[name] = set()
+                    if moves:
+                        touched = relinked_stops(previous, route)
+                        for other in operators:
+                            pending[other] |= touched
+                move_counts[name] += moves
+                improved = improved or moves > 0
+                if deadline is not None and time.perf_counter() >= deadline:
+                    break
+            
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+            if not improved:
+                converged = True
+                break
         
-        # Group deliveries by cluster
-        clustered_deliveries = [[] for _ in range(num_clusters)]
-        for i, delivery in enumerate(deliveries):
-            cluster_idx = clusters[i]
-            clustered_deliveries[cluster_idx].append(delivery)
+        time_used_ms = (time.perf_counter() - start) * 1000
+        final_distance = self.route_distance(route)
+        
+        stats = {
+            'operators': list(operators),
+            'moves': move_counts,
+            'time_budget_ms': time_budget_ms,
+            'time_used_ms': round(time_used_ms, 2),
+            'budget_used_pct': round(min(time_used_ms / time_budget_ms, 1.0) * 100, 1) if time_budget_ms else None,
+            'converged': converged,
+            'initial_distance_km': round(initial_distance, 3),
+            'final_distance_km': round(final_distance, 3),
+            'distance_saved_km': round(initial_distance - final_distance, 3)
+        }
+        return route, stats
+
+class TimeWindowSearch:
+    """
+    Sequencing of one postman's shift with delivery windows and service times
+    
+    A postman who arrives before a window opens waits; service that starts
+    after the window closes counts as late minutes, which cost
+    penalty_per_minute km each. Moves are 2-opt reversals and relocations of
+    1-3 stop chains. The distance change of a move is known in O(1) from its
+    edges and lateness before the first changed position cannot shrink, so
+    only moves that can still beat the current cost are re-simulated, from
+    the first changed position only.
+    """
+    
+    def __init__(self, distance_matrix, opens, closes, service_minutes, start_minute,
+                 penalty_per_minute=SOFT_WINDOW_PENALTY_KM_PER_MINUTE,
+                 speed_km_per_hour=POSTMAN_SPEED_KM_PER_HOUR, travel_minutes=None, multipliers=None):
+        """
+        Initialize the search
+        
+        Args:
+            distance_matrix: 2D array of distances between points (index 0 is the start) or a SparseDistanceGraph
+            opens: Window opening minute per point
+            closes: Window closing minute per point (math.inf for no window)
+            service_minutes: Service time in minutes per point
+            start_minute: Minute after midnight the postman leaves the start point
+            penalty_per_minute: Cost in km of one late minute
+            speed_km_per_hour: Travel speed when travel_minutes is not given
+            travel_minutes: Optional 2D array of travel minutes between points (road backend)
+            multipliers: Optional speed multiplier per point; each leg runs at the mean of its two ends
+        """
+        sparse = isinstance(distance_matrix, SparseDistanceGraph)
+        if sparse:
+            self.rows = distance_matrix
+        else:
+            self.rows = np.asarray(distance_matrix, dtype=np.float64).tolist()
+        self.opens = [float(value) for value in opens]
+        self.closes = [float(value) for value in closes]
+        self.service = [float(value) for value in service_minutes]
+        self.start_minute = float(start_minute)
+        self.penalty = penalty_per_minute
+        self.minutes_per_km = 60.0 / speed_km_per_hour
+        
+        # Leg minutes as estimate_delivery_time prices them; None drives every leg at minutes_per_km
+        self.minutes = None
+        if travel_minutes is not None or multipliers is not None:
+            if sparse:
+                raise ValueError("Travel minutes and speed multipliers need a dense distance matrix")
+            minutes = (np.asarray(travel_minutes, dtype=np.float64) if travel_minutes is not None
+                       else np.asarray(distance_matrix, dtype=np.float64) * self.minutes_per_km)
+            if multipliers is not None:
+                multipliers = np.asarray(multipliers, dtype=np.float64)
+                minutes = minutes / ((multipliers[:, np.newaxis] + multipliers[np.newaxis, :]) / 2)
+            self.minutes = minutes.tolist()
+    
+    def leg_minutes(self, i, j):
+        """Travel minutes from point i to point j"""
+        if self.minutes is not None:
+            return self.minutes[i][j]
+        return self.rows[i][j] * self.minutes_per_km
+    
+    def states(self, route):
+        """
+        Simulate a route
+        
+        Returns:
+            List of (departure minute, cumulative km, cumulative late minutes) after each position
+        """
+        rows, minutes, opens, closes, service = self.rows, self.minutes, self.opens, self.closes, self.service
+        clock, distance, late = self.start_minute, 0.0, 0.0
+        states = [(clock, distance, late)]
+        for prev, node in zip(route, route[1:]):
+            leg = rows[prev][node]
+            distance += leg
+            clock = max(clock + (minutes[prev][node] if minutes is not None else leg * self.minutes_per_km),
+                        opens[node])
+            if clock > closes[node]:
+                late += clock - closes[node]
+            clock += service[node]
+            states.append((clock, distance, late))
+        return states
+    
+    def cost(self, state):
+        """Objective value of a simulated (departure, km, late minutes) state"""
+        return state[1] + self.penalty * state[2]
+    
+    def cost_from(self, route, position, state, bound=math.inf):
+        """
+        Cost of a route whose first position - 1 stops match an already simulated route
+        
+        Args:
+            route: Candidate route
+            position: First position that differs from the simulated route
+            state: Simulated state after position - 1
+            bound: Stop early once the cost reaches this value
+        
+        Returns:
+            Route cost, or a value >= bound if the simulation stopped early
+        """
+        rows, minutes, opens, closes, service = self.rows, self.minutes, self.opens, self.closes, self.service
+        clock, distance, late = state
+        prev = route[position - 1]
+        for node in route[position:]:
+            leg = rows[prev][node]
+            distance += leg
+            clock = max(clock + (minutes[prev][node] if minutes is not None else leg * self.minutes_per_km),
+                        opens[node])
+            if clock > closes[node]:
+                late += clock - closes[node]
+            # Distance and lateness only grow along the route
+            if distance + self.penalty * late >= bound:
+                return distance + self.penalty * late
+            clock += service[node]
+            prev = node
+        return distance + self.penalty * late
+    
+    def construct(self):
+        """
+        Window-ordered nearest neighbor construction
+        
+        Stops are visited window by window in order of opening time, nearest
+        first; stops without a window are picked up whenever they are closest.
+        
+        Returns:
+            Route starting at index 0
+        """
+        rows = self.rows
+        groups = {}
+        flexible = set()
+        for node in range(1, len(self.opens)):
+            if math.isinf(self.closes[node]):
+                flexible.add(node)
+            else:
+                groups.setdefault((self.opens[node], self.closes[node]), set()).add(node)
+        
+        route = [0]
+        for window in sorted(groups) + [None]:
+            pending = groups[window] if window is not None else set()
+            while pending or (window is None and flexible):
+                current = rows[route[-1]]
+                node = min(pending | flexible if window is not None else flexible, key=lambda j: current[j])
+                pending.discard(node)
+                flexible.discard(node)
+                route.append(node)
+        return route
+    
+    def moves(self, route, states, bound, deadline=None):
+        """
+        Candidate neighbors of a route that may cost less than bound
+        
+        Args:
+            route: Current route
+            states: Simulated states of the route, see states()
+            bound: Cost a candidate has to beat
+            deadline: Optional time.perf_counter() value at which to stop
+        
+        Yields:
+            Tuples of (candidate route, first changed position)
+        """
+        rows = self.rows
+        n = len(route)
+        forward = [state[1] for state in states]  # km up to each position
+        # km of each prefix driven in reverse, for reversed segments on asymmetric matrices
+        backward = [0.0]
+        for prev, node in zip(route, route[1:]):
+            backward.append(backward[-1] + rows[node][prev])
+        distance = forward[-1]
+        # Float slack so the O(1) estimate never skips a move the simulation would accept
+        limit = bound + IMPROVEMENT_EPSILON
+        
+        # 2-opt: reverse route[i..j]
+        for i in range(1, n - 1):
+            if deadline is not None and time.perf_counter() >= deadline:
+                return
+            before, first = route[i - 1], route[i]
+            late = self.penalty * states[i - 1][2]
+            base = distance - (forward[i] - forward[i - 1])
+            for j in range(i + 1, n):
+                new = base - (forward[j] - forward[i]) + rows[before][route[j]] + (backward[j] - backward[i])
+                if j + 1 < n:
+                    new += rows[first][route[j + 1]] - (forward[j + 1] - forward[j])
+                if new + late < limit:
+                    yield route[:i] + route[i:j + 1][::-1] + route[j + 1:], i
+        
+        # Or-opt: move a chain of 1-3 stops to another position
+        for length in range(1, OR_OPT_MAX_SEGMENT + 1):
+            for i in range(1, n - length + 1):
+                if deadline is not None and time.perf_counter() >= deadline:
+                    return
+                head, tail = route[i], route[i + length - 1]
+                before = route[i - 1]
+                after = route[i + length] if i + length < n else None
+                removed = distance - (forward[i] - forward[i - 1])
+                if after is not None:
+                    removed += rows[before][after] - (forward[i + length] - forward[i + length - 1])
+                
+                segment = route[i:i + length]
+                rest = route[:i] + route[i + length:]
+                for j in range(1, len(rest) + 1):
+                    if j == i:
+                        continue
+                    left = rest[j - 1]
+                    right = rest[j] if j < len(rest) else None
+                    new = removed + rows[left][head]
+                    if right is not None:
+                        new += rows[tail][right] - rows[left][right]
+                    position = min(i, j)
+                    if new + self.penalty * states[position - 1][2] < limit:
+                        yield rest[:j] + segment + rest[j:], position
+    
+    def run(self, route, time_budget_ms=None, deadline=None):
+        """
+        First-improvement local search until no move helps or time runs out
+        
+        Args:
+            route: Initial route starting at index 0
+            time_budget_ms: Optional wall-clock budget in milliseconds
+            deadline: Optional time.perf_counter() value at which to stop, whichever comes first
+        
+        Returns:
+            Tuple of (improved route, statistics dictionary)
+        """
+        start = time.perf_counter()
+        deadline = earliest_deadline(start + time_budget_ms / 1000 if time_budget_ms else None, deadline)
+        max_evaluations = TIME_WINDOW_MAX_EVALUATIONS if deadline is None else None
+        states = self.states(route)
+        initial = states[-1]
+        current = self.cost(initial)
+        moves = 0
+        evaluations = 0
+        converged = False
+        
+        while True:
+            improved = False
+            for count, (candidate, position) in enumerate(
+                    self.moves(route, states, current - IMPROVEMENT_EPSILON, deadline)):
+                if deadline is not None and count % 64 == 0 and time.perf_counter() >= deadline:
+                    break
+                if max_evaluations is not None and evaluations >= max_evaluations:
+                    break
+                evaluations += 1
+                cost = self.cost_from(candidate, position, states[position - 1], current - IMPROVEMENT_EPSILON)
+                if cost < current - IMPROVEMENT_EPSILON:
+                    route, current = candidate, cost
+                    states = self.states(route)
+                    moves += 1
+                    improved = True
+                    break
+            
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+            if max_evaluations is not None and evaluations >= max_evaluations:
+                break
+            if not improved:
+                converged = True
+                break
+        
+        time_used_ms = (time.perf_counter() - start) * 1000
+        final = states[-1]
+        stats = {
+            'operators': ['two_opt', 'or_opt'],
+            'moves': moves,
+            'evaluations': evaluations,
+            'time_budget_ms': time_budget_ms,
+            'time_used_ms': round(time_used_ms, 2),
+            'converged': converged,
+            'initial_distance_km': round(initial[1], 3),
+            'final_distance_km': round(final[1], 3),
+            'distance_saved_km': round(initial[1] - final[1], 3),
+            'initial_late_minutes': round(initial[2], 1),
+            'final_late_minutes': round(final[2], 1)
+        }
+        return route, stats
+
+class RouteOptimizer:
+    def __init__(self, distance_store=None, centroid_store_path=None):
+        self.service_name = "OptiDeliver Route Optimization Service"
+        self.distance_store = distance_store
+        self.centroid_store_path = centroid_store_path
+        self.centroids = None  # Warm-start centroids by depot and postman count, loaded on first use
+        self.centroids_lock = threading.Lock()
+    
+    def calculate_distance_matrix(self, locations, dtype=np.float64):
+        """
+        Calculate distance matrix between all locations using haversine formula
+        
+        Args:
+            locations: List of (latitude, longitude) tuples
+            dtype: Output dtype, np.float32 halves the memory of large matrices
+            
+        Returns:
+            2D numpy array of distances in km
+        """
+        if len(locations) == 0:
+            return np.zeros((0, 0), dtype=dtype)
+        
+        distance_matrix = haversine_matrix(locations, dtype=dtype)
+        # The formula is symmetric, but keep the diagonal exactly zero
+        np.fill_diagonal(distance_matrix, 0)
+        
+        return distance_matrix
+    
+    def cached_distance_matrix(self, cluster, depot_location=None, depot_id=None):
+        """
+        Fill a cluster's distance matrix from the persistent distance store
+        
+        Stops are keyed by customer ID (or rounded coordinates) and the depot by
+        its ID (or coordinates); only pairs the store has not seen are computed.
+        
+        Args:
+            cluster: List of delivery points
+            depot_location: (latitude, longitude) of post office depot, placed first
+            depot_id: Optional stable depot identifier
+            
+        Returns:
+            2D numpy array of distances in km
+        """
+        locations = [(d['latitude'], d['longitude']) for d in cluster]
+        if depot_location:
+            locations.insert(0, depot_location)
+        if not self.distance_store.uses_store(len(locations)):
+            # Computed directly (and counted by the store) without building keys
+            return self.distance_store.get_matrix(None, locations, haversine_matrix)
+        
+        keys = [location_key(d['latitude'], d['longitude'], d.get('customer_id')) for d in cluster]
+        if depot_location:
+            keys.insert(0, location_key(depot_location[0], depot_location[1], depot_id=depot_id))
+        
+        return self.distance_store.get_matrix(keys, locations, haversine_matrix)
+    
+    def build_distance_model(self, locations, mode='auto', backend='haversine'):
+        """
+        Build the distance representation used for routing a set of locations
+        
+        Args:
+            locations: List of (latitude, longitude) tuples
+            mode: 'dense' for a full matrix, 'sparse' for a k-nearest-neighbor
+                graph, 'auto' to pick sparse above SPARSE_MATRIX_THRESHOLD stops
+            backend: 'haversine' for straight-line distances, 'road' for shortest
+                road distances (always a dense matrix)
+            
+        Returns:
+            2D numpy array or SparseDistanceGraph
+        """
+        if mode not in MATRIX_MODES:
+            raise ValueError(f"Unknown matrix mode: {mode}")
+        if backend == 'road':
+            return self.road_matrices(locations)[0]
+        if mode == 'sparse' or (mode == 'auto' and len(locations) > SPARSE_MATRIX_THRESHOLD):
+            return SparseDistanceGraph(locations)
+        return self.calculate_distance_matrix(locations)
+    
+    def road_matrices(self, locations):
+        """
+        Road distances and travel minutes from one shortest-path search per location
+        
+        Args:
+            locations: List of (latitude, longitude) tuples
+            
+        Returns:
+            Tuple of (symmetrized distance matrix in km, directed travel minutes
+            along the same paths at each road's speed)
+        """
+        road_network = get_road_network()
+        if road_network is None:
+            raise ValueError("No road network loaded, set ROAD_NETWORK_PATH to a GraphML extract")
+        return road_network.route_matrices(locations)
+    
+    def calculate_distance_matrix_rect(self, sources, targets, dtype=np.float64):
+        """
+        Calculate a rectangular sources x targets distance matrix
+        
+        Args:
+            sources: List of (latitude, longitude) tuples for the rows
+            targets: List of (latitude, longitude) tuples for the columns
+            dtype: Output dtype (np.float64 or np.float32)
+            
+        Returns:
+            2D numpy array of shape (len(sources), len(targets)) in km
+        """
+        if len(sources) == 0 or len(targets) == 0:
+            return np.zeros((len(sources), len(targets)), dtype=dtype)
+        
+        return haversine_matrix(sources, targets, dtype=dtype)
+    
+    def nearest_neighbor_route(self, distance_matrix, start_idx=0):
+        """
+        Implement nearest neighbor algorithm for route planning
+        
+        Args:
+            distance_matrix: 2D array of distances between points
+            start_idx: Index of starting point
+            
+        Returns:
+            List of indices representing the route
+        """
+        n = distance_matrix.shape[0]
+        unvisited = set(range(n))
+        unvisited.remove(start_idx)
+        route = [start_idx]
+        current = start_idx
+        
+        while unvisited:
+            next_point = min(unvisited, key=lambda x: distance_matrix[current, x])
+            route.append(next_point)
+            unvisited.remove(next_point)
+            current = next_point
+        
+        return route
+    
+    def grid_nearest_neighbor_route(self, locations, start_idx=0):
+        """
+        Nearest neighbor route built on a spatial grid instead of a distance matrix
+        
+        Args:
+            locations: List of (latitude, longitude) tuples
+            start_idx: Index of starting point
+            
+        Returns:
+            List of indices representing the route
+        """
+        points = project_coordinates(locations)
+        grid = SpatialGrid(points)
+        grid.remove(start_idx)
+        route = [start_idx]
+        current = start_idx
+        
+        while len(grid):
+            next_point = grid.nearest(*grid.xy[current])
+            grid.remove(next_point)
+            route.append(next_point)
+            current = next_point
+        
+        return route
+    
+    def greedy_edge_route(self, locations, start_idx=0, neighbor_k=GREEDY_EDGE_CANDIDATES):
+        """
+        Greedy-edge route: repeatedly add the shortest candidate edge that keeps
+        every stop at degree <= 2 without closing a cycle, then chain the fragments
+        
+        Args:
+            locations: List of (latitude, longitude) tuples
+            start_idx: Index of starting point
+            neighbor_k: Nearest neighbors per stop offered as candidate edges
+            
+        Returns:
+            List of indices representing the route
+        """
+        points = project_coordinates(locations)
+        n = len(points)
+        if n <= 2:
+            return self.grid_nearest_neighbor_route(locations, start_idx)
+        
+        # Candidate edges from a KD-tree, deduplicated and sorted by length
+        k = min(neighbor_k, n - 1)
+        dists, nbrs = cKDTree(points).query(points, k=k + 1)
+        a = np.repeat(np.arange(n), k)
+        b = nbrs[:, 1:].ravel()
+        lengths = dists[:, 1:].ravel()
+        lo = np.minimum(a, b)
+        hi = np.maximum(a, b)
+        _, unique_idx = np.unique(lo * n + hi, return_index=True)
+        unique_idx = unique_idx[np.argsort(lengths[unique_idx], kind='stable')]
+        
+        parent = list(range(n))
+        
+        def find(x):
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+        
+        degree = [0] * n
+        adjacency = [[] for _ in range(n)]
+        for u, v in zip(lo[unique_idx].tolist(), hi[unique_idx].tolist()):
+            if degree[u] >= 2 or degree[v] >= 2:
+                continue
+            root_u, root_v = find(u), find(v)
+            if root_u == root_v:
+                continue
+            parent[root_u] = root_v
+            degree[u] += 1
+            degree[v] += 1
+            adjacency[u].append(v)
+            adjacency[v].append(u)
+        
+        def walk(node):
+            path = [node]
+            previous = None
+            while True:
+                following = [w for w in adjacency[node] if w != previous]
+                if not following:
+                    return path
+                previous, node = node, following[0]
+                path.append(node)
+        
+        # Chain fragments by jumping from each fragment's end to the nearest free endpoint
+        endpoints = [node for node in range(n) if degree[node] < 2]
+        endpoint_slot = {node: slot for slot, node in enumerate(endpoints)}
+        grid = SpatialGrid(points[endpoints])
+        
+        current = walk(start_idx)[-1] if degree[start_idx] == 2 else start_idx
+        tour = []
+        while current is not None:
+            fragment = walk(current)
+            for end in {fragment[0], fragment[-1]}:
+                grid.remove(endpoint_slot[end])
+            tour.extend(fragment)
+            
+            slot = grid.nearest(*points[fragment[-1]])
+            current = endpoints[slot] if slot is not None else None
+        
+        return open_route_from_cycle(tour, points, start_idx)
+    
+    def hilbert_route(self, locations, start_idx=0):
+        """
+        Route that visits stops in Hilbert space-filling curve order
+        
+        Args:
+            locations: List of (latitude, longitude) tuples
+            start_idx: Index of starting point
+            
+        Returns:
+            List of indices representing the route
+        """
+        points = project_coordinates(locations)
+        if len(points) <= 2:
+            return self.grid_nearest_neighbor_route(locations, start_idx)
+        
+        cycle = np.argsort(hilbert_index(points), kind='stable').tolist()
+        return open_route_from_cycle(cycle, points, start_idx)
+    
+    def randomized_nearest_neighbor_route(self, locations, distance_matrix, rng,
+                                          candidates=MULTI_START_CANDIDATES, start_idx=0):
+        """
+        Nearest neighbor that moves to a random one of the closest unvisited stops
+        
+        Args:
+            locations: List of (latitude, longitude) tuples
+            distance_matrix: 2D array of distances between points; rows are computed
+                             from the locations for a SparseDistanceGraph
+            rng: numpy Generator that drives the choices
+            candidates: Number of closest stops to choose from at each step
+            start_idx: Index of starting point
+        
+        Returns:
+            List of indices representing the route
+        """
+        points = np.asarray(locations, dtype=np.float64).reshape(-1, 2)
+        dense = isinstance(distance_matrix, np.ndarray)
+        n = len(points)
+        visited = np.zeros(n, dtype=bool)
+        visited[start_idx] = True
+        route = [start_idx]
+        current = start_idx
+        
+        for remaining in range(n - 1, 0, -1):
+            row = distance_matrix[current] if dense else haversine_matrix(points[current], points)[0]
+            row = np.where(visited, np.inf, row)
+            k = min(candidates, remaining)
+            closest = np.argpartition(row, k - 1)[:k]
+            current = int(closest[rng.integers(k)])
+            visited[current] = True
+            route.append(current)
+        
+        return route
+    
+    def construct_route(self, locations, distance_matrix, strategy='nearest_neighbor', start_idx=0, options=None):
+        """
+        Build an initial route with the selected construction strategy
+        
+        Args:
+            locations: List of (latitude, longitude) tuples
+            distance_matrix: 2D array of distances between points or a SparseDistanceGraph
+            strategy: A registered construction strategy (CONSTRUCTION_STRATEGIES are built in)
+            start_idx: Index of starting point
+            options: Optional solver settings passed to the strategy
+            
+        Returns:
+            List of indices representing the route
+        """
+        construct = solver_registry.get('construction', strategy)
+        return construct(self, locations, distance_matrix, start_idx, options or {})
+    
+    def two_opt_improvement(self, route, distance_matrix, max_iterations=100, deadline=None):
+        """
+        Implement 2-opt algorithm to improve TSP route
+        
+        Args:
+            route: Initial route
+            distance_matrix: 2D array of distances between points
+            max_iterations: Maximum number of improvement iterations
+            deadline: Optional time.perf_counter() value at which to stop with the best route so far
+            
+        Returns:
+            Improved route
+        """
+        best_route = route.copy()
+        improved = True
+        iteration = 0
+        
+        while improved and iteration < max_iterations:
+            improved = False
+            best_distance = self.calculate_route_distance(best_route, distance_matrix)
+            
+            for i in range(1, len(route) - 2):
+                for j in range(i + 1, len(route) - 1):
+                    if deadline is not None and time.perf_counter() >= deadline:
+                        logger.info(f"2-opt stopped at the deadline after {iteration} iterations")
+                        return best_route
+                    new_route = best_route.copy()
+                    # Reverse the route between positions i and j
+                    new_route[i:j+1] = reversed(new_route[i:j+1])
+                    new_distance = self.calculate_route_distance(new_route, distance_matrix)
+                    
+                    if new_distance < best_distance:
+                        best_distance = new_distance
+                        best_route = new_route
+                        improved = True
+            
+            iteration += 1
+        
+        logger.info(f"Route improved with 2-opt algorithm in {iteration} iterations")
+        return best_route
+    
+    def neighbor_two_opt_improvement(self, route, distance_matrix, neighbor_k=DEFAULT_NEIGHBOR_K, deadline=None):
+        """
+        Improve a route with delta-evaluated 2-opt over k-nearest-neighbor candidates
+        
+        Args:
+            route: Initial route
+            distance_matrix: 2D array of distances between points
+            neighbor_k: Number of nearest neighbors considered per stop
+            deadline: Optional time.perf_counter() value at which to stop with the best route so far
+            
+        Returns:
+            Improved route
+        """
+        improved_route, moves = LocalSearch(distance_matrix, neighbor_k).two_opt(route, deadline)
+        logger.info(f"Route improved with neighbor-list 2-opt in {moves} moves")
+        return improved_route
+    
+    def local_search_improvement(self, route, distance_matrix, time_budget_ms=DEFAULT_TIME_BUDGET_MS,
+                                 operators=LOCAL_SEARCH_OPERATORS, deadline=None):
+        """
+        Improve a route with 2-opt, Or-opt and 3-opt moves under a time budget
+        
+        Args:
+            route: Initial route
+            distance_matrix: 2D array of distances between points
+            time_budget_ms: Wall-clock budget in milliseconds (None for no limit)
+            operators: Names of the local search operators to apply, in order
+            deadline: Optional time.perf_counter() value at which to stop, whichever comes first
+            
+        Returns:
+            Tuple of (improved route, local search statistics)
+        """
+        improved_route, stats = LocalSearch(distance_matrix).run(route, operators, time_budget_ms, deadline)
+        logger.info(f"Route improved with local search in {stats['time_used_ms']} ms, "
+                    f"saved {stats['distance_saved_km']} km")
+        return improved_route, stats
+    
+    def improve_route(self, route, distance_matrix, strategy='two_opt', options=None):
+        """
+        Improve a route with the selected improvement strategy
+        
+        Args:
+            route: Initial route
+            distance_matrix: 2D array of distances between points or a SparseDistanceGraph
+            strategy: A registered improvement strategy (IMPROVEMENT_STRATEGIES are built in)
+            options: Optional solver settings (time_budget_ms, local_search_operators, deadline_at)
+            
+        Returns:
+            Tuple of (improved route, improvement statistics)
+        """
+        options = options or {}
+        if strategy == 'two_opt' and isinstance(distance_matrix, SparseDistanceGraph):
+            # Full 2-opt scans every pair; on a sparse graph use its neighbor-list form
+            strategy = 'neighbor_two_opt'
+        start = time.perf_counter()
+        initial_distance = self.calculate_route_distance(route, distance_matrix)
+        request_deadline = SearchDeadline.from_options(options)
+        deadline = request_deadline.perf_deadline()
+        
+        improve = solver_registry.get('improvement', strategy)
+        improved_route, stats = improve(self, route, distance_matrix, options, deadline)
+        stats = dict(stats)
+        
+        final_distance = self.calculate_route_distance(improved_route, distance_matrix)
+        stats.update({
+            'strategy': strategy,
+            'time_used_ms': stats.get('time_used_ms', round((time.perf_counter() - start) * 1000, 2)),
+            'distance_saved_km': round(initial_distance - final_distance, 3)
+        })
+        if request_deadline.at is not None:
+            # The search returns its best route so far when the deadline passes
+            stats['cut_off'] = request_deadline.expired()
+        return improved_route, stats
+    
+    def calculate_route_distance(self, route, distance_matrix):
+        """
+        Calculate total distance of a route
+        
+        Args:
+            route: List of indices representing the route
+            distance_matrix: 2D array of distances between points
+            
+        Returns:
+            Total distance in km
+        """
+        total_distance = 0
+        for i in range(len(route) - 1):
+            total_distance += distance_matrix[route[i], route[i+1]]
+        return total_distance
+    
+    def cluster_deliveries(self, deliveries, num_clusters):
+        """
+        Cluster deliveries geographically to assign to different postmen
+        
+        Args:
+            deliveries: List of delivery points with coordinates
+            num_clusters: Number of clusters (postmen)
+            
+        Returns:
+            List of delivery clusters
+        """
+        if len(deliveries) <= num_clusters:
+            # If we have fewer deliveries than clusters, assign one delivery per cluster
+            return [[delivery] for delivery in deliveries[:num_clusters]]
+        
+        # Extract coordinates
+        coordinates = np.array([[d['latitude'], d['longitude']] for d in deliveries])
+        
+        # Perform K-means clustering
+        kmeans = KMeans(n_clusters=num_clusters, random_state=42)
+        clusters = kmeans.fit_predict(coordinates)
+        
+        # Group deliveries by cluster
+        clustered_deliveries = [[] for _ in range(num_clusters)]
+        for i, delivery in enumerate(deliveries):
+            cluster_idx = clusters[i]
+            clustered_deliveries[cluster_idx].append(delivery)
+        
+        return clustered_deliveries
+    
+    def balanced_cluster_deliveries(self, deliveries, num_clusters, capacity=MAX_DELIVERIES_PER_POSTMAN,
+                                    balance='deliveries'):
+        """
+        Cluster deliveries geographically with a cap on deliveries per postman
+        
+        Args:
+            deliveries: List of delivery points with coordinates
+            num_clusters: Number of clusters (postmen)
+            capacity: Maximum deliveries per postman, raised to ceil(n / k) if infeasible
+            balance: 'deliveries' to cap counts only, 'service_time' to also cap
+                     estimated service minutes near the per-postman mean
+        
+        Returns:
+            List of delivery clusters
+        """
+        if len(deliveries) <= num_clusters:
+            return [[delivery] for delivery in deliveries[:num_clusters]]
+        
+        coordinates = np.array([[d['latitude'], d['longitude']] for d in deliveries])
+        weights = np.array([DELIVERY_TIME_MINUTES.get(d.get('address_type', 0), 5) for d in deliveries],
+                           dtype=np.float64)
+        labels, _ = self.balanced_labels(coordinates, weights, num_clusters, capacity, balance)
+        
+        clustered_deliveries = [[] for _ in range(num_clusters)]
+        for delivery, cluster_idx in zip(deliveries, labels):
+            clustered_deliveries[cluster_idx].append(delivery)
+        
+        return clustered_deliveries
+    
+    def balanced_labels(self, coordinates, weights, num_clusters, capacity=MAX_DELIVERIES_PER_POSTMAN,
+                        balance='deliveries', initial_centers=None):
+        """
+        Balanced k-means over delivery coordinates
+        
+        Centroids are seeded with k-means++ (or the given centers), then each
+        round assigns deliveries in order of regret (how much they lose by
+        missing their nearest centroid) to the nearest centroid with room left,
+        and moves the centroids to the mean of their members.
+        
+        Args:
+            coordinates: (n, 2) array of (latitude, longitude)
+            weights: Service minutes per delivery
+            num_clusters: Number of clusters (postmen)
+            capacity: Maximum deliveries per postman, raised to ceil(n / k) if infeasible
+            balance: One of BALANCE_MODES
+            initial_centers: Optional (num_clusters, 2) array of (latitude, longitude) centroids
+        
+        Returns:
+            Tuple of (cluster label per delivery, rounds run)
+        """
+        if balance not in BALANCE_MODES:
+            raise ValueError(f"Unknown balance mode: {balance}")
+        
+        n = len(coordinates)
+        capacity = max(capacity, -(-n // num_clusters))
+        if balance == 'service_time':
+            weight_capacity = max(weights.sum() / num_clusters * SERVICE_TIME_TOLERANCE, weights.max())
+        else:
+            weight_capacity = np.inf
+        
+        if initial_centers is None:
+            points = project_coordinates(coordinates)
+            centers, _ = kmeans_plusplus(points, num_clusters, random_state=42)
+        else:
+            # Project points and centers together so they share one reference latitude
+            projected = project_coordinates(np.vstack([coordinates, initial_centers]))
+            points, centers = projected[:n], projected[n:].copy()
+        
+        candidates = min(BALANCED_CANDIDATES, num_clusters)
+        labels = None
+        rounds = 0
+        squared_norms = (points ** 2).sum(axis=1)
+        weight_list = weights.tolist()
+        for _ in range(BALANCED_KMEANS_ITERATIONS):
+            rounds += 1
+            distances = squared_norms[:, None] - 2 * points @ centers.T + (centers ** 2).sum(axis=1)[None, :]
+            
+            # Nearest few centroids per delivery, sorted; regret = second best - best
+            nearest = np.argpartition(distances, candidates - 1, axis=1)[:, :candidates]
+            nearest = np.take_along_axis(nearest, np.argsort(np.take_along_axis(distances, nearest, axis=1), axis=1),
+                                         axis=1)
+            ranked = np.take_along_axis(distances, nearest[:, :2], axis=1)
+            regret = ranked[:, -1] - ranked[:, 0]
+            
+            new_labels = np.empty(n, dtype=np.int64)
+            counts = [0] * num_clusters
+            loads = [0.0] * num_clusters
+            preferences = nearest.tolist()
+            for i in np.argsort(-regret, kind='stable').tolist():
+                weight = weight_list[i]
+                choice = -1
+                for c in preferences[i]:
+                    if counts[c] < capacity and loads[c] + weight <= weight_capacity:
+                        choice = c
+                        break
+                if choice < 0:
+                    # All nearby postmen are full: take the closest one with room,
+                    # relaxing the service time cap only if nothing else is left
+                    count_array, load_array = np.array(counts), np.array(loads)
+                    open_clusters = np.flatnonzero((count_array < capacity) & (load_array + weight <= weight_capacity))
+                    if len(open_clusters) == 0:
+                        open_clusters = np.flatnonzero(count_array < capacity)
+                    choice = int(open_clusters[np.argmin(distances[i, open_clusters])])
+                new_labels[i] = choice
+                counts[choice] += 1
+                loads[choice] += weight
+            
+            if labels is not None and np.array_equal(labels, new_labels):
+                break
+            labels = new_labels
+            sizes = np.bincount(labels, minlength=num_clusters)
+            occupied = sizes > 0
+            for axis in range(2):
+                sums = np.bincount(labels, weights=points[:, axis], minlength=num_clusters)
+                centers[occupied, axis] = sums[occupied] / sizes[occupied]
+        
+        return labels, rounds
+    
+    def cluster_centroid_key(self, num_clusters, depot_location, options):
+        """Key of the warm-start centroids for a depot, postman count and optional scope"""
+        depot_key = location_key(depot_location[0], depot_location[1], depot_id=options.get('depot_id'))
+        scope = options.get('centroid_scope')
+        return f"{depot_key}|{num_clusters}" + (f"|{scope}" if scope is not None else '')
+    
+    def load_centroids(self, key):
+        """
+        Get stored warm-start centroids
+        
+        Args:
+            key: Key from cluster_centroid_key
+        
+        Returns:
+            (num_clusters, 2) array of (latitude, longitude), or None
+        """
+        with self.centroids_lock:
+            if self.centroids is None:
+                self.centroids = {}
+                if self.centroid_store_path and os.path.exists(self.centroid_store_path):
+                    try:
+                        with open(self.centroid_store_path, 'r') as f:
+                            self.centroids = json.load(f)
+                    except Exception as e:
+                        logger.error(f"Error loading cluster centroids: {e}")
+            centers = self.centroids.get(key)
+        return np.array(centers, dtype=np.float64) if centers is not None else None
+    
+    def save_centroids(self, key, centers):
+        """
+        Store warm-start centroids for the next run, on disk if a path is configured
+        
+        Args:
+            key: Key from cluster_centroid_key
+            centers: (num_clusters, 2) array of (latitude, longitude)
+        """
+        with self.centroids_lock:
+            if self.centroids is None:
+                self.centroids = {}
+            self.centroids[key] = np.round(centers, 7).tolist()
+            if self.centroid_store_path:
+                try:
+                    directory = os.path.dirname(self.centroid_store_path)
+                    if directory:
+                        os.makedirs(directory, exist_ok=True)
+                    tmp_path = self.centroid_store_path + '.tmp'
+                    with open(tmp_path, 'w') as f:
+                        json.dump(self.centroids, f)
+                    os.replace(tmp_path, self.centroid_store_path)
+                except Exception as e:
+                    logger.error(f"Error saving cluster centroids: {e}")
+    
+    def cluster_with_options(self, deliveries, num_clusters, depot_location, options=None):
+        """
+        Cluster deliveries with the strategy selected in the solver options
+        
+        Args:
+            deliveries: List of delivery points with coordinates
+            num_clusters: Number of clusters (postmen)
+            depot_location: (latitude, longitude) of post office depot
+            options: Optional solver settings (clustering and the strategy's own settings)
+        
+        Returns:
+            Tuple of (delivery clusters, clustering statistics)
+        """
+        options = options or {}
+        cluster = solver_registry.get('clustering', options.get('clustering', 'kmeans'))
+        return cluster(self, deliveries, num_clusters, depot_location, options)
+    
+    def centroid_clustering(self, deliveries, num_clusters, depot_location, options=None):
+        """
+        Built-in k-means, MiniBatch k-means and balanced clustering
+        
+        With options['warm_start'] the centroids of the previous run for the same
+        depot and postman count seed the clustering, so a stable set of beats
+        converges in a few iterations.
+        
+        Args:
+            deliveries: List of delivery points with coordinates
+            num_clusters: Number of clusters (postmen)
+            depot_location: (latitude, longitude) of post office depot
+            options: Optional solver settings (clustering, balance, warm_start)
+        
+        Returns:
+            Tuple of (delivery clusters, clustering statistics)
+        """
+        options = options or {}
+        strategy = options.get('clustering', 'kmeans')
+        warm_start = options.get('warm_start', False)
+        started = time.perf_counter()
+        
+        if len(deliveries) <= num_clusters:
+            return self.cluster_deliveries(deliveries, num_clusters), {
+                'strategy': strategy, 'warm_started': False, 'iterations': 0, 'time_ms': 0.0
+            }
+        if strategy == 'kmeans' and not warm_start:
+            clusters = self.cluster_deliveries(deliveries, num_clusters)
+            return clusters, {
+                'strategy': strategy, 'warm_started': False, 'iterations': None,
+                'time_ms': round((time.perf_counter() - started) * 1000, 2)
+            }
+        
+        coordinates = np.array([[d['latitude'], d['longitude']] for d in deliveries])
+        key = self.cluster_centroid_key(num_clusters, depot_location, options) if warm_start else None
+        initial_centers = self.load_centroids(key) if warm_start else None
+        if initial_centers is not None and initial_centers.shape != (num_clusters, 2):
+            initial_centers = None
+        
+        if strategy == 'balanced':
+            weights = np.array([DELIVERY_TIME_MINUTES.get(d.get('address_type', 0), 5) for d in deliveries],
+                               dtype=np.float64)
+            labels, iterations = self.balanced_labels(coordinates, weights, num_clusters,
+                                                      balance=options.get('balance', 'deliveries'),
+                                                      initial_centers=initial_centers)
+        else:
+            init = initial_centers if initial_centers is not None else 'k-means++'
+            if strategy == 'minibatch':
+                model = MiniBatchKMeans(n_clusters=num_clusters, init=init, n_init=1 if initial_centers is not None else 3,
+                                        batch_size=MINIBATCH_BATCH_SIZE, random_state=42)
+            else:
+                model = KMeans(n_clusters=num_clusters, init=init, n_init=1 if initial_centers is not None else 10,
+                               random_state=42)
+            labels = model.fit_predict(coordinates)
+            iterations = int(model.n_iter_)
+        
+        # Centroids as member means, so every strategy stores comparable warm starts
+        sizes = np.bincount(labels, minlength=num_clusters)
+        if warm_start and sizes.all():
+            centers = np.column_stack([
+                np.bincount(labels, weights=coordinates[:, axis], minlength=num_clusters) / sizes
+                for axis in range(2)
+            ])
+            self.save_centroids(key, centers)
+        
+        clustered_deliveries = [[] for _ in range(num_clusters)]
+        for delivery, cluster_idx in zip(deliveries, labels):
+            clustered_deliveries[cluster_idx].append(delivery)
+        
+        return clustered_deliveries, {
+            'strategy': strategy,
+            'warm_started': initial_centers is not None,
+            'iterations': iterations,
+            'time_ms': round((time.perf_counter() - started) * 1000, 2)
+        }
+    
+    def estimate_delivery_time(self, route, deliveries, distance_matrix, multipliers=None, travel_minutes=None):
+        """
+        Estimate the time required for completing a delivery route
+        
+        Args:
+            route: List of indices representing the route
+            deliveries: List of delivery details
+            distance_matrix: 2D array of distances between points
+            multipliers: Optional speed multiplier per point (see speed_tables.py)
+            travel_minutes: Optional 2D array of travel minutes between points (road
+                backend); used instead of distance at POSTMAN_SPEED_KM_PER_HOUR
+            
+        Returns:
+            Dictionary with estimated times and distances
+        """
+        total_distance = self.calculate_route_distance(route, distance_matrix)
+        
+        # Calculate travel time (in hours)
+        if len(route) < 2 or (multipliers is None and travel_minutes is None):
+            travel_time_hours = total_distance / POSTMAN_SPEED_KM_PER_HOUR
+        else:
+            if travel_minutes is not None:
+                legs = np.array([travel_minutes[a, b] for a, b in zip(route, route[1:])], dtype=np.float64) / 60
+            else:
+                legs = np.array([distance_matrix[a, b] for a, b in zip(route, route[1:])],
+                                dtype=np.float64) / POSTMAN_SPEED_KM_PER_HOUR
+            if multipliers is not None:
+                # Each leg runs at the mean speed of its two ends
+                route = np.asarray(route)
+                legs = legs / ((multipliers[route[:-1]] + multipliers[route[1:]]) / 2)
+            travel_time_hours = float(np.sum(legs))
+        
+        # Calculate total service time (in hours)
+        service_time_hours = 0
+        for idx in route:
+            if idx < len(deliveries):  # Skip depot if included
+                address_type = deliveries[idx].get('address_type', 0)
+                service_time_hours += DELIVERY_TIME_MINUTES.get(address_type, 5) / 60
+        
+        # Total route time
+        total_time_hours = travel_time_hours + service_time_hours
+        
+        return {
+            'total_distance_km': round(total_distance, 2),
+            'travel_time_hours': round(travel_time_hours, 2),
+            'service_time_hours': round(service_time_hours, 2),
+            'total_time_hours': round(total_time_hours, 2),
+            'estimated_completion_minutes': round(total_time_hours * 60, 0)
+        }
+    
+    def multi_start_search(self, locations, distance_matrix, seeds, options):
+        """
+        Construct and improve one route per seed and keep the shortest
+        
+        The configured seed runs the regular construction, every other seed a
+        randomized nearest neighbor; each start gets the full improvement step.
+        
+        Args:
+            locations: List of (latitude, longitude) tuples, depot first
+            distance_matrix: Distance model over the locations
+            seeds: Seeds of the starts to run
+            options: Solver settings (construction, improvement, seed, deadline_at)
+        
+        Returns:
+            Tuple of (best route, its improvement statistics, multi-start statistics)
+        """
+        started = time.perf_counter()
+        construction = options.get('construction', 'nearest_neighbor')
+        improvement = options.get('improvement', 'two_opt')
+        request_deadline = SearchDeadline.from_options(options)
+        
+        best = None
+        lengths = []
+        for seed in seeds:
+            # Past the deadline, keep the best start so far
+            if lengths and request_deadline.expired():
+                break
+            if seed == options.get('seed', 0):
+                initial_route = self.construct_route(locations, distance_matrix, construction, options=options)
+            else:
+                initial_route = self.randomized_nearest_neighbor_route(
+                    locations, distance_matrix, np.random.default_rng(seed)
+                )
+            route, stats = self.improve_route(initial_route, distance_matrix, improvement, options)
+            length = self.calculate_route_distance(route, distance_matrix)
+            lengths.append(length)
+            if best is None or length < best[0] - IMPROVEMENT_EPSILON:
+                best = (length, seed, route, stats)
+        
+        summary = multi_start_summary(seeds[:len(lengths)], lengths, best[1],
+                                      (time.perf_counter() - started) * 1000)
+        return best[2], best[3], summary
+    
+    def optimize_cluster(self, cluster, cluster_idx, depot_location, options=None, distance_matrix=None, seeds=None):
+        """
+        Build and improve the route for one postman's cluster of deliveries
+        
+        Args:
+            cluster: List of delivery points assigned to the postman
+            cluster_idx: Position of the cluster, used for the postman ID
+            depot_location: (latitude, longitude) of post office depot
+            options: Optional solver settings, see route_options_from_request
+            distance_matrix: Optional precomputed distance matrix (depot first)
+            seeds: Optional multi-start seeds to run, defaults to all seeds from the options
+            
+        Returns:
+            Dictionary with the ordered route, statistics and solve time
+        """
+        started = time.perf_counter()
+        options = options or {}
+        construction = options.get('construction', 'nearest_neighbor')
+        improvement = options.get('improvement', 'two_opt')
+        matrix_mode = options.get('matrix_mode', 'auto')
+        
+        # Create locations list including depot
+        locations = [(d['latitude'], d['longitude']) for d in cluster]
+        if depot_location:
+            locations.insert(0, depot_location)  # Add depot as first location
+        
+        # Calculate distance matrix (or a sparse neighbor graph for very large routes)
+        matrix_started = time.perf_counter()
+        road = options.get('distance_backend', 'haversine') == 'road'
+        travel_minutes = None
+        if road:
+            # The search that prices the road distances also sums the minutes along them
+            road_distances, travel_minutes = self.road_matrices(locations)
+            if distance_matrix is None:
+                distance_matrix = road_distances
+        elif distance_matrix is None:
+            distance_matrix = self.build_distance_model(locations, matrix_mode)
+        stage_times_ms = {'distance_matrix': round((time.perf_counter() - matrix_started) * 1000, 2)}
+        
+        if seeds is None:
+            seeds = multi_start_seeds(options)
+        multi_start = None
+        if options.get('multi_start', 1) > 1:
+            # Several randomized starts, keeping the shortest improved route
+            optimized_route, improvement_stats, multi_start = self.multi_start_search(
+                locations, distance_matrix, seeds, options
+            )
+            # Starts interleave both stages, so only their combined time is known
+            stage_times_ms['construction'] = None
+            stage_times_ms['improvement'] = multi_start['cpu_time_ms']
+        else:
+            # Get initial route using the selected construction (nearest neighbor by default)
+            construction_started = time.perf_counter()
+            initial_route = self.construct_route(locations, distance_matrix, construction, options=options)
+            stage_times_ms['construction'] = round((time.perf_counter() - construction_started) * 1000, 2)
+            
+            # Improve route using the selected strategy (2-opt by default)
+            optimized_route, improvement_stats = self.improve_route(
+                initial_route, distance_matrix, improvement, options
+            )
+            stage_times_ms['improvement'] = improvement_stats['time_used_ms']
+        
+        # Calculate route statistics, at the cluster's slot speeds when traffic-aware
+        slots = [time_slot_number(d.get('time_slot')) for d in cluster]
+        slots = [slot for slot in slots if slot is not None]
+        time_slot = max(set(slots), key=slots.count) if slots else None
+        multipliers = speed_multipliers(locations, time_slot, options)
+        route_details = self.estimate_delivery_time(optimized_route, cluster, distance_matrix, multipliers,
+                                                    travel_minutes)
+        if multipliers is not None:
+            route_details['speed_multiplier'] = round(float(np.mean(multipliers)), 3)
+        
+        # Map route indices back to delivery details
+        route_deliveries = []
+        for idx in optimized_route:
+            if idx == 0 and depot_location:  # Depot
+                route_deliveries.append({
+                    'type': 'depot',
+                    'latitude': depot_location[0],
+                    'longitude': depot_location[1],
+                    'name': 'Post Office Depot'
+                })
+            else:
+                adj_idx = idx - 1 if depot_location else idx  # Adjust index if we added a depot
+                if adj_idx < len(cluster):
+                    delivery = cluster[adj_idx].copy()
+                    delivery['type'] = 'delivery'
+                    route_deliveries.append(delivery)
+        
+        result = {
+            'postman_id': f"P{cluster_idx + 1}",
+            'delivery_count': len(cluster),
+            'route': route_deliveries,
+            'statistics': route_details,
+            'improvement': improvement_stats,
+            'distance_model': {
+                'mode': 'sparse' if isinstance(distance_matrix, SparseDistanceGraph) else 'dense',
+                'memory_bytes': distance_matrix.nbytes
+            },
+            'stage_times_ms': stage_times_ms,
+            'solve_time_ms': round((time.perf_counter() - started) * 1000, 2)
+        }
+        if multi_start is not None:
+            result['multi_start'] = multi_start
+        return result
+    
+    def best_of_starts(self, partial_routes):
+        """
+        Merge optimize_cluster results that ran different seeds of the same cluster
+        
+        Args:
+            partial_routes: Route dictionaries of one cluster, each with multi_start statistics
+        
+        Returns:
+            The shortest route, with multi-start statistics over all seeds
+        """
+        best = min(partial_routes, key=lambda route: route['multi_start']['best_km'])
+        starts = sorted((seed, length) for route in partial_routes
+                        for seed, length in zip(route['multi_start']['seeds'], route['multi_start']['lengths_km']))
+        cpu_time_ms = sum(route['multi_start']['cpu_time_ms'] for route in partial_routes)
+        return dict(best,
+                    multi_start=multi_start_summary([seed for seed, _ in starts], [length for _, length in starts],
+                                                    best['multi_start']['best_seed'], cpu_time_ms),
+                    stage_times_ms=dict(best['stage_times_ms'], improvement=round(cpu_time_ms, 2)),
+                    solve_time_ms=max(route['solve_time_ms'] for route in partial_routes))
+    
+    def plan_clusters(self, deliveries, num_postmen=1, depot_location=None, options=None):
+        """
+        Cluster deliveries and prepare one optimize_cluster task per postman
+        
+        Args:
+            deliveries: List of delivery points
+            num_postmen: Number of available postmen
+            depot_location: (latitude, longitude) of post office depot
+            options: Optional solver settings, see route_options_from_request
+            
+        Returns:
+            Tuple of (delivery clusters, list of optimize_cluster argument tuples, clustering statistics)
+        """
+        # Set default depot location if not provided (use first delivery as reference)
+        if not depot_location and deliveries:
+            depot_location = (deliveries[0]['latitude'], deliveries[0]['longitude'])
+        
+        # Cluster deliveries based on number of postmen
+        options = options or {}
+        delivery_clusters, clustering = self.cluster_with_options(deliveries, num_postmen, depot_location, options)
+        
+        # The persistent store holds straight-line distances only
+        use_cache = (self.distance_store is not None and options.get('use_distance_cache', True)
+                     and options.get('distance_backend', 'haversine') == 'haversine')
+        
+        tasks = []
+        for cluster_idx, cluster in enumerate(delivery_clusters):
+            if not cluster:
+                continue
+            
+            # Dense matrices come from the persistent store in one gather, so
+            # worker processes receive them ready-made
+            distance_matrix = None
+            matrix_mode = options.get('matrix_mode', 'auto')
+            if use_cache and (matrix_mode == 'dense' or
+                              (matrix_mode == 'auto' and len(cluster) + 1 <= SPARSE_MATRIX_THRESHOLD)):
+                distance_matrix = self.cached_distance_matrix(cluster, depot_location, options.get('depot_id'))
+            
+            tasks.append((cluster, cluster_idx, depot_location, options, distance_matrix))
+        return delivery_clusters, tasks, clustering
+    
+    def summarize_routes(self, delivery_clusters, routes, options, execution, clustering=None):
+        """
+        Combine optimized cluster routes into the optimize_postman_routes response
+        
+        Args:
+            delivery_clusters: Clusters returned by plan_clusters
+            routes: Route dictionaries from optimize_cluster, in cluster order
+            options: Solver settings used for the routes
+            execution: Dictionary describing how the routes were computed
+            clustering: Optional clustering statistics from plan_clusters
+            
+        Returns:
+            Dictionary with optimized routes and statistics
+        """
+        options = options or {}
+        
+        # Calculate overall statistics
+        total_deliveries = sum(len(cluster) for cluster in delivery_clusters)
+        total_distance = sum(route['statistics']['total_distance_km'] for route in routes)
+        total_time = sum(route['statistics']['total_time_hours'] for route in routes)
+        
+        result = {
+            'success': True,
+            'total_postmen': len(routes),
+            'total_deliveries': total_deliveries,
+            'total_distance_km': round(total_distance, 2),
+            'total_time_hours': round(total_time, 2),
+            'routes': routes,
+            'execution': dict(execution, cluster_time_ms=[route['solve_time_ms'] for route in routes])
+        }
+        if clustering is not None:
+            result['clustering'] = clustering
+        if options.get('deadline_ms') is not None:
+            result['deadline'] = deadline_report(options, routes)
+        result['solver'] = solver_report(options, routes, clustering)
+        
+        starts = [route['multi_start'] for route in routes if 'multi_start' in route]
+        if starts:
+            first_start = sum(stats['first_start_km'] for stats in starts)
+            best = sum(stats['best_km'] for stats in starts)
+            result['multi_start'] = {
+                'starts_per_route': options.get('multi_start'),
+                'seed': options.get('seed', 0),
+                'first_start_distance_km': round(first_start, 2),
+                'best_distance_km': round(best, 2),
+                'distance_saved_km': round(first_start - best, 2),
+                'distance_saved_pct': round((first_start - best) / first_start * 100, 1) if first_start else None,
+                'cpu_time_ms': round(sum(stats['cpu_time_ms'] for stats in starts), 2)
+            }
+        
+        if options.get('improvement', 'two_opt') == 'local_search':
+            time_budget_ms = options.get('time_budget_ms', DEFAULT_TIME_BUDGET_MS)
+            time_used_ms = sum(route['improvement']['time_used_ms'] for route in routes)
+            result['local_search'] = {
+                'time_budget_ms': time_budget_ms,
+                'time_budget_total_ms': time_budget_ms * len(routes) if time_budget_ms else None,
+                'time_used_ms': round(time_used_ms, 2),
+                'budget_used_pct': round(min(time_used_ms / (time_budget_ms * len(routes)), 1.0) * 100, 1)
+                if time_budget_ms and routes else None,
+                'distance_saved_km': round(sum(route['improvement']['distance_saved_km'] for route in routes), 3)
+            }
+        
+        return result
+    
+    def optimize_postman_routes(self, deliveries, num_postmen=1, depot_location=None, options=None, progress=None):
+        """
+        Main function to optimize delivery routes for multiple postmen
+        
+        Args:
+            deliveries: List of delivery points
+            num_postmen: Number of available postmen
+            depot_location: (latitude, longitude) of post office depot
+            options: Optional solver settings, see route_options_from_request
+            progress: Optional callback progress(done, total, route) after each optimized cluster
+            
+        Returns:
+            Dictionary with optimized routes and statistics
+        """
+        try:
+            if not deliveries:
+                return {'error': 'No deliveries provided'}
+            
+            options = options or {}
+            if options.get('planner', 'flat') == 'hierarchical':
+                return self.optimize_hierarchical(deliveries, num_postmen, depot_location, options)
+            
+            started = time.perf_counter()
+            delivery_clusters, tasks, clustering = self.plan_clusters(deliveries, num_postmen, depot_location, options)
+            
+            # Optimize route for each cluster, in worker processes if requested
+            seeds = multi_start_seeds(options)
+            execution_mode, max_workers = resolve_execution(options, len(tasks) * len(seeds))
+            if execution_mode == 'process' and len(seeds) > 1 and len(tasks) < max_workers:
+                # Fewer clusters than workers: spread each cluster's starts over the pool
+                chunks = min(len(seeds), -(-max_workers // len(tasks)))
+                split_tasks = [task + (seeds[chunk::chunks],) for task in tasks for chunk in range(chunks)]
+                partial = run_route_tasks(self.optimize_cluster, _optimize_cluster_task, split_tasks,
+                                          execution_mode, max_workers)
+                routes = [self.best_of_starts(partial[idx * chunks:(idx + 1) * chunks]) for idx in range(len(tasks))]
+                if progress is not None:
+                    for done, route in enumerate(routes, 1):
+                        progress(done, len(routes), route)
+            else:
+                routes = run_route_tasks(self.optimize_cluster, _optimize_cluster_task, tasks,
+                                         execution_mode, max_workers, progress)
+            
+            return self.summarize_routes(delivery_clusters, routes, options, {
+                'mode': execution_mode,
+                'workers': max_workers,
+                'wall_time_ms': round((time.perf_counter() - started) * 1000, 2)
+            }, clustering)
+            
+        except Exception as e:
+            logger.error(f"Error in route optimization: {e}")
+            return {'error': str(e)}
+    
+    def split_regions(self, deliveries, num_postmen, max_deliveries=REGION_MAX_DELIVERIES):
+        """
+        Split deliveries into compact regions by recursive bisection
+        
+        Each split cuts the longer side of the region at the quantile that
+        divides its postmen in two, so every region keeps about the same
+        deliveries per postman. Splitting stops once a region has at most
+        max_deliveries deliveries or a single postman.
+        
+        Args:
+            deliveries: List of delivery points
+            num_postmen: Number of available postmen
+            max_deliveries: Largest region solved in one piece
+        
+        Returns:
+            List of (region deliveries, postmen for the region) tuples
+        """
+        points = project_coordinates([(d['latitude'], d['longitude']) for d in deliveries])
+        regions = []
+        pending = [(np.arange(len(deliveries)), max(1, num_postmen))]
+        while pending:
+            indices, postmen = pending.pop()
+            if len(indices) <= max_deliveries or postmen == 1:
+                regions.append(([deliveries[i] for i in indices], postmen))
+                continue
+            
+            region_points = points[indices]
+            axis = int(np.argmax(np.ptp(region_points, axis=0)))
+            left_postmen = postmen // 2
+            cut = min(max(int(round(len(indices) * left_postmen / postmen)), 1), len(indices) - 1)
+            order = np.argpartition(region_points[:, axis], cut)
+            pending.append((indices[order[cut:]], postmen - left_postmen))
+            pending.append((indices[order[:cut]], left_postmen))
+        return regions
+    
+    def relocate_boundary_stops(self, routes, time_budget_ms=CLEANUP_TIME_BUDGET_MS, neighbor_k=DEFAULT_NEIGHBOR_K,
+                                deadline=None):
+        """
+        Move stops to a neighboring postman's route where that shortens the plan
+        
+        Only stops with a nearby stop on another route are considered, which in
+        a stitched plan are the stops along region and cluster boundaries.
+        Distances are planar (see project_coordinates), accurate at city scale.
+        
+        Args:
+            routes: Route dictionaries; their 'route' lists are updated in place
+            time_budget_ms: Wall-clock budget in milliseconds
+            neighbor_k: Nearby stops examined per stop
+            deadline: Optional time.perf_counter() value at which to stop, whichever comes first
+        
+        Returns:
+            Tuple of (indices of changed routes, cleanup statistics)
+        """
+        started = time.perf_counter()
+        deadline = earliest_deadline(started + time_budget_ms / 1000 if time_budget_ms else None, deadline)
+        
+        stops, sequences, route_of, is_delivery = [], [], [], []
+        for route_idx, route in enumerate(routes):
+            sequence = []
+            for stop in route['route']:
+                sequence.append(len(stops))
+                stops.append(stop)
+                route_of.append(route_idx)
+                is_delivery.append(stop.get('type') != 'depot')
+            sequences.append(sequence)
+        
+        deliveries = np.flatnonzero(is_delivery)
+        if len(deliveries) < 2 or len(routes) < 2:
+            return set(), {'moves': 0, 'distance_saved_km': 0.0, 'time_ms': 0.0}
+        
+        xy = project_coordinates([(stop['latitude'], stop['longitude']) for stop in stops]).tolist()
+        position = {stop_id: pos for sequence in sequences for pos, stop_id in enumerate(sequence)}
+        _, neighbor_ids = cKDTree(np.array(xy)[deliveries]).query(
+            np.array(xy)[deliveries], k=min(neighbor_k + 1, len(deliveries))
+        )
+        neighbors = {int(stop_id): [int(deliveries[j]) for j in row[1:]]
+                     for stop_id, row in zip(deliveries, neighbor_ids)}
+        limits = [max(MAX_DELIVERIES_PER_POSTMAN, sum(1 for stop_id in sequence if is_delivery[stop_id]))
+                  for sequence in sequences]
+        counts = [sum(1 for stop_id in sequence if is_delivery[stop_id]) for sequence in sequences]
+        
+        def dist(a, b):
+            if a is None or b is None:
+                return 0.0
+            return math.hypot(xy[a][0] - xy[b][0], xy[a][1] - xy[b][1])
+        
+        def around(stop_id):
+            sequence = sequences[route_of[stop_id]]
+            pos = position[stop_id]
+            return (sequence[pos - 1] if pos > 0 else None,
+                    sequence[pos + 1] if pos + 1 < len(sequence) else None)
+        
+        changed = set()
+        moves = 0
+        saved = 0.0
+        timed_out = False
+        for _ in range(CLEANUP_MAX_PASSES):
+            improved = False
+            for stop_id in deliveries.tolist():
+                if deadline is not None and time.perf_counter() > deadline:
+                    timed_out = True
+                    break
+                source = route_of[stop_id]
+                others = [n for n in neighbors[stop_id] if route_of[n] != source]
+                if not others:
+                    continue
+                
+                prev_stop, next_stop = around(stop_id)
+                gain = dist(prev_stop, stop_id) + dist(stop_id, next_stop) - (
+                    dist(prev_stop, next_stop) if prev_stop is not None and next_stop is not None else 0.0)
+                
+                # Cheapest slot next to a nearby stop of another route
+                best = None
+                for neighbor in others:
+                    target = route_of[neighbor]
+                    if counts[target] >= limits[target] and counts[target] >= counts[source]:
+                        continue
+                    before, after = around(neighbor)
+                    for a, b, pos in ((neighbor, after, position[neighbor] + 1),
+                                      (before, neighbor, position[neighbor])):
+                        if a is None:
+                            continue  # Never insert ahead of a route's first stop
+                        cost = dist(a, stop_id) + dist(stop_id, b) - dist(a, b)
+                        if best is None or cost < best[0]:
+                            best = (cost, target, pos)
+                
+                if best is None or best[0] >= gain - IMPROVEMENT_EPSILON:
+                    continue
+                
+                cost, target, pos = best
+                sequences[source].pop(position[stop_id])
+                sequences[target].insert(pos, stop_id)
+                for route_idx in (source, target):
+                    for idx, other in enumerate(sequences[route_idx]):
+                        position[other] = idx
+                route_of[stop_id] = target
+                counts[source] -= 1
+                counts[target] += 1
+                changed.update((source, target))
+                moves += 1
+                saved += gain - cost
+                improved = True
+            if not improved or timed_out:
+                break
+        
+        for route_idx in changed:
+            routes[route_idx]['route'] = [stops[stop_id] for stop_id in sequences[route_idx]]
+        
+        return changed, {
+            'moves': moves,
+            'distance_saved_km': round(saved, 3),
+            'time_ms': round((time.perf_counter() - started) * 1000, 2),
+            'converged': not timed_out
+        }
+    
+    def optimize_hierarchical(self, deliveries, num_postmen=1, depot_location=None, options=None):
+        """
+        Plan a city-wide day region by region
+        
+        Deliveries are split into regions by recursive bisection, every region
+        runs through the regular optimize_postman_routes pipeline (in worker
+        processes in process mode), and stops along region boundaries are then
+        relocated between neighboring routes.
+        
+        Args:
+            deliveries: List of delivery points
+            num_postmen: Number of available postmen
+            depot_location: (latitude, longitude) of post office depot
+            options: Optional solver settings, see route_options_from_request
+            
+        Returns:
+            Dictionary with optimized routes and statistics
+        """
+        options = options or {}
+        started = time.perf_counter()
+        if not depot_location:
+            depot_location = (deliveries[0]['latitude'], deliveries[0]['longitude'])
+        
+        regions = self.split_regions(deliveries, num_postmen,
+                                     options.get('region_max_deliveries', REGION_MAX_DELIVERIES))
+        region_options = dict(options, planner='flat', execution_mode='serial')
+        tasks = []
+        for region_idx, (region, postmen) in enumerate(regions):
+            if options.get('warm_start'):
+                region_options = dict(region_options, centroid_scope=f"region:{region_idx}")
+            tasks.append((region, postmen, depot_location, region_options))
+        
+        execution_mode, max_workers = resolve_execution(options, len(tasks))
+        if execution_mode == 'process':
+            results = run_in_process_pool(_optimize_region_task, tasks, max_workers)
+        else:
+            results = [self.optimize_postman_routes(*task) for task in tasks]
+        
+        # Stitch the regions into one plan with plan-wide postman IDs
+        routes = []
+        for region_idx, result in enumerate(results):
+            if 'error' in result:
+                raise RuntimeError(f"Region {region_idx} failed: {result['error']}")
+            for route in result['routes']:
+                route['postman_id'] = f"P{len(routes) + 1}"
+                route['region'] = region_idx
+                routes.append(route)
+        
+        request_deadline = SearchDeadline.from_options(options)
+        changed, cleanup = self.relocate_boundary_stops(routes, deadline=request_deadline.perf_deadline())
+        for route_idx in changed:
+            route = routes[route_idx]
+            route['delivery_count'] = sum(1 for stop in route['route'] if stop.get('type') != 'depot')
+            route['statistics'] = self.route_stop_statistics(route['route'])
+        
+        delivery_clusters = [[stop for stop in route['route'] if stop.get('type') != 'depot'] for route in routes]
+        result = self.summarize_routes(delivery_clusters, routes, options, {
+            'mode': execution_mode,
+            'workers': max_workers,
+            'wall_time_ms': round((time.perf_counter() - started) * 1000, 2)
+        })
+        result['hierarchy'] = {
+            'regions': len(regions),
+            'region_deliveries': [len(region) for region, _ in regions],
+            'region_postmen': [postmen for _, postmen in regions],
+            'cleanup': cleanup
+        }
+        if 'deadline' in result and not cleanup['converged'] and request_deadline.expired():
+            result['deadline'].update(converged=False, cut_off=True)
+        return result
+    
+    def assign_depots(self, deliveries, depots):
+        """
+        Assign deliveries to the nearest depot that still has postman capacity
+        
+        Depots are looked up with a KD-tree; deliveries are placed in order of
+        regret (extra distance to their second-nearest depot) so the ones with
+        a clear home depot claim capacity first. A depot holds up to
+        num_postmen * MAX_DELIVERIES_PER_POSTMAN deliveries; when every depot is
+        full the nearest one is used.
+        
+        Args:
+            deliveries: List of delivery points
+            depots: List of depot dictionaries with latitude, longitude and num_postmen
+        
+        Returns:
+            List of delivery lists, one per depot
+        """
+        depot_locations = [(depot['latitude'], depot['longitude']) for depot in depots]
+        projected = project_coordinates(depot_locations + [(d['latitude'], d['longitude']) for d in deliveries])
+        k = len(depots)
+        distances, nearest = cKDTree(projected[:k]).query(projected[k:], k=k)
+        distances = np.asarray(distances).reshape(len(deliveries), k)
+        nearest = np.asarray(nearest).reshape(len(deliveries), k)
+        
+        capacity = [depot['num_postmen'] * MAX_DELIVERIES_PER_POSTMAN for depot in depots]
+        counts = [0] * k
+        assignment = nearest[:, 0].copy()
+        if k > 1:
+            regret = distances[:, 1] - distances[:, 0]
+            preferences = nearest.tolist()
+            for i in np.argsort(-regret, kind='stable').tolist():
+                choice = next((depot_idx for depot_idx in preferences[i] if counts[depot_idx] < capacity[depot_idx]),
+                              preferences[i][0])
+                assignment[i] = choice
+                counts[choice] += 1
+        
+        depot_deliveries = [[] for _ in depots]
+        for delivery, depot_idx in zip(deliveries, assignment.tolist()):
+            depot_deliveries[depot_idx].append(delivery)
+        return depot_deliveries
+    
+    def optimize_multi_depot(self, deliveries, depots, options=None):
+        """
+        Optimize routes for several post offices in one plan
+        
+        Deliveries are split between depots with assign_depots, then every
+        depot's postmen are optimized; in process mode the clusters of all
+        depots share one window on the worker pool.
+        
+        Args:
+            deliveries: List of delivery points
+            depots: List of depot dictionaries (depot_id, latitude, longitude, num_postmen)
+            options: Optional solver settings, see route_options_from_request
+        
+        Returns:
+            Dictionary with one optimize_postman_routes style result per depot and overall totals
+        """
+        try:
+            if not deliveries:
+                return {'error': 'No deliveries provided'}
+            if not depots:
+                return {'error': 'No depots provided'}
+            
+            options = options or {}
+            started = time.perf_counter()
+            depot_deliveries = self.assign_depots(deliveries, depots)
+            
+            depot_results = [None] * len(depots)
+            if options.get('planner', 'flat') == 'hierarchical':
+                for depot_idx, depot in enumerate(depots):
+                    if depot_deliveries[depot_idx]:
+                        depot_results[depot_idx] = self.optimize_postman_routes(
+                            depot_deliveries[depot_idx], depot['num_postmen'],
+                            (depot['latitude'], depot['longitude']), dict(options, depot_id=depot['depot_id'])
+                        )
+                # Each depot runs its regions on the pool itself; report how they ran
+                execution = next((result['execution'] for result in depot_results
+                                  if result is not None and 'execution' in result), {})
+                execution_mode, max_workers = execution.get('mode', 'serial'), execution.get('workers', 1)
+            else:
+                # Cluster every depot up front, then optimize all clusters together
+                plans = {}
+                flat_tasks = []
+                for depot_idx, depot in enumerate(depots):
+                    if not depot_deliveries[depot_idx]:
+                        continue
+                    plans[depot_idx] = self.plan_clusters(
+                        depot_deliveries[depot_idx], depot['num_postmen'],
+                        (depot['latitude'], depot['longitude']), dict(options, depot_id=depot['depot_id'])
+                    )
+                    flat_tasks.extend((depot_idx, task) for task in plans[depot_idx][1])
+                
+                execution_mode, max_workers = resolve_execution(options, len(flat_tasks))
+                if execution_mode == 'process':
+                    routes = run_in_process_pool(_optimize_cluster_task, [task for _, task in flat_tasks], max_workers)
+                else:
+                    routes = [self.optimize_cluster(*task) for _, task in flat_tasks]
+                
+                for depot_idx, (delivery_clusters, _, clustering) in plans.items():
+                    depot_routes = [route for (owner, _), route in zip(flat_tasks, routes) if owner == depot_idx]
+                    depot_results[depot_idx] = self.summarize_routes(delivery_clusters, depot_routes, options, {
+                        'mode': execution_mode,
+                        'workers': max_workers,
+                        'wall_time_ms': round((time.perf_counter() - started) * 1000, 2)
+                    }, clustering)
+            
+            depot_summaries = []
+            for depot, result in zip(depots, depot_results):
+                if result is None:
+                    result = {'success': True, 'total_postmen': 0, 'total_deliveries': 0,
+                              'total_distance_km': 0.0, 'total_time_hours': 0.0, 'routes': []}
+                elif 'error' in result:
+                    return {'error': f"Depot {depot['depot_id']}: {result['error']}"}
+                for route in result['routes']:
+                    route['postman_id'] = f"{depot['depot_id']}-{route['postman_id']}"
+                    route['depot_id'] = depot['depot_id']
+                depot_summaries.append(dict(result, depot_id=depot['depot_id'], depot_latitude=depot['latitude'],
+                                            depot_longitude=depot['longitude'], num_postmen=depot['num_postmen']))
+            
+            result = {
+                'success': True,
+                'total_depots': len(depots),
+                'total_postmen': sum(result['total_postmen'] for result in depot_summaries),
+                'total_deliveries': sum(result['total_deliveries'] for result in depot_summaries),
+                'total_distance_km': round(sum(result['total_distance_km'] for result in depot_summaries), 2),
+                'total_time_hours': round(sum(result['total_time_hours'] for result in depot_summaries), 2),
+                'depots': depot_summaries,
+                'execution': {
+                    'mode': execution_mode,
+                    'workers': max_workers,
+                    'wall_time_ms': round((time.perf_counter() - started) * 1000, 2)
+                }
+            }
+            if options.get('deadline_ms') is not None:
+                result['deadline'] = deadline_report(
+                    options, [route for depot in depot_summaries for route in depot['routes']]
+                )
+                if any(depot.get('deadline', {}).get('cut_off') for depot in depot_summaries):
+                    result['deadline'].update(converged=False, cut_off=True)
+            return result
+            
+        except Exception as e:
+            logger.error(f"Error in multi-depot route optimization: {e}")
+            return {'error': str(e)}
+    
+    def iter_time_slot_results(self, deliveries, num_postmen=1, depot_location=None, options=None, progress=None):
+        """
+        Optimize every time slot and yield each slot's result as soon as it is ready
+        
+        In process mode the clusters of all slots share one bounded window on the
+        worker pool, so slot-level and cluster-level parallelism together never
+        exceed max_workers.
+        
+        Args:
+            deliveries: List of delivery points with time slots
+            num_postmen: Number of available postmen
+            depot_location: (latitude, longitude) of post office depot
+            options: Optional solver settings, see route_options_from_request
+            progress: Optional callback progress(done, total, route) after each optimized cluster of any slot
+            
+        Yields:
+            Tuples of (time slot, optimize_postman_routes style result) in completion order
+        """
+        options = options or {}
+        started = time.perf_counter()
+        
+        # Group deliveries by time slot
+        time_slot_deliveries = {}
+        for delivery in deliveries:
+            time_slot = delivery.get('time_slot')
+            if time_slot not in time_slot_deliveries:
+                time_slot_deliveries[time_slot] = []
+            time_slot_deliveries[time_slot].append(delivery)
+        
+        # Cluster every slot up front, then fan out all cluster tasks together
+        plans = {}
+        flat_tasks = []
+        for time_slot, slot_deliveries in time_slot_deliveries.items():
+            try:
+                # Each slot keeps its own warm-start centroids
+                slot_options = dict(options, centroid_scope=f"slot:{time_slot}") if options.get('warm_start') else options
+                delivery_clusters, tasks, clustering = self.plan_clusters(
+                    slot_deliveries, num_postmen, depot_location, slot_options
+                )
+            except Exception as e:
+                logger.error(f"Error planning time slot {time_slot}: {e}")
+                yield time_slot, {'error': str(e)}
+                continue
+            plans[time_slot] = {
+                'clusters': delivery_clusters,
+                'tasks': tasks,
+                'clustering': clustering,
+                'routes': [None] * len(tasks),
+                'remaining': len(tasks)
+            }
+            flat_tasks.extend((time_slot, position, task) for position, task in enumerate(tasks))
+        
+        execution_mode, max_workers = resolve_execution(options, len(flat_tasks))
+        routes_done = 0
+        
+        def finish(time_slot):
+            plan = plans[time_slot]
+            return time_slot, self.summarize_routes(plan['clusters'], plan['routes'], options, {
+                'mode': execution_mode,
+                'workers': max_workers,
+                'wall_time_ms': round((time.perf_counter() - started) * 1000, 2)
+            }, plan['clustering'])
+        
+        if execution_mode == 'process':
+            failed = set()
+            for index, route, error in iter_process_pool(
+                _optimize_cluster_task, [task for _, _, task in flat_tasks], max_workers
+            ):
+                time_slot, position, _ = flat_tasks[index]
+                if time_slot in failed:
+                    continue
+                if error is not None:
+                    logger.error(f"Error in time slot {time_slot} route optimization: {error}")
+                    failed.add(time_slot)
+                    yield time_slot, {'error': str(error)}
+                    continue
+                
+                plan = plans[time_slot]
+                plan['routes'][position] = route
+                plan['remaining'] -= 1
+                routes_done += 1
+                if progress is not None:
+                    progress(routes_done, len(flat_tasks), route)
+                if plan['remaining'] == 0:
+                    yield finish(time_slot)
+        else:
+            for time_slot, plan in plans.items():
+                try:
+                    for position, task in enumerate(plan['tasks']):
+                        plan['routes'][position] = self.optimize_cluster(*task)
+                        routes_done += 1
+                        if progress is not None:
+                            progress(routes_done, len(flat_tasks), plan['routes'][position])
+                except Exception as e:
+                    logger.error(f"Error in time slot {time_slot} route optimization: {e}")
+                    yield time_slot, {'error': str(e)}
+                    continue
+                yield finish(time_slot)
+    
+    def optimize_by_time_slot(self, deliveries, num_postmen=1, depot_location=None, options=None, progress=None):
+        """
+        Optimize routes by time slot to handle scheduled deliveries
+        
+        Args:
+            deliveries: List of delivery points with time slots
+            num_postmen: Number of available postmen
+            depot_location: (latitude, longitude) of post office depot
+            options: Optional solver settings, see route_options_from_request
+            progress: Optional callback progress(done, total, route) after each optimized cluster
+            
+        Returns:
+            Dictionary with optimized routes per time slot
+        """
+        try:
+            if not deliveries:
+                return {'error': 'No deliveries provided'}
+            
+            # Collect slot results, then restore the order in which slots first appear
+            finished = dict(self.iter_time_slot_results(deliveries, num_postmen, depot_location, options, progress))
+            slot_order = list(dict.fromkeys(delivery.get('time_slot') for delivery in deliveries))
+            time_slot_routes = {time_slot: finished[time_slot] for time_slot in slot_order if time_slot in finished}
+            
+            return self.summarize_time_slots(time_slot_routes, num_postmen, options)
+            
+        except Exception as e:
+            logger.error(f"Error in time slot route optimization: {e}")
+            return {'error': str(e)}
+    
+    def summarize_time_slots(self, time_slot_routes, num_postmen, options=None):
+        """
+        Build the optimize_by_time_slot response from per-slot results
+        
+        Args:
+            time_slot_routes: Dictionary of time slot -> optimize_postman_routes result
+            num_postmen: Number of available postmen
+            options: Solver settings used for the slots
+            
+        Returns:
+            Dictionary with optimized routes per time slot
+        """
+        options = options or {}
+        
+        # Calculate overall statistics
+        total_deliveries = sum(result['total_deliveries'] for result in time_slot_routes.values())
+        total_distance = sum(result['total_distance_km'] for result in time_slot_routes.values())
+        
+        summary = {
+            'success': True,
+            'total_time_slots': len(time_slot_routes),
+            'total_postmen': num_postmen,
+            'total_deliveries': total_deliveries,
+            'total_distance_km': round(total_distance, 2),
+            'time_slot_routes': time_slot_routes
+        }
+        if options.get('deadline_ms') is not None:
+            summary['deadline'] = deadline_report(
+                options, [route for result in time_slot_routes.values() for route in result.get('routes', [])]
+            )
+        return summary
+    
+    def optimize_time_window_cluster(self, cluster, cluster_idx, depot_location, options=None):
+        """
+        Sequence one postman's whole shift with each stop's time slot as a window
+        
+        Args:
+            cluster: List of delivery points assigned to the postman
+            cluster_idx: Position of the cluster, used for the postman ID
+            depot_location: (latitude, longitude) of post office depot
+            options: Optional solver settings (time_windows, shift_start, time_budget_ms, matrix_mode)
+        
+        Returns:
+            Dictionary with the ordered route with ETAs, statistics and solve time
+        """
+        started = time.perf_counter()
+        options = options or {}
+        hard = options.get('time_windows', 'soft') == 'hard'
+        start_minute = clock_minutes(options.get('shift_start', SHIFT_START_TIME))
+        
+        locations = [depot_location] + [(d['latitude'], d['longitude']) for d in cluster]
+        # Each stop's slot sets the speed around it, the depot's is the shift start's
+        slots = [time_slot_at(start_minute) or 0] + [time_slot_number(d.get('time_slot')) or 0 for d in cluster]
+        multipliers = speed_multipliers(locations, slots, options)
+        travel_minutes = None
+        if options.get('distance_backend', 'haversine') == 'road':
+            # Arrivals follow the same road minutes optimize_cluster prices routes with
+            distance_matrix, travel_minutes = self.road_matrices(locations)
+        else:
+            # Per-leg speeds need a dense matrix
+            matrix_mode = 'dense' if multipliers is not None else options.get('matrix_mode', 'auto')
+            distance_matrix = self.build_distance_model(locations, matrix_mode)
+        
+        # Index 0 is the depot: no window, no service
+        opens, closes, service = [start_minute], [math.inf], [0.0]
+        for delivery in cluster:
+            window = time_slot_window(delivery.get('time_slot'))
+            opens.append(window[0] if window else start_minute)
+            closes.append(window[1] if window else math.inf)
+            service.append(DELIVERY_TIME_MINUTES.get(delivery.get('address_type', 0), 5))
+        
+        search = TimeWindowSearch(
+            distance_matrix, opens, closes, service, start_minute,
+            HARD_WINDOW_PENALTY_KM_PER_MINUTE if hard else SOFT_WINDOW_PENALTY_KM_PER_MINUTE,
+            travel_minutes=travel_minutes, multipliers=multipliers
+        )
+        request_deadline = SearchDeadline.from_options(options)
+        route, search_stats = search.run(search.construct(), options.get('time_budget_ms', DEFAULT_TIME_BUDGET_MS),
+                                         request_deadline.perf_deadline())
+        if request_deadline.at is not None:
+            search_stats['cut_off'] = request_deadline.expired() and not search_stats['converged']
+        states = search.states(route)
+        
+        route_deliveries = [{
+            'type': 'depot',
+            'latitude': depot_location[0],
+            'longitude': depot_location[1],
+            'name': 'Post Office Depot'
+        }]
+        late_stops = 0
+        waiting_minutes = 0.0
+        driving_minutes = 0.0
+        for position in range(1, len(route)):
+            idx = route[position]
+            departure, _, _ = states[position]
+            service_start = departure - service[idx]
+            leg_minutes = search.leg_minutes(route[position - 1], idx)
+            driving_minutes += leg_minutes
+            wait = service_start - (states[position - 1][0] + leg_minutes)
+            late = max(service_start - closes[idx], 0.0)
+            waiting_minutes += wait
+            late_stops += late > 0
+            
+            delivery = cluster[idx - 1].copy()
+            delivery['type'] = 'delivery'
+            delivery['eta'] = format_clock(service_start)
+            if not math.isinf(closes[idx]):
+                delivery['window'] = f"{format_clock(opens[idx])}-{format_clock(closes[idx])}"
+            delivery['wait_minutes'] = round(wait, 1)
+            delivery['late_minutes'] = round(late, 1)
+            route_deliveries.append(delivery)
+        
+        end_minute, total_distance, late_minutes = states[-1]
+        travel_time_hours = driving_minutes / 60
+        service_time_hours = sum(service) / 60
+        total_time_hours = (end_minute - start_minute) / 60
+        
+        return {
+            'postman_id': f"P{cluster_idx + 1}",
+            'delivery_count': len(cluster),
+            'route': route_deliveries,
+            'statistics': {
+                'total_distance_km': round(total_distance, 2),
+                'travel_time_hours': round(travel_time_hours, 2),
+                'service_time_hours': round(service_time_hours, 2),
+                'waiting_time_hours': round(waiting_minutes / 60, 2),
+                'total_time_hours': round(total_time_hours, 2),
+                'estimated_completion_minutes': round(total_time_hours * 60, 0),
+                'start_time': format_clock(start_minute),
+                'end_time': format_clock(end_minute),
+                'late_stops': int(late_stops),
+                'late_minutes': round(late_minutes, 1)
+            },
+            'improvement': search_stats,
+            'solve_time_ms': round((time.perf_counter() - started) * 1000, 2)
+        }
+    
+    def optimize_time_windows(self, deliveries, num_postmen=1, depot_location=None, options=None, progress=None):
+        """
+        Plan each postman's full shift in one pass with time slots as delivery windows
+        
+        Deliveries are clustered once for the whole day and each postman's
+        stops are sequenced by TimeWindowSearch, instead of solving every slot
+        independently from the depot. With "hard" windows lateness outweighs
+        any detour; with "soft" windows a late minute costs
+        SOFT_WINDOW_PENALTY_KM_PER_MINUTE km. With compare_baseline, the
+        per-slot plan of optimize_by_time_slot is solved as well and its
+        distance and solve time are reported next to this plan's.
+        
+        Args:
+            deliveries: List of delivery points with time slots
+            num_postmen: Number of available postmen
+            depot_location: (latitude, longitude) of post office depot
+            options: Optional solver settings, see route_options_from_request
+            progress: Optional callback progress(done, total, route) after each sequenced postman
+        
+        Returns:
+            Dictionary with optimized routes and statistics, as optimize_postman_routes
+        """
+        try:
+            if not deliveries:
+                return {'error': 'No deliveries provided'}
+            
+            options = options or {}
+            started = time.perf_counter()
+            if not depot_location:
+                depot_location = (deliveries[0]['latitude'], deliveries[0]['longitude'])
+            for delivery in deliveries:
+                time_slot_window(delivery.get('time_slot'))  # Reject unknown slots before solving
+            
+            delivery_clusters, clustering = self.cluster_with_options(deliveries, num_postmen, depot_location, options)
+            tasks = [(cluster, cluster_idx, depot_location, options)
+                     for cluster_idx, cluster in enumerate(delivery_clusters) if cluster]
+            
+            execution_mode, max_workers = resolve_execution(options, len(tasks))
+            routes = run_route_tasks(self.optimize_time_window_cluster, _optimize_time_window_task, tasks,
+                                     execution_mode, max_workers, progress)
+            
+            solve_time_ms = round((time.perf_counter() - started) * 1000, 2)
+            result = self.summarize_routes(delivery_clusters, routes, options, {
+                'mode': execution_mode,
+                'workers': max_workers,
+                'wall_time_ms': solve_time_ms
+            }, clustering)
+            result['time_windows'] = {
+                'mode': options.get('time_windows', 'soft'),
+                'shift_start': options.get('shift_start', SHIFT_START_TIME),
+                'late_stops': sum(route['statistics']['late_stops'] for route in routes),
+                'late_minutes': round(sum(route['statistics']['late_minutes'] for route in routes), 1),
+                'solve_time_ms': solve_time_ms
+            }
+            
+            # The baseline is extra work, so it never runs past the request deadline
+            if options.get('compare_baseline', False) and not SearchDeadline.from_options(options).expired():
+                baseline_options = {key: value for key, value in options.items() if key != 'time_windows'}
+                baseline_started = time.perf_counter()
+                baseline = self.optimize_by_time_slot(deliveries, num_postmen, depot_location, baseline_options)
+                if baseline.get('success'):
+                    saved = baseline['total_distance_km'] - result['total_distance_km']
+                    result['baseline'] = {
+                        'planner': 'by_time_slot',
+                        'total_distance_km': baseline['total_distance_km'],
+                        'solve_time_ms': round((time.perf_counter() - baseline_started) * 1000, 2),
+                        'distance_saved_km': round(saved, 2),
+                        'distance_saved_pct': round(saved / baseline['total_distance_km'] * 100, 1)
+                        if baseline['total_distance_km'] else None
+                    }
+                else:
+                    result['baseline'] = {'planner': 'by_time_slot', 'error': baseline.get('error')}
+            
+            return result
         
-        return clustered_deliveries
+        except Exception as e:
+            logger.error(f"Error in time window route optimization: {e}")
+            return {'error': str(e)}
     
-    def estimate_delivery_time(self, route, deliveries, distance_matrix):
+    def batch_eta(self, routes, start_time=SHIFT_START_TIME, speed_km_per_hour=POSTMAN_SPEED_KM_PER_HOUR,
+                  conditions=None):
         """
-        Estimate the time required for completing a delivery route
+        Arrival and departure times for many routes in one vectorized pass
+        
+        All stops are stacked into one array; leg distances, travel minutes and
+        cumulative arrival times are computed with NumPy and restarted at the
+        first stop of every route.
         
         Args:
-            route: List of indices representing the route
-            deliveries: List of delivery details
-            distance_matrix: 2D array of distances between points
-            
+            routes: Route dictionaries with a 'route' list of stops (as returned by
+                    optimize_postman_routes) or plain lists of stops; a route may set its own start_time
+            start_time: 'HH:MM' departure from each route's first stop
+            speed_km_per_hour: Travel speed
+            conditions: Optional traffic-aware settings from speed_conditions_from_request;
+                        each route uses the slot of its start time
+        
         Returns:
-            Dictionary with estimated times and distances
+            Dictionary with one entry per route holding the stops with ETAs and route totals
         """
-        total_distance = self.calculate_route_distance(route, distance_matrix)
+        stop_lists, start_minutes = [], []
+        for route in routes:
+            stops = route.get('route', []) if isinstance(route, dict) else route
+            for stop in stops:
+                if 'latitude' not in stop or 'longitude' not in stop:
+                    raise ValueError("Every stop needs latitude and longitude")
+            stop_lists.append(stops)
+            start_minutes.append(clock_minutes(route.get('start_time', start_time) if isinstance(route, dict)
+                                               else start_time))
         
-        # Calculate travel time (in hours)
-        travel_time_hours = total_distance / POSTMAN_SPEED_KM_PER_HOUR
+        lengths = np.array([len(stops) for stops in stop_lists], dtype=np.int64)
+        all_stops = [stop for stops in stop_lists for stop in stops]
+        points = np.array([(stop['latitude'], stop['longitude']) for stop in all_stops],
+                          dtype=np.float64).reshape(-1, 2)
+        service = np.array([0.0 if stop.get('type') == 'depot' else DELIVERY_TIME_MINUTES.get(stop.get('address_type', 0), 5)
+                            for stop in all_stops], dtype=np.float64)
         
-        # Calculate total service time (in hours)
-        service_time_hours = 0
-        for idx in route:
-            if idx < len(deliveries):  # Skip depot if included
-                address_type = deliveries[idx].get('address_type', 0)
-                service_time_hours += DELIVERY_TIME_MINUTES.get(address_type, 5) / 60
+        # Leg into every stop; the first stop of a route is where the postman starts
+        firsts = np.concatenate(([0], np.cumsum(lengths)[:-1])).astype(np.int64)
+        firsts = firsts[lengths > 0]
+        legs = np.zeros(len(points))
+        if len(points) > 1:
+            legs[1:] = haversine_pairs(points[:-1], points[1:])
+        legs[firsts] = 0.0
+        travel = legs / speed_km_per_hour * 60
         
-        # Total route time
-        total_time_hours = travel_time_hours + service_time_hours
+        # Traffic-aware speeds, each route at the slot of its start time
+        route_of = np.repeat(np.arange(len(stop_lists)), lengths)
+        route_slots = np.array([time_slot_at(minute) or 0 for minute in start_minutes], dtype=np.int64)
+        multipliers = speed_multipliers(points, route_slots[route_of], conditions)
+        if multipliers is not None and len(points) > 1:
+            factors = np.ones(len(points))
+            factors[1:] = (multipliers[:-1] + multipliers[1:]) / 2
+            travel /= factors
+        
+        # Per-route cumulative sums: global cumsum minus its value where each route begins
+        cumulative_travel = np.cumsum(travel)
+        service_before = np.cumsum(service) - service
+        route_travel_base = np.zeros(len(stop_lists))
+        route_service_base = np.zeros(len(stop_lists))
+        route_travel_base[lengths > 0] = cumulative_travel[firsts]
+        route_service_base[lengths > 0] = service_before[firsts]
+        arrivals = (np.asarray(start_minutes, dtype=np.float64)[route_of]
+                    + cumulative_travel - route_travel_base[route_of]
+                    + service_before - route_service_base[route_of])
+        departures = arrivals + service
+        
+        arrival_list, departure_list = arrivals.tolist(), departures.tolist()
+        leg_list, travel_list = legs.tolist(), travel.tolist()
+        distance_per_route = np.bincount(route_of, weights=legs, minlength=len(stop_lists))
+        
+        results = []
+        position = 0
+        for route_idx, (route, stops) in enumerate(zip(routes, stop_lists)):
+            route_stops = []
+            for stop in stops:
+                stop = dict(stop)
+                stop['eta'] = format_clock(arrival_list[position])
+                stop['departure'] = format_clock(departure_list[position])
+                stop['travel_distance_km'] = round(leg_list[position], 3)
+                stop['travel_time_minutes'] = round(travel_list[position], 1)
+                route_stops.append(stop)
+                position += 1
+            end_minute = departure_list[position - 1] if stops else start_minutes[route_idx]
+            results.append({
+                'postman_id': route.get('postman_id') if isinstance(route, dict) else None,
+                'route_with_eta': route_stops,
+                'start_time': format_clock(start_minutes[route_idx]),
+                'end_time': format_clock(end_minute),
+                'total_distance_km': round(float(distance_per_route[route_idx]), 2),
+                'total_time_hours': round((end_minute - start_minutes[route_idx]) / 60, 2)
+            })
         
         return {
-            'total_distance_km': round(total_distance, 2),
-            'travel_time_hours': round(travel_time_hours, 2),
-            'service_time_hours': round(service_time_hours, 2),
-            'total_time_hours': round(total_time_hours, 2),
-            'estimated_completion_minutes': round(total_time_hours * 60, 0)
+            'success': True,
+            'total_routes': len(results),
+            'total_stops': len(all_stops),
+            'routes': results
         }
     
-    def optimize_postman_routes(self, deliveries, num_postmen=1, depot_location=None):
+    def route_stop_statistics(self, stops, distance_matrix=None):
         """
-        Main function to optimize delivery routes for multiple postmen
+        Recompute the statistics of a route given as a list of stops
         
         Args:
-            deliveries: List of delivery points
-            num_postmen: Number of available postmen
-            depot_location: (latitude, longitude) of post office depot
-            
+            stops: Ordered stops from a route response (depot first if present)
+            distance_matrix: Optional distance model over the stops in this order
+        
         Returns:
-            Dictionary with optimized routes and statistics
+            Dictionary with estimated times and distances, as in optimize_cluster
+        """
+        if distance_matrix is None:
+            distance_matrix = self.build_distance_model([(stop['latitude'], stop['longitude']) for stop in stops])
+        deliveries = [stop for stop in stops if stop.get('type') != 'depot']
+        return self.estimate_delivery_time(list(range(len(stops))), deliveries, distance_matrix)
+    
+    def insert_deliveries(self, routes, new_deliveries, options=None):
+        """
+        Add late deliveries to an existing plan with cheapest insertion
+        
+        Each new stop goes to the position, over all postmen with spare capacity,
+        that adds the least distance. Routes that receive no stop are returned
+        unchanged; with options['repair'] the changed routes get a short local search.
+        
+        Args:
+            routes: 'routes' list from an optimize_postman_routes result
+            new_deliveries: List of delivery points to add
+            options: Optional settings (repair, time_budget_ms, local_search_operators)
+        
+        Returns:
+            Dictionary with the updated routes, where each delivery went and plan totals
         """
         try:
-            if not deliveries:
+            if not routes:
+                return {'error': 'No routes provided'}
+            if not new_deliveries:
                 return {'error': 'No deliveries provided'}
             
-            # Set default depot location if not provided (use first delivery as reference)
-            if not depot_location and deliveries:
-                depot_location = (deliveries[0]['latitude'], deliveries[0]['longitude'])
-            
-            # Cluster deliveries based on number of postmen
-            delivery_clusters = self.cluster_deliveries(deliveries, num_postmen)
+            options = options or {}
+            started = time.perf_counter()
+            routes = [dict(route, route=list(route['route'])) for route in routes]
+            coordinates = [
+                np.array([[stop['latitude'], stop['longitude']] for stop in route['route']], dtype=np.float64).reshape(-1, 2)
+                for route in routes
+            ]
+            legs = [haversine_pairs(coords[:-1], coords[1:]) for coords in coordinates]
+            counts = [sum(1 for stop in route['route'] if stop.get('type') != 'depot') for route in routes]
             
-            # Optimize route for each cluster
-            routes = []
-            for cluster_idx, cluster in enumerate(delivery_clusters):
-                if not cluster:
-                    continue
+            insertions = []
+            inserted_stops = []
+            touched = set()
+            for delivery in new_deliveries:
+                # One distance row from the new stop to every stop of the plan; the
+                # cost of inserting after stop k is d(k, x) + d(x, k+1) - d(k, k+1),
+                # or just d(k, x) after the last stop of a route
+                all_coordinates = np.concatenate(coordinates)
+                lengths = np.array([len(coords) for coords in coordinates])
+                owners = np.repeat(np.arange(len(routes)), lengths)
+                is_last = np.zeros(len(all_coordinates), dtype=bool)
+                is_last[(np.cumsum(lengths) - 1)[lengths > 0]] = True
                 
-                # Create locations list including depot
-                locations = [(d['latitude'], d['longitude']) for d in cluster]
-                if depot_location:
-                    locations.insert(0, depot_location)  # Add depot as first location
+                point = np.array([[delivery['latitude'], delivery['longitude']]], dtype=np.float64)
+                to_point = haversine_matrix(point, all_coordinates)[0]
+                next_leg = np.zeros(len(all_coordinates))
+                next_leg[~is_last] = np.concatenate(legs)
+                detour = np.append(to_point[1:], 0.0) - next_leg
+                costs = to_point + np.where(is_last, 0.0, detour)
                 
-                # Calculate distance matrix
-                distance_matrix = self.calculate_distance_matrix(locations)
+                # Respect postman capacity if any route still has room
+                full = np.array(counts) >= MAX_DELIVERIES_PER_POSTMAN
+                over_capacity = bool(full.all())
+                if not over_capacity:
+                    costs = np.where(full[owners], np.inf, costs)
                 
-                # Get initial route using nearest neighbor
-                initial_route = self.nearest_neighbor_route(distance_matrix)
+                best = int(np.argmin(costs))
+                route_idx = int(owners[best])
+                position = best - int(np.searchsorted(owners, route_idx)) + 1
                 
-                # Improve route using 2-opt
-                optimized_route = self.two_opt_improvement(initial_route, distance_matrix)
-                
-                # Calculate route statistics
-                route_details = self.estimate_delivery_time(optimized_route, cluster, distance_matrix)
-                
-                # Map route indices back to delivery details
-                route_deliveries = []
-                for idx in optimized_route:
-                    if idx == 0 and depot_location:  # Depot
-                        route_deliveries.append({
-                            'type': 'depot',
-                            'latitude': depot_location[0],
-                            'longitude': depot_location[1],
-                            'name': 'Post Office Depot'
-                        })
-                    else:
-                        adj_idx = idx - 1 if depot_location else idx  # Adjust index if we added a depot
-                        if adj_idx < len(cluster):
-                            delivery = cluster[adj_idx].copy()
-                            delivery['type'] = 'delivery'
-                            route_deliveries.append(delivery)
-                
-                routes.append({
-                    'postman_id': f"P{cluster_idx + 1}",
-                    'delivery_count': len(cluster),
-                    'route': route_deliveries,
-                    'statistics': route_details
+                stop = dict(delivery, type='delivery')
+                routes[route_idx]['route'].insert(position, stop)
+                coordinates[route_idx] = np.insert(coordinates[route_idx], position, point[0], axis=0)
+                legs[route_idx] = haversine_pairs(coordinates[route_idx][:-1], coordinates[route_idx][1:])
+                counts[route_idx] += 1
+                touched.add(route_idx)
+                inserted_stops.append((route_idx, stop))
+                insertions.append({
+                    'order_id': delivery.get('order_id'),
+                    'postman_id': routes[route_idx].get('postman_id'),
+                    'added_distance_km': round(float(costs[best]), 3),
+                    'over_capacity': over_capacity
                 })
             
-            # Calculate overall statistics
-            total_deliveries = sum(len(cluster) for cluster in delivery_clusters)
-            total_distance = sum(route['statistics']['total_distance_km'] for route in routes)
-            total_time = sum(route['statistics']['total_time_hours'] for route in routes)
+            # Only routes that received a stop are re-sequenced and re-costed
+            repair_stats = []
+            for route_idx in sorted(touched):
+                route = routes[route_idx]
+                stops = route['route']
+                distance_matrix = self.build_distance_model([tuple(location) for location in coordinates[route_idx]])
+                if options.get('repair', False):
+                    order, stats = LocalSearch(distance_matrix).run(
+                        list(range(len(stops))),
+                        options.get('local_search_operators', REPAIR_OPERATORS),
+                        options.get('time_budget_ms', DEFAULT_REPAIR_TIME_BUDGET_MS)
+                    )
+                    repair_stats.append(dict(stats, postman_id=route.get('postman_id')))
+                    stops = [stops[idx] for idx in order]
+                    distance_matrix = self.build_distance_model([(stop['latitude'], stop['longitude']) for stop in stops])
+                
+                route['route'] = stops
+                route['delivery_count'] = counts[route_idx]
+                route['statistics'] = self.route_stop_statistics(stops, distance_matrix)
+            
+            # Report final positions, which repair may have moved
+            for insertion, (route_idx, stop) in zip(insertions, inserted_stops):
+                insertion['position'] = next(idx for idx, other in enumerate(routes[route_idx]['route']) if other is stop)
             
-            return {
+            result = {
                 'success': True,
                 'total_postmen': len(routes),
-                'total_deliveries': total_deliveries,
-                'total_distance_km': round(total_distance, 2),
-                'total_time_hours': round(total_time, 2),
-                'routes': routes
+                'total_deliveries': sum(counts),
+                'total_distance_km': round(sum(route['statistics']['total_distance_km'] for route in routes), 2),
+                'total_time_hours': round(sum(route['statistics']['total_time_hours'] for route in routes), 2),
+                'routes': routes,
+                'insertions': insertions,
+                'updated_postmen': [routes[idx].get('postman_id') for idx in sorted(touched)],
+                'solve_time_ms': round((time.perf_counter() - started) * 1000, 2)
             }
-            
+            if options.get('repair', False):
+                result['repair'] = repair_stats
+            return result
+        
         except Exception as e:
-            logger.error(f"Error in route optimization: {e}")
+            logger.error(f"Error inserting deliveries: {e}")
             return {'error': str(e)}
     
-    def optimize_by_time_slot(self, deliveries, num_postmen=1, depot_location=None):
+    def repair_route(self, route, completed=None, removed=None, deferred=None,
+                     current_location=None, start_time=None, options=None):
         """
-        Optimize routes by time slot to handle scheduled deliveries
+        Repair a partly completed route after cancellations or failed deliveries
+        
+        Only the unvisited stops are re-sequenced, starting from the postman's
+        current position; removed stops are dropped and deferred stops (e.g. the
+        recipient was absent) are moved to the end for a second attempt.
         
         Args:
-            deliveries: List of delivery points with time slots
-            num_postmen: Number of available postmen
-            depot_location: (latitude, longitude) of post office depot
-            
+            route: Route dictionary from an optimize_postman_routes result
+            completed: Order IDs already delivered
+            removed: Order IDs to drop from the route
+            deferred: Order IDs to retry after the other stops
+            current_location: (latitude, longitude) of the postman, defaults to the last completed stop
+            start_time: datetime the postman leaves the current position, defaults to now
+            options: Optional settings (time_budget_ms, local_search_operators)
+        
         Returns:
-            Dictionary with optimized routes per time slot
+            Dictionary with the remaining stops and their ETAs
         """
         try:
-            if not deliveries:
-                return {'error': 'No deliveries provided'}
+            options = options or {}
+            started = time.perf_counter()
+            completed, removed, deferred = set(completed or ()), set(removed or ()), set(deferred or ())
+            stops = route['route']
             
-            # Group deliveries by time slot
-            time_slot_deliveries = {}
-            for delivery in deliveries:
-                time_slot = delivery.get('time_slot')
-                if time_slot not in time_slot_deliveries:
-                    time_slot_deliveries[time_slot] = []
-                time_slot_deliveries[time_slot].append(delivery)
-            
-            # Optimize routes for each time slot
-            time_slot_routes = {}
-            for time_slot, slot_deliveries in time_slot_deliveries.items():
-                if slot_deliveries:
-                    slot_result = self.optimize_postman_routes(
-                        slot_deliveries, num_postmen, depot_location
-                    )
-                    time_slot_routes[time_slot] = slot_result
+            known = {stop.get('order_id') for stop in stops if stop.get('type') != 'depot'}
+            unknown = sorted(str(order_id) for order_id in (completed | removed | deferred) - known)
+            if unknown:
+                return {'error': f"Unknown order IDs: {', '.join(unknown)}"}
+            
+            done, pending, retry = [], [], []
+            for stop in stops:
+                order_id = stop.get('order_id')
+                if stop.get('type') == 'depot' or order_id in removed:
+                    continue
+                if order_id in completed:
+                    done.append(stop)
+                elif order_id in deferred:
+                    retry.append(dict(stop, deferred=True))
+                else:
+                    pending.append(stop)
+            
+            if current_location is None:
+                last = done[-1] if done else stops[0]
+                current_location = (last['latitude'], last['longitude'])
+            
+            # Re-sequence the pending stops from the current position (kept at index 0).
+            # The old order is already optimized, so the search uses the neighbor
+            # graph (no dense matrix) and starts only at stops whose neighbors in
+            # the route changed: the first pending stop and those next to a gap
+            repair_stats = None
+            if len(pending) > 1:
+                locations = [tuple(current_location)] + [(stop['latitude'], stop['longitude']) for stop in pending]
+                original_position = {id(stop): idx for idx, stop in enumerate(stops)}
+                positions = [original_position[id(stop)] for stop in pending]
+                changed = {0, 1}
+                for idx in range(1, len(positions)):
+                    if positions[idx] != positions[idx - 1] + 1:
+                        changed.update((idx, idx + 1))
+                order, repair_stats = LocalSearch(self.build_distance_model(locations, mode='sparse')).run(
+                    list(range(len(locations))),
+                    options.get('local_search_operators', REPAIR_OPERATORS),
+                    options.get('time_budget_ms', DEFAULT_REPAIR_TIME_BUDGET_MS),
+                    focus=changed
+                )
+                pending = [pending[idx - 1] for idx in order[1:]]
+            
+            # ETAs along the new suffix from leg distances and service times
+            remaining = pending + retry
+            start_time = start_time or datetime.now().replace(second=0, microsecond=0)
+            locations = np.array([current_location] + [(stop['latitude'], stop['longitude']) for stop in remaining])
+            service_minutes = np.array([DELIVERY_TIME_MINUTES.get(stop.get('address_type', 0), 5) for stop in remaining],
+                                       dtype=np.float64)
+            arrivals, legs = arrival_minutes(locations, service_minutes)
             
-            # Calculate overall statistics
-            total_deliveries = sum(result['total_deliveries'] for result in time_slot_routes.values())
-            total_distance = sum(result['total_distance_km'] for result in time_slot_routes.values())
+            remaining_route = []
+            for stop, arrival, leg in zip(remaining, arrivals, legs):
+                stop = stop.copy()
+                stop['eta'] = (start_time + timedelta(minutes=float(arrival))).strftime('%H:%M')
+                stop['travel_distance_km'] = round(float(leg), 3)
+                remaining_route.append(stop)
+            
+            total_distance = float(legs.sum())
+            travel_time_hours = total_distance / POSTMAN_SPEED_KM_PER_HOUR
+            service_time_hours = float(service_minutes.sum()) / 60
+            end_time = start_time + timedelta(hours=travel_time_hours + service_time_hours)
             
             return {
                 'success': True,
-                'total_time_slots': len(time_slot_routes),
-                'total_postmen': num_postmen,
-                'total_deliveries': total_deliveries,
-                'total_distance_km': round(total_distance, 2),
-                'time_slot_routes': time_slot_routes
+                'postman_id': route.get('postman_id'),
+                'current_location': {'latitude': current_location[0], 'longitude': current_location[1]},
+                'route': remaining_route,
+                'completed': [stop.get('order_id') for stop in done],
+                'removed': sorted(removed, key=str),
+                'deferred': [stop.get('order_id') for stop in retry],
+                'statistics': {
+                    'remaining_deliveries': len(remaining_route),
+                    'total_distance_km': round(total_distance, 2),
+                    'travel_time_hours': round(travel_time_hours, 2),
+                    'service_time_hours': round(service_time_hours, 2),
+                    'total_time_hours': round(travel_time_hours + service_time_hours, 2),
+                    'start_time': start_time.strftime('%H:%M'),
+                    'end_time': end_time.strftime('%H:%M')
+                },
+                'repair': repair_stats,
+                'solve_time_ms': round((time.perf_counter() - started) * 1000, 2)
             }
-            
+        
         except Exception as e:
-            logger.error(f"Error in time slot route optimization: {e}")
+            logger.error(f"Error repairing route: {e}")
             return {'error': str(e)}
 
+def solver_report(options, routes, clustering=None):
+    """
+    Solver and per-stage timing summary of a plan
+    
+    Args:
+        options: Solver settings used for the routes
+        routes: Route dictionaries from optimize_cluster
+        clustering: Optional clustering statistics from plan_clusters
+    
+    Returns:
+        Dictionary with the solver name, the strategy of each stage and total milliseconds per stage
+    """
+    def stage_total(stage):
+        times = [route.get('stage_times_ms', {}).get(stage) for route in routes]
+        times = [value for value in times if value is not None]
+        return round(sum(times), 2) if times else None
+    
+    return {
+        'name': options.get('solver', DEFAULT_SOLVER),
+        'stages': {
+            'clustering': options.get('clustering', 'kmeans'),
+            'construction': options.get('construction', 'nearest_neighbor'),
+            'improvement': options.get('improvement', 'two_opt')
+        },
+        'stage_times_ms': {
+            'clustering': clustering.get('time_ms') if clustering else None,
+            'distance_matrix': stage_total('distance_matrix'),
+            'construction': stage_total('construction'),
+            'improvement': stage_total('improvement')
+        }
+    }
+
+def _construct_nearest_neighbor(optimizer, locations, distance_matrix, start_idx, options):
+    """Nearest neighbor on the distance matrix"""
+    if isinstance(distance_matrix, SparseDistanceGraph):
+        # Same tour, without scanning a row of the matrix at every step
+        return optimizer.grid_nearest_neighbor_route(locations, start_idx)
+    return optimizer.nearest_neighbor_route(distance_matrix, start_idx)
+
+def _improve_two_opt(optimizer, route, distance_matrix, options, deadline):
+    """Full 2-opt"""
+    return optimizer.two_opt_improvement(route, distance_matrix, deadline=deadline), {}
+
+def _improve_neighbor_two_opt(optimizer, route, distance_matrix, options, deadline):
+    """Neighbor-list 2-opt with don't-look bits"""
+    return optimizer.neighbor_two_opt_improvement(route, distance_matrix, deadline=deadline), {}
+
+def _improve_local_search(optimizer, route, distance_matrix, options, deadline):
+    """Time-budgeted 2-opt, Or-opt and 3-opt"""
+    return optimizer.local_search_improvement(
+        route, distance_matrix,
+        options.get('time_budget_ms', DEFAULT_TIME_BUDGET_MS),
+        options.get('local_search_operators', LOCAL_SEARCH_OPERATORS),
+        deadline
+    )
+
+def _improve_ortools(optimizer, route, distance_matrix, options, deadline):
+    """
+    OR-Tools guided local search, started from the constructed route
+    
+    The route is an open path from route[0]; returning to it is free. Runs for
+    time_budget_ms (ORTOOLS_DEFAULT_TIME_LIMIT_MS without a budget) or until the deadline.
+    """
+    if len(route) < 4:
+        return list(route), {}
+    if isinstance(distance_matrix, SparseDistanceGraph):
+        # Too large for a dense routing model; use the neighbor-list search instead
+        improved_route, stats = _improve_neighbor_two_opt(optimizer, route, distance_matrix, options, deadline)
+        return improved_route, dict(stats, fallback='neighbor_two_opt')
+    
+    start = route[0]
+    meters = np.rint(np.asarray(distance_matrix, dtype=np.float64) * 1000).astype(np.int64).tolist()
+    manager = pywrapcp.RoutingIndexManager(len(route), 1, [start], [start])
+    routing = pywrapcp.RoutingModel(manager)
+    
+    def arc_cost(from_index, to_index):
+        to_node = manager.IndexToNode(to_index)
+        return 0 if to_node == start else meters[manager.IndexToNode(from_index)][to_node]
+    
+    routing.SetArcCostEvaluatorOfAllVehicles(routing.RegisterTransitCallback(arc_cost))
+    time_limit_ms = options.get('time_budget_ms', DEFAULT_TIME_BUDGET_MS) or ORTOOLS_DEFAULT_TIME_LIMIT_MS
+    if deadline is not None:
+        time_limit_ms = min(time_limit_ms, max((deadline - time.perf_counter()) * 1000, 1))
+    parameters = pywrapcp.DefaultRoutingSearchParameters()
+    parameters.local_search_metaheuristic = routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH
+    parameters.time_limit.FromMilliseconds(int(time_limit_ms))
+    routing.CloseModelWithParameters(parameters)
+    
+    initial = routing.ReadAssignmentFromRoutes([list(route[1:])], True)
+    solution = routing.SolveFromAssignmentWithParameters(initial, parameters) if initial else None
+    if solution is None:
+        return list(route), {'status': 'no_solution'}
+    
+    improved_route = []
+    index = routing.Start(0)
+    while not routing.IsEnd(index):
+        improved_route.append(manager.IndexToNode(index))
+        index = solution.Value(routing.NextVar(index))
+    return improved_route, {'time_limit_ms': round(time_limit_ms, 2)}
+
+def register_builtin_solvers(registry):
+    """
+    Register the built-in stage strategies and solvers
+    
+    Args:
+        registry: SolverRegistry to fill
+    """
+    for strategy in CLUSTERING_STRATEGIES:
+        registry.register('clustering', strategy, RouteOptimizer.centroid_clustering,
+                          {'kmeans': 'k-means', 'minibatch': 'MiniBatch k-means',
+                           'balanced': 'Capacity-balanced k-means'}[strategy])
+    
+    registry.register('construction', 'nearest_neighbor', _construct_nearest_neighbor, 'Nearest neighbor')
+    registry.register('construction', 'grid_nearest_neighbor',
+                      lambda optimizer, locations, distance_matrix, start_idx, options:
+                      optimizer.grid_nearest_neighbor_route(locations, start_idx),
+                      'Nearest neighbor on a spatial grid')
+    registry.register('construction', 'greedy_edge',
+                      lambda optimizer, locations, distance_matrix, start_idx, options:
+                      optimizer.greedy_edge_route(locations, start_idx),
+                      'Greedy edge matching over nearest-neighbor candidates')
+    registry.register('construction', 'hilbert',
+                      lambda optimizer, locations, distance_matrix, start_idx, options:
+                      optimizer.hilbert_route(locations, start_idx),
+                      'Hilbert space-filling curve order')
+    
+    registry.register('improvement', 'two_opt', _improve_two_opt, 'Full 2-opt')
+    registry.register('improvement', 'neighbor_two_opt', _improve_neighbor_two_opt, 'Neighbor-list 2-opt')
+    registry.register('improvement', 'local_search', _improve_local_search,
+                      'Time-budgeted 2-opt, Or-opt and 3-opt')
+    
+    registry.register_solver('default', 'Current pipeline: k-means, nearest neighbor, 2-opt',
+                             clustering='kmeans', construction='nearest_neighbor', improvement='two_opt')
+    registry.register_solver('fast', 'Large batches: MiniBatch k-means, Hilbert order, neighbor-list 2-opt',
+                             clustering='minibatch', construction='hilbert', improvement='neighbor_two_opt')
+    registry.register_solver('quality', 'Balanced k-means, greedy edge, time-budgeted local search',
+                             clustering='balanced', construction='greedy_edge', improvement='local_search')
+    
+    if pywrapcp is not None:
+        registry.register('improvement', 'ortools', _improve_ortools, 'OR-Tools guided local search')
+        registry.register_solver('ortools', 'Balanced k-means, nearest neighbor, OR-Tools guided local search',
+                                 clustering='balanced', construction='nearest_neighbor', improvement='ortools')
+
+def configured_solvers(registry, default_solver, office_solvers):
+    """
+    Check the solver settings from the environment against the registry
+    
+    Unknown solvers (e.g. 'ortools' without OR-Tools installed) are logged and
+    replaced by 'default' rather than failing every request.
+    
+    Args:
+        registry: SolverRegistry with the built-in solvers registered
+        default_solver: ROUTE_SOLVER value
+        office_solvers: ROUTE_OFFICE_SOLVERS value, a JSON object of depot_id -> solver
+    
+    Returns:
+        Tuple of (default solver, dictionary of depot_id -> solver)
+    """
+    try:
+        office_solvers = json.loads(office_solvers or '{}')
+        if not isinstance(office_solvers, dict):
+            raise ValueError("expected a JSON object of depot_id -> solver")
+    except ValueError as e:
+        logger.error(f"Ignoring invalid ROUTE_OFFICE_SOLVERS: {e}")
+        office_solvers = {}
+    
+    if default_solver not in registry.solvers:
+        logger.error(f"Unknown ROUTE_SOLVER {default_solver}, using 'default'. "
+                     f"Registered solvers: {', '.join(registry.solvers)}")
+        default_solver = 'default'
+    
+    checked = {}
+    for depot_id, solver in office_solvers.items():
+        if solver in registry.solvers:
+            checked[str(depot_id)] = solver
+        else:
+            logger.error(f"Unknown solver {solver} for office {depot_id} in ROUTE_OFFICE_SOLVERS, "
+                         f"using {default_solver}")
+    return default_solver, checked
+
+register_builtin_solvers(solver_registry)
+DEFAULT_SOLVER, OFFICE_SOLVERS = configured_solvers(solver_registry, DEFAULT_SOLVER, OFFICE_SOLVERS)
+
+# Parse the road extract at startup rather than inside the first road request
+if ROAD_NETWORK_PATH:
+    get_road_network()
+
 # Create optimizer instance
-route_optimizer = RouteOptimizer()
+route_optimizer = RouteOptimizer(
+    distance_store=DistanceStore(DISTANCE_CACHE_DIR, DISTANCE_CACHE_CAPACITY) if DISTANCE_CACHE_DIR else None,
+    centroid_store_path=CLUSTER_CENTROIDS_PATH or None
+)
+route_result_cache = RouteResultCache(ROUTE_CACHE_MAX_ENTRIES, ROUTE_CACHE_TTL_SECONDS) if ROUTE_CACHE_MAX_ENTRIES > 0 else None
+route_job_queue = RouteJobQueue(ROUTE_JOB_WORKERS, ROUTE_JOB_TTL_SECONDS)
+eta_session_store = EtaSessionStore(ETA_SESSION_TTL_SECONDS, clock=format_clock)
+
+def _init_route_worker():
+    """Process pool initializer: the distance store belongs to the parent process"""
+    route_optimizer.distance_store = None
+
+def _optimize_cluster_task(cluster, cluster_idx, depot_location, options, distance_matrix=None, seeds=None):
+    """Process pool entry point for RouteOptimizer.optimize_cluster"""
+    return route_optimizer.optimize_cluster(cluster, cluster_idx, depot_location, options, distance_matrix, seeds)
+
+def _optimize_region_task(deliveries, num_postmen, depot_location, options):
+    """Process pool entry point for one region of the hierarchical planner"""
+    return route_optimizer.optimize_postman_routes(deliveries, num_postmen, depot_location, options)
+
+def _optimize_time_window_task(cluster, cluster_idx, depot_location, options):
+    """Process pool entry point for RouteOptimizer.optimize_time_window_cluster"""
+    return route_optimizer.optimize_time_window_cluster(cluster, cluster_idx, depot_location, options)
+
+def get_process_pool():
+    """
+    Get the shared process pool used for CPU-bound route work
+    
+    Returns:
+        ProcessPoolExecutor with MAX_ROUTE_WORKERS workers
+    """
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(max_workers=MAX_ROUTE_WORKERS, initializer=_init_route_worker)
+            logger.info(f"Started route worker pool with {MAX_ROUTE_WORKERS} processes")
+        return _process_pool
+
+def _reset_process_pool():
+    """Drop a broken process pool so the next request starts a fresh one"""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=False, cancel_futures=True)
+            _process_pool = None
+
+def resolve_execution(options, task_count):
+    """
+    Decide how a batch of cluster tasks will run
+    
+    Args:
+        options: Solver settings (execution_mode, max_workers)
+        task_count: Number of tasks in the batch
+        
+    Returns:
+        Tuple of (execution mode, worker count)
+    """
+    execution_mode = options.get('execution_mode', DEFAULT_EXECUTION_MODE)
+    max_workers = min(options.get('max_workers', MAX_ROUTE_WORKERS), MAX_ROUTE_WORKERS, task_count)
+    if execution_mode == 'process' and max_workers > 1:
+        return 'process', max_workers
+    return 'serial', 1
+
+def iter_process_pool(func, tasks, max_workers):
+    """
+    Run tasks on the shared process pool with at most max_workers in flight
+    
+    Args:
+        func: Picklable module-level function
+        tasks: List of argument tuples, one per call
+        max_workers: Maximum number of tasks this call keeps in flight
+        
+    Yields:
+        Tuples of (task index, result, exception) in completion order;
+        exception is None when the task succeeded
+    """
+    pool = get_process_pool()
+    pending = {}
+    next_task = 0
+    
+    try:
+        while next_task < len(tasks) or pending:
+            while next_task < len(tasks) and len(pending) < max_workers:
+                pending[pool.submit(func, *tasks[next_task])] = next_task
+                next_task += 1
+            
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in sorted(done, key=pending.get):
+                index = pending.pop(future)
+                error = future.exception()
+                if isinstance(error, BrokenProcessPool):
+                    raise error
+                yield index, (None if error else future.result()), error
+    except BrokenProcessPool:
+        logger.error("Route worker pool crashed, it will be restarted on the next request")
+        _reset_process_pool()
+        raise
+    finally:
+        # Stop queued work if the consumer stops early
+        for future in pending:
+            future.cancel()
+
+def run_in_process_pool(func, tasks, max_workers, progress=None):
+    """
+    Run tasks on the shared process pool with at most max_workers in flight
+    
+    Args:
+        func: Picklable module-level function
+        tasks: List of argument tuples, one per call
+        max_workers: Maximum number of tasks this call keeps in flight
+        progress: Optional callback progress(done, total, result) after each finished task
+        
+    Returns:
+        List of results in the same order as tasks
+    """
+    results = [None] * len(tasks)
+    for done, (index, result, error) in enumerate(iter_process_pool(func, tasks, max_workers), 1):
+        if error is not None:
+            raise error
+        results[index] = result
+        if progress is not None:
+            progress(done, len(tasks), result)
+    return results
+
+def run_route_tasks(serial_func, process_func, tasks, execution_mode, max_workers, progress=None):
+    """
+    Run per-cluster route tasks serially or on the process pool
+    
+    Args:
+        serial_func: Callable run in this process
+        process_func: Picklable module-level equivalent for the process pool
+        tasks: List of argument tuples, one per route
+        execution_mode: 'serial' or 'process', see resolve_execution
+        max_workers: Worker count for process mode
+        progress: Optional callback progress(done, total, route) after each finished route;
+                  an exception raised by it stops the remaining tasks
+    
+    Returns:
+        List of routes in the same order as tasks
+    """
+    if execution_mode == 'process':
+        return run_in_process_pool(process_func, tasks, max_workers, progress)
+    routes = []
+    for task in tasks:
+        routes.append(serial_func(*task))
+        if progress is not None:
+            progress(len(routes), len(tasks), routes[-1])
+    return routes
+
+def route_options_from_request(data):
+    """
+    Extract solver settings from a route optimization request
+    
+    Args:
+        data: Parsed JSON request body
+        
+    Returns:
+        Dictionary of solver options for optimize_postman_routes
+    """
+    options = {}
+    
+    # The solver picks every stage; single stages can still be overridden
+    solver = data.get('solver') or OFFICE_SOLVERS.get(str(data.get('depot_id'))) or DEFAULT_SOLVER
+    stages = solver_registry.resolve(solver)
+    options['solver'] = solver
+    
+    construction = data.get('construction', stages['construction'])
+    solver_registry.get('construction', construction)
+    options['construction'] = construction
+    
+    improvement = data.get('improvement', stages['improvement'])
+    solver_registry.get('improvement', improvement)
+    options['improvement'] = improvement
+    
+    matrix_mode = data.get('matrix_mode', 'auto')
+    if matrix_mode not in MATRIX_MODES:
+        raise ValueError(f"Unknown matrix mode: {matrix_mode}. Expected one of: {', '.join(MATRIX_MODES)}")
+    options['matrix_mode'] = matrix_mode
+    
+    distance_backend = data.get('distance_backend', 'haversine')
+    if distance_backend not in DISTANCE_BACKENDS:
+        raise ValueError(f"Unknown distance backend: {distance_backend}. "
+                         f"Expected one of: {', '.join(DISTANCE_BACKENDS)}")
+    if distance_backend == 'road' and get_road_network() is None:
+        raise ValueError("No road network loaded, set ROAD_NETWORK_PATH to a GraphML extract")
+    options['distance_backend'] = distance_backend
+    
+    execution_mode = data.get('execution_mode', DEFAULT_EXECUTION_MODE)
+    if execution_mode not in EXECUTION_MODES:
+        raise ValueError(f"Unknown execution mode: {execution_mode}. Expected one of: {', '.join(EXECUTION_MODES)}")
+    options['execution_mode'] = execution_mode
+    
+    if 'max_workers' in data:
+        max_workers = int(data['max_workers'])
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        options['max_workers'] = max_workers
+    
+    clustering = data.get('clustering', stages['clustering'])
+    solver_registry.get('clustering', clustering)
+    options['clustering'] = clustering
+    
+    balance = data.get('balance', 'deliveries')
+    if balance not in BALANCE_MODES:
+        raise ValueError(f"Unknown balance mode: {balance}. Expected one of: {', '.join(BALANCE_MODES)}")
+    options['balance'] = balance
+    
+    planner = data.get('planner', 'flat')
+    if planner not in PLANNERS:
+        raise ValueError(f"Unknown planner: {planner}. Expected one of: {', '.join(PLANNERS)}")
+    options['planner'] = planner
+    if 'region_max_deliveries' in data:
+        region_max_deliveries = int(data['region_max_deliveries'])
+        if region_max_deliveries < 1:
+            raise ValueError("region_max_deliveries must be at least 1")
+        options['region_max_deliveries'] = region_max_deliveries
+    
+    if data.get('time_windows'):
+        time_windows = data['time_windows']
+        if time_windows not in TIME_WINDOW_MODES:
+            raise ValueError(f"Unknown time window mode: {time_windows}. Expected one of: {', '.join(TIME_WINDOW_MODES)}")
+        options['time_windows'] = time_windows
+        if 'shift_start' in data:
+            clock_minutes(data['shift_start'])
+            options['shift_start'] = str(data['shift_start'])
+        if 'compare_baseline' in data:
+            options['compare_baseline'] = bool(data['compare_baseline'])
+    
+    options.update(speed_conditions_from_request(data))
+    
+    if 'warm_start' in data:
+        options['warm_start'] = bool(data['warm_start'])
+    if 'use_distance_cache' in data:
+        options['use_distance_cache'] = bool(data['use_distance_cache'])
+    if data.get('depot_id'):
+        options['depot_id'] = str(data['depot_id'])
+    
+    if 'multi_start' in data:
+        multi_start = int(data['multi_start'])
+        if not 1 <= multi_start <= MULTI_START_MAX:
+            raise ValueError(f"multi_start must be between 1 and {MULTI_START_MAX}")
+        options['multi_start'] = multi_start
+    if 'seed' in data:
+        options['seed'] = int(data['seed'])
+    
+    if data.get('deadline_ms') is not None:
+        deadline_ms = float(data['deadline_ms'])
+        if deadline_ms <= 0:
+            raise ValueError("deadline_ms must be positive")
+        # Absolute wall-clock time, so worker processes stop at the same instant
+        options['deadline_ms'] = deadline_ms
+        options['deadline_at'] = time.time() + deadline_ms / 1000
+    
+    if 'time_budget_ms' in data:
+        time_budget_ms = data['time_budget_ms']
+        if time_budget_ms is not None:
+            time_budget_ms = float(time_budget_ms)
+            if time_budget_ms <= 0:
+                raise ValueError("time_budget_ms must be positive")
+        options['time_budget_ms'] = time_budget_ms
+    
+    if 'local_search_operators' in data:
+        operators = tuple(data['local_search_operators'])
+        unknown = [name for name in operators if name not in LOCAL_SEARCH_OPERATORS]
+        if unknown or not operators:
+            raise ValueError(f"Unknown local search operators: {', '.join(unknown) or 'none given'}. "
+                             f"Expected any of: {', '.join(LOCAL_SEARCH_OPERATORS)}")
+        options['local_search_operators'] = operators
+    
+    return options
+
+def depots_from_request(data):
+    """
+    Extract the depot list of a multi-depot request
+    
+    Args:
+        data: Parsed JSON request body
+    
+    Returns:
+        List of depot dictionaries (depot_id, latitude, longitude, num_postmen), or None
+    """
+    if 'depots' not in data:
+        return None
+    if not isinstance(data['depots'], list) or not data['depots']:
+        raise ValueError("depots must be a non-empty list")
+    
+    depots = []
+    for idx, depot in enumerate(data['depots']):
+        if 'latitude' not in depot or 'longitude' not in depot:
+            raise ValueError("Each depot needs latitude and longitude")
+        num_postmen = int(depot.get('num_postmen', 1))
+        if num_postmen < 1:
+            raise ValueError("Each depot needs at least one postman")
+        depots.append({
+            'depot_id': str(depot.get('depot_id') or f"D{idx + 1}"),
+            'latitude': float(depot['latitude']),
+            'longitude': float(depot['longitude']),
+            'num_postmen': num_postmen
+        })
+    if len({depot['depot_id'] for depot in depots}) != len(depots):
+        raise ValueError("Depot IDs must be unique")
+    return depots
+
+def stream_time_slot_results(deliveries, num_postmen, depot_location, options):
+    """
+    Stream time slot results as newline-delimited JSON as each slot finishes
+    
+    Each slot is sent as {"time_slot": ..., "result": {...}}; the last line is
+    {"summary": {...}} with the same totals optimize_by_time_slot reports.
+    """
+    time_slot_routes = {}
+    try:
+        for time_slot, result in route_optimizer.iter_time_slot_results(
+            deliveries, num_postmen, depot_location, options
+        ):
+            time_slot_routes[time_slot] = result
+            yield json.dumps({'time_slot': time_slot, 'result': result}) + '\n'
+        
+        summary = route_optimizer.summarize_time_slots(time_slot_routes, num_postmen, options)
+        summary.pop('time_slot_routes')
+        yield json.dumps({'summary': summary}) + '\n'
+    except Exception as e:
+        logger.error(f"Error streaming time slot routes: {e}")
+        yield json.dumps({'error': str(e)}) + '\n'
+
+def route_plan_from_request(data):
+    """
+    Parse an optimize-routes request body
+    
+    Args:
+        data: Parsed JSON request body with deliveries
+    
+    Returns:
+        Dictionary with deliveries, num_postmen, depot_location, depots, by_time_slot and options
+    """
+    # Check if depot location is provided
+    depot_location = None
+    if 'depot_latitude' in data and 'depot_longitude' in data:
+        depot_location = (float(data['depot_latitude']), float(data['depot_longitude']))
+    
+    # Check if we should organize by time slot
+    by_time_slot = data.get('by_time_slot', False)
+    options = route_options_from_request(data)
+    
+    # Several post offices in one request
+    depots = depots_from_request(data)
+    if depots is not None and by_time_slot:
+        raise ValueError("depots cannot be combined with by_time_slot")
+    if depots is not None and options.get('time_windows'):
+        raise ValueError("depots cannot be combined with time_windows")
+    
+    return {
+        'deliveries': data['deliveries'],
+        'num_postmen': int(data.get('num_postmen', 1)),
+        'depot_location': depot_location,
+        'depots': depots,
+        'by_time_slot': by_time_slot,
+        'options': options
+    }
+
+def run_route_plan(plan, progress=None):
+    """
+    Optimize a parsed route request with the planner it asks for
+    
+    Args:
+        plan: Dictionary from route_plan_from_request
+        progress: Optional callback progress(done, total, route) after each optimized route;
+                  multi-depot plans only report when they finish
+    
+    Returns:
+        Dictionary with optimized routes and statistics
+    """
+    deliveries, num_postmen, depot_location = plan['deliveries'], plan['num_postmen'], plan['depot_location']
+    options = plan['options']
+    if plan['depots'] is not None:
+        return route_optimizer.optimize_multi_depot(deliveries, plan['depots'], options)
+    if options.get('time_windows'):
+        return route_optimizer.optimize_time_windows(deliveries, num_postmen, depot_location, options, progress)
+    if plan['by_time_slot']:
+        return route_optimizer.optimize_by_time_slot(deliveries, num_postmen, depot_location, options, progress)
+    return route_optimizer.optimize_postman_routes(deliveries, num_postmen, depot_location, options, progress)
+
+def route_request_fingerprint(deliveries, num_postmen, depot_location, by_time_slot, options):
+    """
+    Fingerprint the inputs that determine a route plan
+    
+    Delivery order is kept because it decides cluster labels and postman IDs;
+    execution settings are left out since serial and process runs return the same plan.
+    """
+    return fingerprint({
+        'deliveries': deliveries,
+        'num_postmen': num_postmen,
+        'depot_location': depot_location,
+        'by_time_slot': bool(by_time_slot),
+        'options': {key: value for key, value in options.items() if key not in RESULT_NEUTRAL_OPTIONS}
+    })
 
 # API endpoints
 @app.route('/optimize-routes', methods=['POST'])
@@ -351,25 +4044,176 @@ def optimize_routes():
         if not data or 'deliveries' not in data:
             return jsonify({'error': 'Missing required field: deliveries'}), 400
         
-        deliveries = data['deliveries']
-        num_postmen = int(data.get('num_postmen', 1))
+        if ROUTE_SYNC_MAX_DELIVERIES and len(data['deliveries']) > ROUTE_SYNC_MAX_DELIVERIES:
+            return jsonify({'error': f"More than {ROUTE_SYNC_MAX_DELIVERIES} deliveries: "
+                                     f"submit the request to /route/jobs instead"}), 413
+        
+        plan = route_plan_from_request(data)
+        deliveries, num_postmen, depot_location = plan['deliveries'], plan['num_postmen'], plan['depot_location']
+        depots, by_time_slot, options = plan['depots'], plan['by_time_slot'], plan['options']
         
-        # Check if depot location is provided
-        depot_location = None
-        if 'depot_latitude' in data and 'depot_longitude' in data:
-            depot_location = (float(data['depot_latitude']), float(data['depot_longitude']))
+        if by_time_slot and data.get('stream', False) and not options.get('time_windows'):
+            if not deliveries:
+                return jsonify({'error': 'No deliveries provided'}), 400
+            return Response(stream_time_slot_results(deliveries, num_postmen, depot_location, options),
+                            mimetype='application/x-ndjson')
+        
+        # Identical re-plans are answered from the result cache unless the client opts out
+        cache_key = None
+        if route_result_cache is not None and data.get('use_cache', True):
+            cache_key = route_request_fingerprint(deliveries, num_postmen, depots or depot_location, by_time_slot, options)
+            cached = route_result_cache.get(cache_key)
+            if cached is not None:
+                body, age = cached
+                response = Response(body, mimetype='application/json')
+                response.headers['X-Route-Cache'] = 'HIT'
+                response.headers['X-Route-Cache-Key'] = cache_key
+                response.headers['Age'] = str(int(age))
+                return response
         
-        # Check if we should organize by time slot
-        by_time_slot = data.get('by_time_slot', False)
+        result = run_route_plan(plan)
         
-        if by_time_slot:
-            result = route_optimizer.optimize_by_time_slot(deliveries, num_postmen, depot_location)
+        response = jsonify(result)
+        if cache_key is None:
+            response.headers['X-Route-Cache'] = 'BYPASS'
         else:
-            result = route_optimizer.optimize_postman_routes(deliveries, num_postmen, depot_location)
+            # Plans cut off by a deadline are not reused; a later request may have more time
+            if result.get('success') and not result.get('deadline', {}).get('cut_off'):
+                route_result_cache.put(cache_key, response.get_data())
+            response.headers['X-Route-Cache'] = 'MISS'
+            response.headers['X-Route-Cache-Key'] = cache_key
+        return response
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error in optimize routes endpoint: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/jobs', methods=['POST'])
+def submit_route_job():
+    """API endpoint to queue a route optimization and return its job ID at once"""
+    try:
+        data = request.json
+        if not data or 'deliveries' not in data:
+            return jsonify({'error': 'Missing required field: deliveries'}), 400
+        if not data['deliveries']:
+            return jsonify({'error': 'No deliveries provided'}), 400
+        
+        # Jobs solve on the process pool unless told otherwise, keeping the GIL free for request threads
+        if 'execution_mode' not in data:
+            data = dict(data, execution_mode='process')
+        plan = route_plan_from_request(data)
+        
+        job = route_job_queue.submit(run_route_plan, plan)
+        return jsonify(job.to_dict()), 202
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error in submit route job endpoint: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def route_job_status(job_id):
+    """API endpoint to poll the status and progress of a route job"""
+    job = route_job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': f"Unknown or expired job: {job_id}"}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def route_job_result(job_id):
+    """API endpoint to fetch the result of a finished route job"""
+    job = route_job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': f"Unknown or expired job: {job_id}"}), 404
+    info = job.to_dict()
+    if info['status'] == 'succeeded':
+        return jsonify(job.result)
+    if info['status'] == 'failed':
+        return jsonify(info), 500
+    if info['status'] == 'cancelled':
+        return jsonify(info), 409
+    return jsonify(info), 202
+
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_route_job(job_id):
+    """API endpoint to cancel a queued or running route job"""
+    job = route_job_queue.cancel(job_id)
+    if job is None:
+        return jsonify({'error': f"Unknown or expired job: {job_id}"}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/stats', methods=['GET'])
+def route_job_stats():
+    """API endpoint for route job queue statistics"""
+    return jsonify(route_job_queue.get_stats())
+
+@app.route('/insert-deliveries', methods=['POST'])
+def insert_deliveries():
+    """API endpoint to add new deliveries to an existing route plan"""
+    try:
+        data = request.json
+        if not data or 'routes' not in data or 'deliveries' not in data:
+            return jsonify({'error': 'Missing required fields: routes, deliveries'}), 400
+        
+        for delivery in data['deliveries']:
+            if 'latitude' not in delivery or 'longitude' not in delivery:
+                return jsonify({'error': 'Each delivery needs latitude and longitude'}), 400
         
+        options = {'repair': bool(data.get('repair', False))}
+        if data.get('time_budget_ms') is not None:
+            options['time_budget_ms'] = float(data['time_budget_ms'])
+            if options['time_budget_ms'] <= 0:
+                raise ValueError("time_budget_ms must be positive")
+        
+        result = route_optimizer.insert_deliveries(data['routes'], data['deliveries'], options)
+        if 'error' in result:
+            return jsonify(result), 400
         return jsonify(result)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        logger.error(f"Error in optimize routes endpoint: {e}")
+        logger.error(f"Error in insert deliveries endpoint: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/repair-route', methods=['POST'])
+def repair_route():
+    """API endpoint to re-plan the unvisited part of a postman's route"""
+    try:
+        data = request.json
+        if not data or 'route' not in data:
+            return jsonify({'error': 'Missing required field: route'}), 400
+        
+        route = data['route']
+        if isinstance(route, list):
+            route = {'route': route}
+        
+        current_location = None
+        if 'current_latitude' in data and 'current_longitude' in data:
+            current_location = (float(data['current_latitude']), float(data['current_longitude']))
+        
+        start_time = None
+        if data.get('start_time'):
+            hours, minutes = map(int, data['start_time'].split(':'))
+            start_time = datetime.now().replace(hour=hours, minute=minutes, second=0, microsecond=0)
+        
+        options = {}
+        if data.get('time_budget_ms') is not None:
+            options['time_budget_ms'] = float(data['time_budget_ms'])
+            if options['time_budget_ms'] <= 0:
+                raise ValueError("time_budget_ms must be positive")
+        
+        result = route_optimizer.repair_route(
+            route, data.get('completed'), data.get('removed'), data.get('deferred'),
+            current_location, start_time, options
+        )
+        if 'error' in result:
+            return jsonify(result), 400
+        return jsonify(result)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error in repair route endpoint: {e}")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/calculate-eta', methods=['POST'])
@@ -414,6 +4258,180 @@ def calculate_eta():
         logger.error(f"Error in calculate ETA endpoint: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/calculate-eta-batch', methods=['POST'])
+def calculate_eta_batch():
+    """API endpoint to calculate arrival times for all routes of an office in one call"""
+    try:
+        data = request.json
+        if not data or 'routes' not in data:
+            return jsonify({'error': 'Missing required field: routes'}), 400
+        if not isinstance(data['routes'], list):
+            return jsonify({'error': 'routes must be a list'}), 400
+        
+        speed = float(data.get('speed_km_per_hour', POSTMAN_SPEED_KM_PER_HOUR))
+        if speed <= 0:
+            return jsonify({'error': 'speed_km_per_hour must be positive'}), 400
+        
+        return jsonify(route_optimizer.batch_eta(data['routes'], data.get('start_time', SHIFT_START_TIME), speed,
+                                                 speed_conditions_from_request(data)))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error in batch ETA endpoint: {e}")
+        return jsonify({'error': str(e)}), 500
+
+def eta_session_from_request(data):
+    """
+    Register a live ETA session from a request body
+    
+    Args:
+        data: Parsed JSON body with route (a list of stops or a route dictionary
+              from /optimize-routes), optional start_time, speed_km_per_hour
+              and traffic-aware settings (traffic_aware, traffic, weather)
+    
+    Returns:
+        EtaSession instance
+    """
+    route = data['route']
+    stops = route.get('route', []) if isinstance(route, dict) else route
+    if not isinstance(stops, list) or not stops:
+        raise ValueError("route must contain at least one stop")
+    for stop in stops:
+        if 'latitude' not in stop or 'longitude' not in stop:
+            raise ValueError("Every stop needs latitude and longitude")
+    speed = float(data.get('speed_km_per_hour', POSTMAN_SPEED_KM_PER_HOUR))
+    if speed <= 0:
+        raise ValueError("speed_km_per_hour must be positive")
+    
+    start_time = data.get('start_time', route.get('start_time') if isinstance(route, dict) else None)
+    start_minute = clock_minutes(start_time or SHIFT_START_TIME)
+    
+    # Leg and service minutes are fixed now; events only redo the cumulative sums
+    points = np.array([(stop['latitude'], stop['longitude']) for stop in stops], dtype=np.float64)
+    travel = np.concatenate(([0.0], haversine_pairs(points[:-1], points[1:]) / speed * 60))
+    multipliers = speed_multipliers(points, time_slot_at(start_minute), speed_conditions_from_request(data))
+    if multipliers is not None:
+        travel[1:] /= (multipliers[:-1] + multipliers[1:]) / 2
+    service = [0 if stop.get('type') == 'depot' else DELIVERY_TIME_MINUTES.get(stop.get('address_type', 0), 5)
+               for stop in stops]
+    stop_ids = [stop.get('order_id') or stop.get('customer_id') or stop.get('type') or position
+                for position, stop in enumerate(stops)]
+    return eta_session_store.create(stop_ids, travel, service, start_minute)
+
+@app.route('/eta-sessions', methods=['POST'])
+def create_eta_session():
+    """API endpoint to register a route for live ETA updates"""
+    try:
+        data = request.json
+        if not data or 'route' not in data:
+            return jsonify({'error': 'Missing required field: route'}), 400
+        
+        session = eta_session_from_request(data)
+        return jsonify(session.snapshot()), 201
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error in create ETA session endpoint: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/eta-sessions/<session_id>', methods=['GET'])
+def eta_session_status(session_id):
+    """API endpoint for the current ETAs of a live session"""
+    session = eta_session_store.get(session_id)
+    if session is None:
+        return jsonify({'error': f"Unknown or expired ETA session: {session_id}"}), 404
+    return jsonify(session.snapshot())
+
+@app.route('/eta-sessions/<session_id>/events', methods=['POST'])
+def eta_session_event(session_id):
+    """API endpoint to report a completed stop and get the remaining ETAs"""
+    try:
+        data = request.json
+        if not data or 'completed_at' not in data:
+            return jsonify({'error': 'Missing required field: completed_at'}), 400
+        
+        session = eta_session_store.get(session_id)
+        if session is None:
+            return jsonify({'error': f"Unknown or expired ETA session: {session_id}"}), 404
+        if 'position' in data:
+            position = int(data['position'])
+        elif 'stop_id' in data:
+            position = session.position_of(data['stop_id'])
+        else:
+            return jsonify({'error': 'Missing required field: stop_id or position'}), 400
+        
+        update = eta_session_store.complete_stop(session_id, position, clock_minutes(data['completed_at']))
+        if update is None:
+            return jsonify({'error': f"Unknown or expired ETA session: {session_id}"}), 404
+        return jsonify(update)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error in ETA session event endpoint: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/eta-sessions/<session_id>/stream', methods=['GET'])
+def eta_session_stream(session_id):
+    """API endpoint streaming a session's ETA updates as server-sent events"""
+    session = eta_session_store.get(session_id)
+    if session is None:
+        return jsonify({'error': f"Unknown or expired ETA session: {session_id}"}), 404
+    return Response(session.stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/eta-sessions/<session_id>/updates', methods=['GET'])
+def eta_session_updates(session_id):
+    """API endpoint long-polling a session for the next update after version since"""
+    try:
+        since = int(request.args.get('since', -1))
+        timeout = min(max(float(request.args.get('timeout', LONG_POLL_SECONDS)), 0), LONG_POLL_SECONDS)
+    except ValueError:
+        return jsonify({'error': 'since must be an integer and timeout a number of seconds'}), 400
+    session = eta_session_store.get(session_id)
+    update = session.wait_for_update(since, timeout) if session is not None else None
+    if update is None:
+        return jsonify({'error': f"Unknown or expired ETA session: {session_id}"}), 404
+    return jsonify(update)
+
+@app.route('/eta-sessions/<session_id>', methods=['DELETE'])
+def delete_eta_session(session_id):
+    """API endpoint to end a live ETA session and close its streams"""
+    if not eta_session_store.delete(session_id):
+        return jsonify({'error': f"Unknown or expired ETA session: {session_id}"}), 404
+    return jsonify({'session_id': session_id, 'deleted': True})
+
+@app.route('/eta-sessions/stats', methods=['GET'])
+def eta_session_stats():
+    """API endpoint for live ETA session statistics"""
+    return jsonify(eta_session_store.get_stats())
+
+@app.route('/solvers', methods=['GET'])
+def list_solvers():
+    """API endpoint listing the registered solvers and stage strategies"""
+    return jsonify(dict(solver_registry.describe(), default=DEFAULT_SOLVER, office_solvers=OFFICE_SOLVERS))
+
+@app.route('/distance-cache/stats', methods=['GET'])
+def distance_cache_stats():
+    """API endpoint to report persistent distance store statistics"""
+    if route_optimizer.distance_store is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(route_optimizer.distance_store.get_stats(), enabled=True))
+
+@app.route('/road-network/stats', methods=['GET'])
+def road_network_stats():
+    """API endpoint for road network size and shortest-path row cache statistics"""
+    road_network = get_road_network()
+    if road_network is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(road_network.get_stats(), enabled=True))
+
+@app.route('/route-cache/stats', methods=['GET'])
+def route_cache_stats():
+    """API endpoint to report route result cache statistics"""
+    if route_result_cache is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(route_result_cache.get_stats(), enabled=True))
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """API endpoint to check service health"""
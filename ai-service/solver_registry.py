@@ -0,0 +1,128 @@
+import logging
+import threading
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger('solver_registry')
+
+# Constants
+SOLVER_STAGES = ('clustering', 'construction', 'improvement')
+
+class SolverRegistry:
+    """
+    Named route solver stages and the solvers built from them
+    
+    Each stage maps a strategy name to a function:
+    
+    - clustering(optimizer, deliveries, num_clusters, depot_location, options)
+      returns (clusters, statistics)
+    - construction(optimizer, locations, distance_matrix, start_idx, options)
+      returns a route as a list of indices
+    - improvement(optimizer, route, distance_matrix, options, deadline)
+      returns (route, statistics)
+    
+    A solver names one strategy per stage; requests pick a solver and may
+    still override single stages.
+    """
+    
+    def __init__(self):
+        """Initialize an empty registry"""
+        self.stages = {stage: {} for stage in SOLVER_STAGES}
+        self.descriptions = {stage: {} for stage in SOLVER_STAGES}
+        self.solvers = {}
+        self.lock = threading.Lock()
+    
+    def register(self, stage, name, func=None, description=''):
+        """
+        Register a stage strategy, directly or as a decorator
+        
+        Args:
+            stage: One of SOLVER_STAGES
+            name: Strategy name used in requests
+            func: Stage function, see the class docstring
+            description: Short description for the solver listing
+        
+        Returns:
+            func, or a decorator registering the decorated function
+        """
+        if stage not in self.stages:
+            raise ValueError(f"Unknown solver stage: {stage}. Expected one of: {', '.join(SOLVER_STAGES)}")
+        if func is None:
+            return lambda decorated: self.register(stage, name, decorated, description)
+        with self.lock:
+            self.stages[stage][name] = func
+            self.descriptions[stage][name] = description
+        return func
+    
+    def register_solver(self, name, description='', **stages):
+        """
+        Register a solver as one strategy per stage
+        
+        Args:
+            name: Solver name used in requests and ROUTE_SOLVER
+            description: Short description for the solver listing
+            **stages: Strategy name for each of SOLVER_STAGES
+        """
+        missing = [stage for stage in SOLVER_STAGES if stage not in stages]
+        if missing:
+            raise ValueError(f"Solver {name} needs a strategy for: {', '.join(missing)}")
+        for stage, strategy in stages.items():
+            self.get(stage, strategy)
+        with self.lock:
+            self.solvers[name] = {'description': description, 'stages': dict(stages)}
+    
+    def get(self, stage, name):
+        """
+        Look up a stage strategy
+        
+        Args:
+            stage: One of SOLVER_STAGES
+            name: Strategy name
+        
+        Returns:
+            Stage function
+        """
+        strategies = self.stages.get(stage)
+        if strategies is None:
+            raise ValueError(f"Unknown solver stage: {stage}. Expected one of: {', '.join(SOLVER_STAGES)}")
+        if name not in strategies:
+            raise ValueError(f"Unknown {stage} strategy: {name}. Expected one of: {', '.join(strategies)}")
+        return strategies[name]
+    
+    def names(self, stage):
+        """Registered strategy names of a stage"""
+        return tuple(self.stages[stage])
+    
+    def resolve(self, solver):
+        """
+        Stage strategies of a solver
+        
+        Args:
+            solver: Registered solver name
+        
+        Returns:
+            Dictionary of stage -> strategy name
+        """
+        if solver not in self.solvers:
+            raise ValueError(f"Unknown solver: {solver}. Expected one of: {', '.join(self.solvers)}")
+        return dict(self.solvers[solver]['stages'])
+    
+    def describe(self):
+        """
+        List solvers and stage strategies
+        
+        Returns:
+            Dictionary with every solver's stages and every stage's strategies
+        """
+        with self.lock:
+            return {
+                'solvers': {name: dict(solver) for name, solver in self.solvers.items()},
+                'stages': {stage: dict(descriptions) for stage, descriptions in self.descriptions.items()}
+            }
+
+# Shared registry; route_optimization registers the built-in strategies
+solver_registry = SolverRegistry()
@@ -0,0 +1,234 @@
+import numpy as np
+import pandas as pd
+import os
+import logging
+import threading
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger('speed_tables')
+
+# Constants
+SPEED_TABLE_PATH = os.environ.get('SPEED_TABLE_PATH', 'speed_table.npz')
+DATASET_PATH = 'Dataset.csv'  # Same default as DatasetManager
+NUM_TIME_SLOTS = 9  # Matches TIME_SLOTS in route_optimization
+CELL_SIZE_DEG = 0.01  # ~1.1 km area cells
+CELL_KEY_BASE = 100000  # Cell key = lat index * base + lng index
+PRIOR_WEIGHT = 20.0  # Deliveries a cell needs before its own history outweighs the city-wide slot average
+# Speed relative to free flow for each dataset code (1 = light / clear, 3 = heavy / bad)
+TRAFFIC_SPEED_FACTORS = {1: 1.0, 2: 0.8, 3: 0.6}
+WEATHER_SPEED_FACTORS = {1: 1.0, 2: 0.9, 3: 0.75}
+
+# Shared table, loaded or fitted on first use
+_speed_table = None
+_speed_table_lock = threading.Lock()
+
+def cell_keys(locations, cell_size=CELL_SIZE_DEG):
+    """
+    Integer area cell of each location
+    
+    Args:
+        locations: (n, 2) array of (latitude, longitude)
+        cell_size: Cell edge in degrees
+    
+    Returns:
+        int64 array of cell keys
+    """
+    locations = np.asarray(locations, dtype=np.float64).reshape(-1, 2)
+    rows = np.floor(locations[:, 0] / cell_size).astype(np.int64)
+    cols = np.floor(locations[:, 1] / cell_size).astype(np.int64)
+    return rows * CELL_KEY_BASE + cols
+
+class SpeedTable:
+    """
+    Travel speed multipliers by time slot, traffic, weather and area cell
+    
+    The table has shape (slots + 1, 4, 4, cells + 1). Index 0 of the slot,
+    traffic and weather axes means "not known": the multiplier is then the
+    expected factor over the historical traffic and weather mix of that slot
+    and cell, shrunk towards the city-wide value for cells with little history.
+    The last cell column is the city-wide value used for unseen cells, and all
+    values are relative to the average historical conditions. Lookups
+    are plain array indexing, so scaling travel times costs one vectorized
+    divide per request.
+    """
+    
+    def __init__(self, multipliers, keys, cell_size=CELL_SIZE_DEG):
+        """
+        Initialize the table
+        
+        Args:
+            multipliers: Array of shape (slots + 1, 4, 4, len(keys) + 1)
+            keys: Sorted int64 cell keys of the table's cell columns
+            cell_size: Cell edge in degrees
+        """
+        self.multipliers = np.asarray(multipliers, dtype=np.float32)
+        self.keys = np.asarray(keys, dtype=np.int64)
+        self.cell_size = float(cell_size)
+    
+    @classmethod
+    def from_dataset(cls, dataset_path=DATASET_PATH, cell_size=CELL_SIZE_DEG, prior_weight=PRIOR_WEIGHT):
+        """
+        Fit the table from historical deliveries
+        
+        Dataset.csv has no travel times, so speed factors per traffic and weather
+        code are fixed (TRAFFIC_SPEED_FACTORS, WEATHER_SPEED_FACTORS); history
+        supplies how often each condition occurs per slot and cell. Multipliers
+        are normalized so the historical average is 1.0.
+        
+        Args:
+            dataset_path: Path to Dataset.csv
+            cell_size: Cell edge in degrees
+            prior_weight: Shrinkage of sparse cells towards the city-wide value
+        
+        Returns:
+            SpeedTable instance
+        """
+        df = pd.read_csv(dataset_path)
+        coordinates = df['Delivery Address (Lat, Long)'].str.split(',', expand=True).apply(pd.to_numeric)
+        slots = df['Modified Time Slot'].fillna(df['Initial Time Slot'])
+        history = pd.DataFrame({
+            'latitude': coordinates[0],
+            'longitude': coordinates[1],
+            'slot': slots,
+            'traffic': df['Delivery Route Traffic Conditions'],
+            'weather': df['Weather Conditions']
+        }).dropna()
+        history = history[history['slot'].between(1, NUM_TIME_SLOTS)
+                          & history['traffic'].isin(list(TRAFFIC_SPEED_FACTORS))
+                          & history['weather'].isin(list(WEATHER_SPEED_FACTORS))]
+        history['slot'] = history['slot'].astype(int)
+        history['cell'] = cell_keys(history[['latitude', 'longitude']].values, cell_size)
+        traffic = history['traffic'].map(TRAFFIC_SPEED_FACTORS).values
+        weather = history['weather'].map(WEATHER_SPEED_FACTORS).values
+        
+        keys = np.unique(history['cell'].values)
+        cell_idx = np.searchsorted(keys, history['cell'].values)
+        slot_idx = history['slot'].values
+        n_slots, n_cells = NUM_TIME_SLOTS + 1, len(keys) + 1
+        
+        # Expected factor when traffic, weather or both are unknown, per (slot, cell)
+        expected = {}
+        for name, values in (('traffic', traffic), ('weather', weather), ('both', traffic * weather)):
+            sums = np.zeros((n_slots, n_cells))
+            counts = np.zeros((n_slots, n_cells))
+            for slots_axis in (slot_idx, np.zeros_like(slot_idx)):  # Slot 0 pools every slot
+                for cells_axis in (cell_idx, np.full_like(cell_idx, len(keys))):  # Last column pools every cell
+                    np.add.at(sums, (slots_axis, cells_axis), values)
+                    np.add.at(counts, (slots_axis, cells_axis), 1)
+            overall = values.mean() if len(values) else 1.0
+            # City-wide column shrinks towards the overall mean, cells towards their slot's city-wide value
+            city = (sums[:, -1] + prior_weight * overall) / (counts[:, -1] + prior_weight)
+            expected[name] = (sums + prior_weight * city[:, None]) / (counts + prior_weight)
+            expected[name][:, -1] = city
+        
+        multipliers = np.empty((n_slots, 4, 4, n_cells))
+        for t in range(4):
+            for w in range(4):
+                if t and w:
+                    multipliers[:, t, w, :] = TRAFFIC_SPEED_FACTORS[t] * WEATHER_SPEED_FACTORS[w]
+                elif t:
+                    multipliers[:, t, w, :] = TRAFFIC_SPEED_FACTORS[t] * expected['weather']
+                elif w:
+                    multipliers[:, t, w, :] = expected['traffic'] * WEATHER_SPEED_FACTORS[w]
+                else:
+                    multipliers[:, t, w, :] = expected['both']
+        
+        # POSTMAN_SPEED_KM_PER_HOUR is an average speed, so average historical conditions map to 1.0
+        multipliers /= traffic.dot(weather) / len(traffic) if len(traffic) else 1.0
+        
+        logger.info(f"Fitted speed table from {len(history)} deliveries ({len(keys)} cells)")
+        return cls(multipliers, keys, cell_size)
+    
+    @classmethod
+    def load(cls, path=SPEED_TABLE_PATH):
+        """
+        Load a table saved with save()
+        
+        Args:
+            path: Path to the .npz file
+        
+        Returns:
+            SpeedTable instance
+        """
+        with np.load(path) as data:
+            return cls(data['multipliers'], data['keys'], float(data['cell_size']))
+    
+    def save(self, path=SPEED_TABLE_PATH):
+        """
+        Save the table to a .npz file
+        
+        Args:
+            path: Path to the .npz file
+        """
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, multipliers=self.multipliers, keys=self.keys, cell_size=self.cell_size)
+        os.replace(tmp_path, path)
+        logger.info(f"Saved speed table to {path}")
+    
+    def location_multipliers(self, locations, time_slot=None, traffic=None, weather=None):
+        """
+        Speed multiplier at each location
+        
+        Args:
+            locations: (n, 2) array of (latitude, longitude)
+            time_slot: Slot number 1-9 (or one per location, 0 when unknown), or None when unknown
+            traffic: Traffic code 1-3, or None when unknown
+            weather: Weather code 1-3, or None when unknown
+        
+        Returns:
+            float64 array of multipliers
+        """
+        keys = cell_keys(locations, self.cell_size)
+        cells = np.searchsorted(self.keys, keys)
+        found = cells < len(self.keys)
+        found[found] = self.keys[cells[found]] == keys[found]
+        cells[~found] = len(self.keys)  # City-wide column
+        slots = 0 if time_slot is None else np.asarray(time_slot, dtype=np.int64)
+        return self.multipliers[slots, traffic or 0, weather or 0, cells].astype(np.float64)
+    
+    def leg_multipliers(self, sources, targets, time_slot=None, traffic=None, weather=None):
+        """
+        Speed multiplier of each leg, the mean of its two end cells
+        
+        Args:
+            sources: (n, 2) array of leg start locations
+            targets: (n, 2) array of leg end locations
+            time_slot: Slot number 1-9, or None when unknown
+            traffic: Traffic code 1-3, or None when unknown
+            weather: Weather code 1-3, or None when unknown
+        
+        Returns:
+            float64 array of multipliers
+        """
+        return (self.location_multipliers(sources, time_slot, traffic, weather)
+                + self.location_multipliers(targets, time_slot, traffic, weather)) / 2
+
+def get_speed_table():
+    """
+    Get the shared speed table, loading the saved table or fitting it from the dataset
+    
+    Returns:
+        SpeedTable instance, or None if neither file is available
+    """
+    global _speed_table
+    with _speed_table_lock:
+        if _speed_table is None:
+            try:
+                if os.path.exists(SPEED_TABLE_PATH):
+                    _speed_table = SpeedTable.load(SPEED_TABLE_PATH)
+                elif os.path.exists(DATASET_PATH):
+                    _speed_table = SpeedTable.from_dataset(DATASET_PATH)
+                else:
+                    logger.warning("No speed table or dataset found")
+            except Exception as e:
+                logger.error(f"Error loading speed table: {e}")
+        return _speed_table
+
+# Fit the table offline: python speed_tables.py
+if __name__ == '__main__':
+    SpeedTable.from_dataset(DATASET_PATH).save(SPEED_TABLE_PATH)
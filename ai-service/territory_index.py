@@ -0,0 +1,268 @@
+import numpy as np
+import pandas as pd
+import os
+import json
+import logging
+import threading
+from collections import Counter, defaultdict
+from scipy.spatial import cKDTree
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger('territory_index')
+
+# Constants
+GEOHASH_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_PRECISION = 7  # ~150 m x 150 m cells
+DAILY_CAPACITY = 25  # Orders per postman per delivery date, matches MAX_DELIVERIES_PER_POSTMAN
+OVERFLOW_CANDIDATES = 16  # Nearest historical stops checked for a neighboring postman with room
+TERRITORY_INDEX_PATH = os.environ.get('TERRITORY_INDEX_PATH', 'territories.json')
+DATASET_PATH = 'Dataset.csv'  # Same default as DatasetManager
+
+# Shared index, loaded or built on first use
+_territory_index = None
+_territory_index_lock = threading.Lock()
+
+def geohash_encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    """
+    Encode a location as a geohash string
+    
+    Args:
+        latitude: Latitude in degrees
+        longitude: Longitude in degrees
+        precision: Number of base32 characters
+    
+    Returns:
+        Geohash string
+    """
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        # Bits alternate between longitude and latitude, longitude first
+        value, bounds = (longitude, lng_range) if even else (latitude, lat_range)
+        mid = (bounds[0] + bounds[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            bounds[0] = mid
+        else:
+            bits <<= 1
+            bounds[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(GEOHASH_BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return ''.join(chars)
+
+class TerritoryIndex:
+    """
+    Postman territories from historical deliveries
+    
+    Each geohash cell is owned by the postman who delivered there most often;
+    locations in unseen cells go to the postman of the nearest historical stop
+    (a Voronoi lookup through a KD-tree). Per-postman load counters for each
+    delivery date move overflow orders to the nearest neighboring postman with room.
+    """
+    
+    def __init__(self, cells, locations, postmen, precision=GEOHASH_PRECISION, daily_capacity=DAILY_CAPACITY):
+        """
+        Initialize the index
+        
+        Args:
+            cells: Dictionary of geohash -> postman ID
+            locations: (n, 2) array of historical (latitude, longitude) stops
+            postmen: Postman ID of each historical stop
+            precision: Geohash precision of the cells
+            daily_capacity: Orders per postman per delivery date before overflow
+        """
+        self.cells = cells
+        self.locations = np.asarray(locations, dtype=np.float64).reshape(-1, 2)
+        self.postmen = list(postmen)
+        self.precision = precision
+        self.daily_capacity = daily_capacity
+        self.tree = cKDTree(self._scaled(self.locations)) if len(self.locations) else None
+        self.loads = defaultdict(Counter)  # delivery date -> postman ID -> orders assigned
+        self.lock = threading.Lock()
+    
+    @staticmethod
+    def _scaled(locations):
+        """Scale longitude by cos(latitude) so KD-tree distances follow ground distance"""
+        locations = np.asarray(locations, dtype=np.float64).reshape(-1, 2)
+        return np.column_stack([locations[:, 0], locations[:, 1] * np.cos(np.radians(locations[:, 0]))])
+    
+    @classmethod
+    def from_dataset(cls, dataset_path=DATASET_PATH, precision=GEOHASH_PRECISION, daily_capacity=DAILY_CAPACITY):
+        """
+        Build territories from historical deliveries
+        
+        Args:
+            dataset_path: Path to Dataset.csv
+            precision: Geohash precision of the cells
+            daily_capacity: Orders per postman per delivery date before overflow
+        
+        Returns:
+            TerritoryIndex instance
+        """
+        df = pd.read_csv(dataset_path)
+        coordinates = df['Delivery Address (Lat, Long)'].str.split(',', expand=True).apply(pd.to_numeric)
+        history = pd.DataFrame({
+            'latitude': coordinates[0],
+            'longitude': coordinates[1],
+            'postman_id': df['Postman ID']
+        }).dropna()
+        history['cell'] = [geohash_encode(lat, lng, precision)
+                           for lat, lng in zip(history['latitude'], history['longitude'])]
+        
+        # Cell owner: most frequent postman, ties broken by postman ID
+        counts = history.groupby(['cell', 'postman_id']).size().reset_index(name='count')
+        counts = counts.sort_values(['cell', 'count', 'postman_id'], ascending=[True, False, True])
+        cells = dict(zip(*counts.drop_duplicates('cell')[['cell', 'postman_id']].values.T))
+        
+        # One KD-tree point per distinct historical stop
+        stops = history.drop_duplicates(['latitude', 'longitude', 'postman_id'])
+        logger.info(f"Built territories for {history['postman_id'].nunique()} postmen "
+                    f"from {len(history)} deliveries ({len(cells)} cells)")
+        return cls(cells, stops[['latitude', 'longitude']].values, stops['postman_id'].tolist(),
+                   precision, daily_capacity)
+    
+    @classmethod
+    def load(cls, path=TERRITORY_INDEX_PATH, daily_capacity=DAILY_CAPACITY):
+        """
+        Load territories saved with save()
+        
+        Args:
+            path: Path to the JSON index file
+            daily_capacity: Orders per postman per delivery date before overflow
+        
+        Returns:
+            TerritoryIndex instance
+        """
+        with open(path, 'r') as f:
+            data = json.load(f)
+        return cls(data['cells'], data['locations'], data['postmen'], data['precision'], daily_capacity)
+    
+    def save(self, path=TERRITORY_INDEX_PATH):
+        """
+        Save territories to a JSON file
+        
+        Args:
+            path: Path to the JSON index file
+        """
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                'precision': self.precision,
+                'cells': self.cells,
+                'locations': self.locations.tolist(),
+                'postmen': self.postmen
+            }, f)
+        os.replace(tmp_path, path)
+        logger.info(f"Saved territory index to {path}")
+    
+    def owner(self, latitude, longitude):
+        """
+        Find the postman whose territory contains a location
+        
+        Args:
+            latitude: Latitude in degrees
+            longitude: Longitude in degrees
+        
+        Returns:
+            Tuple of (postman ID, 'territory' or 'nearest'), or (None, None) for an empty index
+        """
+        postman_id = self.cells.get(geohash_encode(latitude, longitude, self.precision))
+        if postman_id is not None:
+            return postman_id, 'territory'
+        if self.tree is None:
+            return None, None
+        _, idx = self.tree.query(self._scaled([(latitude, longitude)])[0])
+        return self.postmen[idx], 'nearest'
+    
+    def assign(self, latitude, longitude, delivery_date=None):
+        """
+        Assign a new order to a postman and count it against their daily load
+        
+        Args:
+            latitude: Latitude in degrees
+            longitude: Longitude in degrees
+            delivery_date: Delivery date string; loads are tracked per date
+        
+        Returns:
+            Dictionary with postman_id, method ('territory', 'nearest' or 'overflow'; the
+            first two get an '_over_capacity' suffix when every postman is full for the date)
+            and the postman's load for the date, or None for an empty index
+        """
+        postman_id, method = self.owner(latitude, longitude)
+        if postman_id is None:
+            return None
+        
+        with self.lock:
+            loads = self.loads[delivery_date or '']
+            if loads[postman_id] >= self.daily_capacity and self.tree is not None:
+                # Owner is full: hand the order to the nearest other postman with room,
+                # widening the search until every historical stop has been checked
+                point = self._scaled([(latitude, longitude)])[0]
+                k = min(OVERFLOW_CANDIDATES, len(self.postmen))
+                overflow = None
+                while overflow is None:
+                    _, nearest = self.tree.query(point, k=k)
+                    overflow = next((self.postmen[idx] for idx in np.atleast_1d(nearest)
+                                     if loads[self.postmen[idx]] < self.daily_capacity), None)
+                    if k == len(self.postmen):
+                        break
+                    k = min(k * 4, len(self.postmen))
+                if overflow is not None:
+                    postman_id, method = overflow, 'overflow'
+                else:
+                    method = f"{method}_over_capacity"
+            loads[postman_id] += 1
+            load = loads[postman_id]
+        
+        return {'postman_id': postman_id, 'method': method, 'load': load}
+    
+    def get_loads(self, delivery_date=None):
+        """
+        Get orders assigned per postman for a delivery date
+        
+        Args:
+            delivery_date: Delivery date string
+        
+        Returns:
+            Dictionary of postman ID -> orders assigned
+        """
+        with self.lock:
+            return dict(self.loads.get(delivery_date or '', {}))
+
+def get_territory_index():
+    """
+    Get the shared territory index, loading the saved index or building it from the dataset
+    
+    Returns:
+        TerritoryIndex instance, or None if neither file is available
+    """
+    global _territory_index
+    with _territory_index_lock:
+        if _territory_index is None:
+            try:
+                if os.path.exists(TERRITORY_INDEX_PATH):
+                    _territory_index = TerritoryIndex.load(TERRITORY_INDEX_PATH)
+                elif os.path.exists(DATASET_PATH):
+                    _territory_index = TerritoryIndex.from_dataset(DATASET_PATH)
+                else:
+                    logger.warning("No territory index or dataset found")
+            except Exception as e:
+                logger.error(f"Error loading territory index: {e}")
+        return _territory_index
+
+# Build the index offline: python territory_index.py
+if __name__ == '__main__':
+    TerritoryIndex.from_dataset(DATASET_PATH).save(TERRITORY_INDEX_PATH)
@@ -149,6 +149,25 @@ class TestRouteOptimization(unittest.TestCase):
         self.assertEqual(distance_matrix[0, 0], 0)  # Distance to self is 0
         self.assertTrue(np.all(distance_matrix >= 0))  # All distances are non-negative
     
+    def test_distance_matrix_matches_haversine(self):
+        """Test vectorized distance matrix against geopy's great-circle distance"""
+        from geopy.distance import great_circle
+        from route_optimization import EARTH_RADIUS_KM
+        rng = np.random.default_rng(7)
+        locations = list(zip(rng.uniform(17.3, 17.6, 40), rng.uniform(78.3, 78.6, 40)))
+        distance_matrix = self.optimizer.calculate_distance_matrix(locations)
+        
+        for i in range(len(locations)):
+            for j in range(len(locations)):
+                self.assertAlmostEqual(distance_matrix[i, j],
+                                       great_circle(locations[i], locations[j], radius=EARTH_RADIUS_KM).km, delta=1e-6)
+        
+        # Rectangular variant and float32 output
+        rect = self.optimizer.calculate_distance_matrix_rect(locations[:5], locations, dtype=np.float32)
+        self.assertEqual(rect.shape, (5, 40))
+        self.assertEqual(rect.dtype, np.float32)
+        np.testing.assert_allclose(rect, distance_matrix[:5], atol=1e-3)
+    
     def test_nearest_neighbor_route(self):
         """Test nearest neighbor routing"""
         locations = [(d['latitude'], d['longitude']) for d in self.test_deliveries]
@@ -159,6 +178,544 @@ class TestRouteOptimization(unittest.TestCase):
         self.assertEqual(len(route), 3)
         self.assertEqual(set(route), {0, 1, 2})  # All points visited
     
+    def test_spatial_construction_strategies(self):
+        """Test grid, greedy-edge and Hilbert constructions visit every stop once"""
+        rng = np.random.default_rng(11)
+        locations = list(zip(rng.uniform(17.3, 17.6, 300), rng.uniform(78.3, 78.6, 300)))
+        distance_matrix = self.optimizer.calculate_distance_matrix(locations)
+        
+        # The grid search must pick the same stops as the dense-matrix version
+        self.assertEqual(self.optimizer.grid_nearest_neighbor_route(locations),
+                         self.optimizer.nearest_neighbor_route(distance_matrix))
+        
+        for strategy in ('greedy_edge', 'hilbert'):
+            route = self.optimizer.construct_route(locations, None, strategy)
+            self.assertEqual(route[0], 0)
+            self.assertEqual(sorted(route), list(range(300)))
+        
+        result = self.optimizer.optimize_postman_routes(self.test_deliveries, options={'construction': 'greedy_edge'})
+        self.assertTrue(result['success'])
+        self.assertEqual(result['total_deliveries'], 3)
+    
+    def test_sparse_distance_graph(self):
+        """Test the k-nearest-neighbor graph against the dense matrix"""
+        from route_optimization import SparseDistanceGraph
+        rng = np.random.default_rng(13)
+        locations = list(zip(rng.uniform(17.3, 17.6, 200), rng.uniform(78.3, 78.6, 200)))
+        distance_matrix = self.optimizer.calculate_distance_matrix(locations)
+        graph = SparseDistanceGraph(locations, k=6)
+        
+        self.assertEqual(graph.indices.shape, (200 * 6,))
+        for i in range(0, 200, 20):
+            expected = np.argsort(np.where(np.arange(200) == i, np.inf, distance_matrix[i]))[:6]
+            self.assertEqual(list(graph.neighbors(i)), expected.tolist())
+            self.assertAlmostEqual(graph[i, 199 - i], distance_matrix[i, 199 - i], places=9)
+        
+        deliveries = [{'latitude': lat, 'longitude': lng, 'address_type': 0} for lat, lng in locations]
+        result = self.optimizer.optimize_postman_routes(deliveries, options={'matrix_mode': 'sparse'})
+        self.assertTrue(result['success'])
+        self.assertEqual(result['routes'][0]['distance_model']['mode'], 'sparse')
+        self.assertEqual(len(result['routes'][0]['route']), 201)
+    
+    def test_neighbor_two_opt_improvement(self):
+        """Test neighbor-list 2-opt keeps the depot first and never lengthens the route"""
+        rng = np.random.default_rng(3)
+        locations = list(zip(rng.uniform(17.3, 17.6, 120), rng.uniform(78.3, 78.6, 120)))
+        distance_matrix = self.optimizer.calculate_distance_matrix(locations)
+        initial_route = self.optimizer.nearest_neighbor_route(distance_matrix)
+        
+        route, _ = self.optimizer.improve_route(initial_route, distance_matrix, 'neighbor_two_opt')
+        
+        self.assertEqual(route[0], 0)
+        self.assertEqual(sorted(route), list(range(120)))
+        self.assertLess(self.optimizer.calculate_route_distance(route, distance_matrix),
+                        self.optimizer.calculate_route_distance(initial_route, distance_matrix))
+        
+        result = self.optimizer.optimize_postman_routes(self.test_deliveries, options={'improvement': 'neighbor_two_opt'})
+        self.assertTrue(result['success'])
+        self.assertEqual(result['total_deliveries'], 3)
+    
+    def test_local_search_with_time_budget(self):
+        """Test the Or-opt/3-opt local search driver and its budget reporting"""
+        rng = np.random.default_rng(5)
+        locations = list(zip(rng.uniform(17.3, 17.6, 80), rng.uniform(78.3, 78.6, 80)))
+        distance_matrix = self.optimizer.calculate_distance_matrix(locations)
+        initial_route = self.optimizer.nearest_neighbor_route(distance_matrix)
+        
+        for operator in ('or_opt', 'three_opt'):
+            route, stats = self.optimizer.local_search_improvement(
+                initial_route, distance_matrix, time_budget_ms=None, operators=(operator,)
+            )
+            self.assertEqual(route[0], 0)
+            self.assertEqual(sorted(route), list(range(80)))
+            self.assertAlmostEqual(self.optimizer.calculate_route_distance(route, distance_matrix),
+                                   stats['final_distance_km'], places=2)
+            self.assertGreater(stats['distance_saved_km'], 0)
+            self.assertTrue(stats['converged'])
+        
+        deliveries = [{'latitude': lat, 'longitude': lng, 'address_type': 0} for lat, lng in locations]
+        result = self.optimizer.optimize_postman_routes(
+            deliveries, num_postmen=2, options={'improvement': 'local_search', 'time_budget_ms': 50}
+        )
+        self.assertTrue(result['success'])
+        self.assertEqual(result['local_search']['time_budget_ms'], 50)
+        self.assertGreaterEqual(result['local_search']['distance_saved_km'], 0)
+        for route in result['routes']:
+            # Either the search ran out of improving moves or the budget stopped it
+            improvement = route['improvement']
+            self.assertTrue(improvement['converged'] or improvement['time_used_ms'] >= 50)
+            self.assertEqual(set(improvement['moves']), {'two_opt', 'or_opt', 'three_opt'})
+            self.assertGreaterEqual(improvement['distance_saved_km'], 0)
+    
+    def test_process_pool_matches_serial(self):
+        """Test per-cluster process pool execution returns the serial plan in order"""
+        from unittest import mock
+        import route_optimization
+        rng = np.random.default_rng(17)
+        deliveries = [
+            {'order_id': f'ORD{i}', 'latitude': lat, 'longitude': lng, 'address_type': i % 3}
+            for i, (lat, lng) in enumerate(zip(rng.uniform(17.3, 17.6, 120), rng.uniform(78.3, 78.6, 120)))
+        ]
+        
+        serial = self.optimizer.optimize_postman_routes(deliveries, num_postmen=4)
+        with mock.patch.object(route_optimization, 'MAX_ROUTE_WORKERS', 2):
+            parallel = self.optimizer.optimize_postman_routes(
+                deliveries, num_postmen=4, options={'execution_mode': 'process', 'max_workers': 2}
+            )
+        
+        self.assertEqual(parallel['execution']['mode'], 'process')
+        self.assertEqual(parallel['execution']['workers'], 2)
+        self.assertEqual(len(parallel['execution']['cluster_time_ms']), 4)
+        self.assertEqual([route['postman_id'] for route in parallel['routes']],
+                         [route['postman_id'] for route in serial['routes']])
+        self.assertEqual([[stop.get('order_id') for stop in route['route']] for route in parallel['routes']],
+                         [[stop.get('order_id') for stop in route['route']] for route in serial['routes']])
+        self.assertEqual(parallel['total_distance_km'], serial['total_distance_km'])
+    
+    def test_time_slot_fan_out(self):
+        """Test concurrent time slot optimization matches the serial result"""
+        from unittest import mock
+        import route_optimization
+        rng = np.random.default_rng(19)
+        deliveries = [
+            {'order_id': f'ORD{i}', 'latitude': lat, 'longitude': lng, 'address_type': 0, 'time_slot': i % 3 + 1}
+            for i, (lat, lng) in enumerate(zip(rng.uniform(17.3, 17.6, 90), rng.uniform(78.3, 78.6, 90)))
+        ]
+        
+        serial = self.optimizer.optimize_by_time_slot(deliveries, num_postmen=2)
+        with mock.patch.object(route_optimization, 'MAX_ROUTE_WORKERS', 2):
+            parallel = self.optimizer.optimize_by_time_slot(
+                deliveries, num_postmen=2, options={'execution_mode': 'process'}
+            )
+            streamed = dict(self.optimizer.iter_time_slot_results(
+                deliveries, num_postmen=2, options={'execution_mode': 'process'}
+            ))
+        
+        self.assertTrue(parallel['success'])
+        self.assertEqual(list(parallel['time_slot_routes']), [1, 2, 3])
+        self.assertEqual(parallel['total_distance_km'], serial['total_distance_km'])
+        self.assertEqual(set(streamed), {1, 2, 3})
+        for time_slot, result in streamed.items():
+            self.assertEqual(result['total_deliveries'], 30)
+            self.assertEqual(result['execution']['mode'], 'process')
+    
+    def test_route_result_cache(self):
+        """Test identical re-plans are served from the result cache"""
+        from unittest import mock
+        import route_optimization
+        from route_cache import RouteResultCache
+        client = route_optimization.app.test_client()
+        payload = {'deliveries': self.test_deliveries, 'num_postmen': 1}
+        
+        with mock.patch.object(route_optimization, 'route_result_cache', RouteResultCache(max_entries=1)) as cache:
+            first = client.post('/optimize-routes', json=payload)
+            second = client.post('/optimize-routes', json=dict(reversed(list(payload.items()))))
+            bypass = client.post('/optimize-routes', json=dict(payload, use_cache=False))
+            other = client.post('/optimize-routes', json=dict(payload, num_postmen=2))
+            evicted = client.post('/optimize-routes', json=payload)
+        
+        self.assertEqual(first.headers['X-Route-Cache'], 'MISS')
+        self.assertEqual(second.headers['X-Route-Cache'], 'HIT')
+        self.assertEqual(second.headers['X-Route-Cache-Key'], first.headers['X-Route-Cache-Key'])
+        self.assertIn('Age', second.headers)
+        self.assertEqual(second.get_json(), first.get_json())
+        self.assertEqual(bypass.headers['X-Route-Cache'], 'BYPASS')
+        self.assertEqual(other.headers['X-Route-Cache'], 'MISS')
+        self.assertEqual(evicted.headers['X-Route-Cache'], 'MISS')
+        self.assertEqual(cache.get_stats()['evictions'], 2)
+    
+    def test_insert_deliveries(self):
+        """Test late deliveries are inserted without disturbing other routes"""
+        rng = np.random.default_rng(23)
+        deliveries = [
+            {'order_id': f'ORD{i}', 'latitude': lat, 'longitude': lng, 'address_type': 0}
+            for i, (lat, lng) in enumerate(zip(rng.uniform(17.3, 17.6, 60), rng.uniform(78.3, 78.6, 60)))
+        ]
+        plan = self.optimizer.optimize_postman_routes(deliveries, num_postmen=3, depot_location=(17.45, 78.45))
+        self.assertEqual(self.optimizer.route_stop_statistics(plan['routes'][0]['route']),
+                         plan['routes'][0]['statistics'])
+        
+        new_delivery = dict(deliveries[5], order_id='LATE1', latitude=deliveries[5]['latitude'] + 1e-4)
+        result = self.optimizer.insert_deliveries(plan['routes'], [new_delivery], {'repair': True})
+        
+        self.assertTrue(result['success'])
+        self.assertEqual(result['total_deliveries'], 61)
+        insertion = result['insertions'][0]
+        self.assertLess(insertion['added_distance_km'], 0.05)
+        updated = next(route for route in result['routes'] if route['postman_id'] == insertion['postman_id'])
+        self.assertEqual(updated['route'][insertion['position']]['order_id'], 'LATE1')
+        self.assertEqual(result['updated_postmen'], [insertion['postman_id']])
+        for before, after in zip(plan['routes'], result['routes']):
+            if after['postman_id'] != insertion['postman_id']:
+                self.assertEqual(after, before)
+    
+    def test_repair_route(self):
+        """Test only the unvisited suffix is re-planned after a failed and a cancelled delivery"""
+        from datetime import datetime, timedelta
+        rng = np.random.default_rng(29)
+        deliveries = [
+            {'order_id': f'ORD{i}', 'latitude': lat, 'longitude': lng, 'address_type': 0}
+            for i, (lat, lng) in enumerate(zip(rng.uniform(17.3, 17.6, 12), rng.uniform(78.3, 78.6, 12)))
+        ]
+        route = self.optimizer.optimize_postman_routes(deliveries, depot_location=(17.45, 78.45))['routes'][0]
+        order_ids = [stop['order_id'] for stop in route['route'][1:]]
+        
+        result = self.optimizer.repair_route(
+            route, completed=order_ids[:4], removed=[order_ids[6]], deferred=[order_ids[5]],
+            start_time=datetime(2024, 1, 10, 10, 0)
+        )
+        
+        self.assertTrue(result['success'])
+        self.assertEqual(result['completed'], order_ids[:4])
+        remaining = [stop['order_id'] for stop in result['route']]
+        self.assertEqual(len(remaining), 7)
+        self.assertEqual(remaining[-1], order_ids[5])
+        self.assertNotIn(order_ids[6], remaining)
+        self.assertEqual(set(remaining[:-1]), set(order_ids[4:5] + order_ids[7:]))
+        self.assertEqual(result['current_location']['latitude'], route['route'][4]['latitude'])
+        
+        # ETAs: first leg at 12 km/h, then a 5 minute service time before each next leg
+        first = result['route'][0]
+        expected = datetime(2024, 1, 10, 10, 0) + timedelta(minutes=first['travel_distance_km'] / 12 * 60)
+        self.assertEqual(first['eta'], expected.strftime('%H:%M'))
+        self.assertEqual(sorted(stop['eta'] for stop in result['route'][:-1]),
+                         [stop['eta'] for stop in result['route'][:-1]])
+        
+        self.assertIn('error', self.optimizer.repair_route(route, removed=['NOPE']))
+        
+        # Focused search only starts next to the edits
+        from route_optimization import LocalSearch, relinked_stops
+        self.assertEqual(relinked_stops([0, 1, 2, 3, 4], [0, 1, 3, 2, 4]), {1, 2, 3, 4})
+        locations = [(17.4 + i / 100, 78.4) for i in range(8)]
+        order, stats = LocalSearch(self.optimizer.calculate_distance_matrix(locations)).run(
+            [0, 1, 2, 3, 5, 4, 6, 7], focus={7}
+        )
+        self.assertEqual(order, [0, 1, 2, 3, 5, 4, 6, 7])
+        self.assertTrue(stats['converged'])
+        order, _ = LocalSearch(self.optimizer.calculate_distance_matrix(locations)).run(
+            [0, 1, 2, 3, 5, 4, 6, 7], focus={4}
+        )
+        self.assertEqual(order, list(range(8)))
+    
+    def test_balanced_clustering(self):
+        """Test balanced clustering caps deliveries per postman"""
+        rng = np.random.default_rng(31)
+        # A dense neighborhood plus a sparse outskirts, which plain KMeans splits unevenly
+        latitudes = np.concatenate([rng.normal(17.45, 0.005, 70), rng.uniform(17.3, 17.6, 30)])
+        longitudes = np.concatenate([rng.normal(78.45, 0.005, 70), rng.uniform(78.3, 78.6, 30)])
+        deliveries = [
+            {'order_id': f'ORD{i}', 'latitude': lat, 'longitude': lng, 'address_type': i % 5}
+            for i, (lat, lng) in enumerate(zip(latitudes, longitudes))
+        ]
+        
+        clusters = self.optimizer.balanced_cluster_deliveries(deliveries, 5)
+        self.assertEqual(sum(len(cluster) for cluster in clusters), 100)
+        self.assertLessEqual(max(len(cluster) for cluster in clusters), 25)
+        
+        # Infeasible caps are raised to the smallest feasible size
+        clusters = self.optimizer.balanced_cluster_deliveries(deliveries, 3, balance='service_time')
+        self.assertLessEqual(max(len(cluster) for cluster in clusters), 34)
+        
+        result = self.optimizer.optimize_postman_routes(deliveries, num_postmen=5, options={'clustering': 'balanced'})
+        self.assertTrue(result['success'])
+        self.assertTrue(all(route['delivery_count'] <= 25 for route in result['routes']))
+    
+    def test_warm_started_clustering(self):
+        """Test MiniBatch clustering reuses the previous run's centroids for the same depot"""
+        import tempfile
+        rng = np.random.default_rng(37)
+        beats = np.column_stack([rng.normal(17.45, 0.08, 600), rng.normal(78.45, 0.08, 600)])
+        deliveries = [{'latitude': lat, 'longitude': lng} for lat, lng in beats]
+        options = {'clustering': 'minibatch', 'warm_start': True}
+        
+        with tempfile.TemporaryDirectory() as store_dir:
+            path = os.path.join(store_dir, 'centroids.json')
+            optimizer = RouteOptimizer(centroid_store_path=path)
+            clusters, cold = optimizer.cluster_with_options(deliveries, 6, (17.45, 78.45), options)
+            self.assertFalse(cold['warm_started'])
+            self.assertEqual(sum(len(cluster) for cluster in clusters), 600)
+            
+            # Next day: same beats, slightly different addresses, in a fresh optimizer
+            shifted = [{'latitude': lat + 1e-3, 'longitude': lng} for lat, lng in beats]
+            warm_optimizer = RouteOptimizer(centroid_store_path=path)
+            _, warm = warm_optimizer.cluster_with_options(shifted, 6, (17.45, 78.45), options)
+            self.assertTrue(warm['warm_started'])
+            self.assertLessEqual(warm['iterations'], cold['iterations'])
+            
+            # Another depot does not share centroids
+            _, other = warm_optimizer.cluster_with_options(shifted, 6, (17.3, 78.3), options)
+            self.assertFalse(other['warm_started'])
+    
+    def test_hierarchical_planner(self):
+        """Test region-by-region planning covers every delivery once"""
+        rng = np.random.default_rng(41)
+        deliveries = [
+            {'order_id': f'ORD{i}', 'latitude': lat, 'longitude': lng, 'address_type': 0}
+            for i, (lat, lng) in enumerate(zip(rng.uniform(17.3, 17.6, 600), rng.uniform(78.3, 78.6, 600)))
+        ]
+        
+        regions = self.optimizer.split_regions(deliveries, 8, max_deliveries=150)
+        self.assertEqual(len(regions), 4)
+        self.assertEqual(sum(postmen for _, postmen in regions), 8)
+        self.assertEqual([len(region) for region, _ in regions], [150] * 4)
+        
+        result = self.optimizer.optimize_postman_routes(
+            deliveries, num_postmen=8, depot_location=(17.45, 78.45),
+            options={'planner': 'hierarchical', 'region_max_deliveries': 150}
+        )
+        self.assertTrue(result['success'])
+        self.assertEqual(result['hierarchy']['regions'], 4)
+        self.assertEqual(len({route['postman_id'] for route in result['routes']}), 8)
+        visited = [stop['order_id'] for route in result['routes'] for stop in route['route'] if stop['type'] == 'delivery']
+        self.assertEqual(sorted(visited), sorted(d['order_id'] for d in deliveries))
+        self.assertAlmostEqual(result['total_distance_km'],
+                               sum(self.optimizer.route_stop_statistics(route['route'])['total_distance_km']
+                                   for route in result['routes']), places=1)
+    
+    def test_multi_depot(self):
+        """Test deliveries are split between depots by proximity and capacity"""
+        import route_optimization
+        rng = np.random.default_rng(43)
+        west = list(zip(rng.normal(17.40, 0.01, 30), rng.normal(78.40, 0.01, 30)))
+        east = list(zip(rng.normal(17.50, 0.01, 60), rng.normal(78.50, 0.01, 60)))
+        deliveries = [
+            {'order_id': f'ORD{i}', 'latitude': lat, 'longitude': lng, 'address_type': 0}
+            for i, (lat, lng) in enumerate(west + east)
+        ]
+        depots = [
+            {'depot_id': 'PO1', 'latitude': 17.40, 'longitude': 78.40, 'num_postmen': 2},
+            {'depot_id': 'PO2', 'latitude': 17.50, 'longitude': 78.50, 'num_postmen': 2}
+        ]
+        
+        # PO2 holds 2 x 25 deliveries, so 10 of the eastern ones overflow to PO1
+        assigned = self.optimizer.assign_depots(deliveries, depots)
+        self.assertEqual([len(group) for group in assigned], [40, 50])
+        self.assertLessEqual({f'ORD{i}' for i in range(30)}, {d['order_id'] for d in assigned[0]})
+        
+        result = self.optimizer.optimize_multi_depot(deliveries, depots)
+        self.assertTrue(result['success'])
+        self.assertEqual(result['total_deliveries'], 90)
+        self.assertEqual(result['total_postmen'], 4)
+        self.assertEqual([depot['depot_id'] for depot in result['depots']], ['PO1', 'PO2'])
+        for depot in result['depots']:
+            for route in depot['routes']:
+                self.assertTrue(route['postman_id'].startswith(depot['depot_id'] + '-'))
+                self.assertEqual((route['route'][0]['latitude'], route['route'][0]['longitude']),
+                                 (depot['depot_latitude'], depot['depot_longitude']))
+        
+        client = route_optimization.app.test_client()
+        response = client.post('/optimize-routes', json={'deliveries': deliveries, 'depots': depots, 'use_cache': False})
+        self.assertEqual(response.get_json()['total_distance_km'], result['total_distance_km'])
+        response = client.post('/optimize-routes', json={'deliveries': deliveries, 'depots': [{'latitude': 17.4}]})
+        self.assertEqual(response.status_code, 400)
+    
+    def test_time_window_routing(self):
+        """Test one-pass shift planning keeps every stop inside its time slot"""
+        import route_optimization
+        rng = np.random.default_rng(44)
+        deliveries = [
+            {'order_id': f'ORD{i}', 'latitude': lat, 'longitude': lng,
+             'address_type': int(i % 5), 'time_slot': int(3 - i % 3)}
+            for i, (lat, lng) in enumerate(zip(rng.normal(17.485, 0.003, 12), rng.normal(78.500, 0.003, 12)))
+        ]
+        
+        result = self.optimizer.optimize_time_windows(deliveries, 1, (17.480, 78.495),
+                                                      {'time_windows': 'hard', 'compare_baseline': True})
+        self.assertTrue(result['success'])
+        self.assertEqual(result['total_deliveries'], 12)
+        self.assertEqual(result['time_windows']['late_stops'], 0)
+        self.assertIn('solve_time_ms', result['baseline'])
+        self.assertIn('distance_saved_km', result['baseline'])
+        
+        stops = result['routes'][0]['route'][1:]
+        self.assertEqual(sorted(stop['order_id'] for stop in stops), sorted(d['order_id'] for d in deliveries))
+        self.assertEqual([stop['eta'] for stop in stops], sorted(stop['eta'] for stop in stops))
+        for stop in stops:
+            opens, closes = stop['window'].split('-')
+            self.assertTrue(opens <= stop['eta'] <= closes)
+        
+        client = route_optimization.app.test_client()
+        response = client.post('/optimize-routes', json={'deliveries': deliveries, 'time_windows': 'soft',
+                                                         'use_cache': False})
+        self.assertEqual(response.get_json()['total_deliveries'], 12)
+        self.assertNotIn('baseline', response.get_json())
+        response = client.post('/optimize-routes', json={'deliveries': deliveries, 'time_windows': 'strict'})
+        self.assertEqual(response.status_code, 400)
+    
+    def test_multi_start(self):
+        """Test multi-start keeps the shortest of several seeded starts"""
+        from unittest import mock
+        import route_optimization
+        rng = np.random.default_rng(47)
+        deliveries = [
+            {'order_id': f'ORD{i}', 'latitude': lat, 'longitude': lng, 'address_type': 0}
+            for i, (lat, lng) in enumerate(zip(rng.uniform(17.45, 17.51, 40), rng.uniform(78.47, 78.53, 40)))
+        ]
+        options = {'improvement': 'local_search', 'time_budget_ms': None, 'multi_start': 6, 'seed': 3}
+        
+        result = self.optimizer.optimize_postman_routes(deliveries, 1, (17.48, 78.50), options)
+        stats = result['routes'][0]['multi_start']
+        self.assertEqual(stats['seeds'], [3, 4, 5, 6, 7, 8])
+        self.assertEqual(stats['best_km'], min(stats['lengths_km']))
+        self.assertLessEqual(stats['best_km'], stats['first_start_km'])
+        self.assertAlmostEqual(result['total_distance_km'], stats['best_km'], places=1)
+        self.assertGreaterEqual(result['multi_start']['distance_saved_km'], 0)
+        
+        # A single cluster spreads its starts over the pool and finds the same tours
+        with mock.patch.object(route_optimization, 'MAX_ROUTE_WORKERS', 2):
+            parallel = self.optimizer.optimize_postman_routes(
+                deliveries, 1, (17.48, 78.50), dict(options, execution_mode='process')
+            )
+        self.assertEqual(parallel['execution']['mode'], 'process')
+        self.assertEqual(parallel['routes'][0]['multi_start']['lengths_km'], stats['lengths_km'])
+        self.assertEqual(parallel['total_distance_km'], result['total_distance_km'])
+    
+    def test_deadline_returns_best_so_far(self):
+        """Test a request deadline cuts the search off with a complete plan"""
+        import time
+        import route_optimization
+        rng = np.random.default_rng(45)
+        deliveries = [
+            {'order_id': f'ORD{i}', 'latitude': lat, 'longitude': lng, 'address_type': 0}
+            for i, (lat, lng) in enumerate(zip(rng.uniform(17.45, 17.51, 300), rng.uniform(78.47, 78.53, 300)))
+        ]
+        
+        # Full 2-opt on 300 stops takes seconds; the deadline stops it between moves
+        started = time.perf_counter()
+        result = self.optimizer.optimize_postman_routes(
+            deliveries, options={'deadline_ms': 50, 'deadline_at': time.time() + 0.05}
+        )
+        # Generous margin for loaded runners; the flags below are the real check
+        self.assertLess(time.perf_counter() - started, 30.0)
+        self.assertTrue(result['success'])
+        self.assertEqual(len(result['routes'][0]['route']), 301)
+        self.assertTrue(result['deadline']['cut_off'])
+        self.assertFalse(result['deadline']['converged'])
+        self.assertTrue(result['routes'][0]['improvement']['cut_off'])
+        
+        # Cut-off plans are not cached
+        client = route_optimization.app.test_client()
+        request = {'deliveries': deliveries, 'deadline_ms': 50}
+        self.assertEqual(client.post('/optimize-routes', json=request).headers['X-Route-Cache'], 'MISS')
+        self.assertEqual(client.post('/optimize-routes', json=request).headers['X-Route-Cache'], 'MISS')
+        
+        result = self.optimizer.optimize_postman_routes(deliveries[:30], options={
+            'improvement': 'local_search', 'deadline_ms': 5000, 'deadline_at': time.time() + 5
+        })
+        self.assertTrue(result['deadline']['converged'])
+        self.assertEqual(result['deadline']['routes_cut_off'], 0)
+    
+    def test_batch_eta(self):
+        """Test batch ETAs match the per-route arrival times"""
+        import route_optimization
+        from route_optimization import arrival_minutes, clock_minutes, DELIVERY_TIME_MINUTES
+        plan = self.optimizer.optimize_postman_routes(self.test_deliveries, num_postmen=2)
+        routes = plan['routes'] + [{'postman_id': 'P9', 'start_time': '12:30', 'route': []}]
+        
+        result = self.optimizer.batch_eta(routes, start_time='09:00')
+        self.assertEqual(result['total_routes'], 3)
+        self.assertEqual(result['total_stops'], sum(len(route['route']) for route in plan['routes']))
+        for route, eta_route in zip(plan['routes'], result['routes']):
+            stops = route['route']
+            arrivals, legs = arrival_minutes(
+                [(stop['latitude'], stop['longitude']) for stop in stops],
+                [0 if stop.get('type') == 'depot' else DELIVERY_TIME_MINUTES[stop['address_type']] for stop in stops[1:]]
+            )
+            etas = [clock_minutes(stop['eta']) - clock_minutes('09:00') for stop in eta_route['route_with_eta'][1:]]
+            np.testing.assert_allclose(etas, np.round(arrivals), atol=1)
+            self.assertAlmostEqual(eta_route['total_distance_km'], sum(legs), places=1)
+            self.assertEqual(eta_route['route_with_eta'][0]['eta'], '09:00')
+        self.assertEqual(result['routes'][2]['end_time'], '12:30')
+        
+        client = route_optimization.app.test_client()
+        response = client.post('/calculate-eta-batch', json={'routes': plan['routes']})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['routes'][0]['start_time'], '10:00')
+        self.assertEqual(client.post('/calculate-eta-batch', json={'routes': [[{'order_id': 1}]]}).status_code, 400)
+    
+    def test_solver_registry(self):
+        """Test solvers are selected per request and report stage timings"""
+        import route_optimization
+        from route_optimization import route_options_from_request
+        from solver_registry import SolverRegistry, solver_registry
+        deliveries = [
+            {'order_id': i, 'latitude': 17.38 + (i % 5) / 100, 'longitude': 78.48 + (i // 5) / 100,
+             'address_type': 'Residential'}
+            for i in range(20)
+        ]
+        
+        default = self.optimizer.optimize_postman_routes(deliveries, num_postmen=2)
+        stock = self.optimizer.optimize_postman_routes(deliveries, num_postmen=2, options={
+            'construction': 'nearest_neighbor', 'improvement': 'two_opt', 'clustering': 'kmeans'
+        })
+        self.assertEqual(default['total_distance_km'], stock['total_distance_km'])
+        self.assertEqual(default['solver']['name'], 'default')
+        self.assertEqual(set(default['solver']['stage_times_ms']),
+                         {'clustering', 'distance_matrix', 'construction', 'improvement'})
+        self.assertIn('stage_times_ms', default['routes'][0])
+        
+        options = route_options_from_request({'solver': 'quality', 'improvement': 'two_opt'})
+        self.assertEqual((options['clustering'], options['construction'], options['improvement']),
+                         ('balanced', 'greedy_edge', 'two_opt'))
+        with self.assertRaises(ValueError):
+            route_options_from_request({'solver': 'missing'})
+        
+        # Custom stages plug in without touching RouteOptimizer
+        registry = SolverRegistry()
+        with self.assertRaises(ValueError):
+            registry.register_solver('partial', construction='nearest_neighbor')
+        calls = []
+        
+        @solver_registry.register('construction', 'test_reverse')
+        def reverse_route(optimizer, locations, distance_matrix, start_idx, options):
+            calls.append(len(locations))
+            return [start_idx] + [i for i in reversed(range(len(locations))) if i != start_idx]
+        
+        try:
+            result = self.optimizer.optimize_postman_routes(deliveries, options={
+                'construction': 'test_reverse', 'improvement': 'neighbor_two_opt'
+            })
+            self.assertEqual(calls, [21])
+            self.assertEqual(result['total_deliveries'], 20)
+        finally:
+            del solver_registry.stages['construction']['test_reverse']
+            del solver_registry.descriptions['construction']['test_reverse']
+        
+        # Bad environment settings fall back instead of failing every request
+        self.assertEqual(route_optimization.configured_solvers(solver_registry, 'missing', '{"PO1": "quality"'),
+                         ('default', {}))
+        self.assertEqual(route_optimization.configured_solvers(solver_registry, 'fast', '{"PO1": "quality", "PO2": "nope"}'),
+                         ('fast', {'PO1': 'quality'}))
+        
+        client = route_optimization.app.test_client()
+        listing = client.get('/solvers').get_json()
+        self.assertTrue({'default', 'fast', 'quality'} <= set(listing['solvers']))
+        self.assertIn('local_search', listing['stages']['improvement'])
+        response = client.post('/optimize-routes', json={'deliveries': deliveries, 'solver': 'fast'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['solver']['stages']['construction'], 'hilbert')
+        self.assertEqual(client.post('/optimize-routes', json={'deliveries': deliveries, 'solver': 'missing'}).status_code, 400)
+    
     def test_route_optimization(self):
         """Test complete route optimization"""
         result = self.optimizer.optimize_postman_routes(self.test_deliveries)
@@ -172,6 +729,544 @@ class TestRouteOptimization(unittest.TestCase):
         result_multi = self.optimizer.optimize_postman_routes(self.test_deliveries, num_postmen=2)
         self.assertEqual(result_multi['total_postmen'], 2)
 
+class TestDistanceStore(unittest.TestCase):
+    """Test cases for the persistent distance store"""
+    
+    def setUp(self):
+        """Set up a store in a temporary directory"""
+        import tempfile
+        from distance_store import DistanceStore
+        self.store_dir = tempfile.mkdtemp()
+        self.store = DistanceStore(self.store_dir, capacity=8, min_locations=0, max_locations=8)
+        self.optimizer = RouteOptimizer(distance_store=self.store)
+        self.deliveries = [
+            {'customer_id': f'CUST{100 + i}', 'latitude': 17.4 + i / 100, 'longitude': 78.4 + i / 200}
+            for i in range(5)
+        ]
+    
+    def tearDown(self):
+        """Remove the temporary store"""
+        import shutil
+        self.store.close()
+        shutil.rmtree(self.store_dir, ignore_errors=True)
+    
+    def test_cached_matrix_hits_and_persistence(self):
+        """Test repeated requests are served from the store, also after reopening it"""
+        from distance_store import DistanceStore
+        depot = (17.45, 78.45)
+        first = self.optimizer.cached_distance_matrix(self.deliveries, depot)
+        locations = [depot] + [(d['latitude'], d['longitude']) for d in self.deliveries]
+        np.testing.assert_allclose(first, self.optimizer.calculate_distance_matrix(locations), atol=1e-9)
+        self.assertEqual(self.store.get_stats()['hits'], 0)
+        
+        # A second store on the same directory must not share its slots
+        other = DistanceStore(self.store_dir, capacity=8, min_locations=0, max_locations=8)
+        moved = [dict(d, latitude=d['latitude'] + 0.05) for d in self.deliveries]
+        expected = self.optimizer.calculate_distance_matrix(
+            [depot] + [(d['latitude'], d['longitude']) for d in moved])
+        np.testing.assert_allclose(RouteOptimizer(distance_store=other).cached_distance_matrix(moved, depot),
+                                   expected, atol=1e-9)
+        self.assertTrue(other.get_stats()['in_use_by_other_process'])
+        np.testing.assert_array_equal(self.optimizer.cached_distance_matrix(self.deliveries, depot), first)
+        other.close()
+        self.store.close()
+        
+        reopened = RouteOptimizer(distance_store=DistanceStore(self.store_dir, capacity=8, min_locations=0, max_locations=8))
+        second = reopened.cached_distance_matrix(self.deliveries[::-1], depot)
+        np.testing.assert_array_equal(second[1:, 1:], first[1:, 1:][::-1, ::-1])
+        stats = reopened.distance_store.get_stats()
+        self.assertEqual(stats['misses'], 0)
+        self.assertEqual(stats['hit_rate'], 1.0)
+        reopened.distance_store.close()
+    
+    def test_lru_eviction(self):
+        """Test cold locations are evicted once the store is full"""
+        self.optimizer.cached_distance_matrix(self.deliveries, (17.45, 78.45))
+        newcomers = [
+            {'customer_id': f'CUST{200 + i}', 'latitude': 17.3 + i / 100, 'longitude': 78.3}
+            for i in range(4)
+        ]
+        self.optimizer.cached_distance_matrix(newcomers, (17.45, 78.45))
+        
+        stats = self.store.get_stats()
+        self.assertEqual(stats['locations'], 8)
+        self.assertEqual(stats['evictions'], 2)
+        self.assertIn('cust:CUST200', self.store.slots)
+        self.assertIn('geo:17.45000,78.45000', self.store.slots)
+    
+    def test_typical_cluster_is_faster_than_computing(self):
+        """Test a warm store beats computing a full postman cluster and other sizes bypass it"""
+        import time
+        from distance_store import DistanceStore, INDEX_FILE
+        from route_optimization import MAX_DELIVERIES_PER_POSTMAN
+        store = DistanceStore(os.path.join(self.store_dir, 'typical'))
+        optimizer, direct = RouteOptimizer(distance_store=store), RouteOptimizer()
+        rng = np.random.default_rng(3)
+        depot = (17.45, 78.45)
+        cluster = [{'customer_id': f'CUST{300 + i}', 'latitude': 17.4 + rng.random() / 10,
+                    'longitude': 78.4 + rng.random() / 10} for i in range(MAX_DELIVERIES_PER_POSTMAN)]
+        locations = [depot] + [(d['latitude'], d['longitude']) for d in cluster]
+        
+        # New locations reach the saved index with the next checkpoint, not with every request
+        expected = optimizer.cached_distance_matrix(cluster, depot)
+        with open(os.path.join(store.directory, INDEX_FILE)) as f:
+            self.assertEqual(json.load(f)['slots'], {})
+        store.checkpoint()
+        with open(os.path.join(store.directory, INDEX_FILE)) as f:
+            self.assertEqual(len(json.load(f)['slots']), len(locations))
+        
+        cached_times, direct_times = [], []
+        for _ in range(15):
+            started = time.perf_counter()
+            for _ in range(20):
+                cached = optimizer.cached_distance_matrix(cluster, depot)
+            cached_times.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            for _ in range(20):
+                computed = direct.calculate_distance_matrix([depot] + [(d['latitude'], d['longitude']) for d in cluster])
+            direct_times.append(time.perf_counter() - started)
+        np.testing.assert_allclose(cached, computed, atol=1e-9)
+        np.testing.assert_array_equal(cached, expected)
+        self.assertLess(min(cached_times), min(direct_times))
+        self.assertEqual(store.get_stats()['misses'], len(locations) * (len(locations) - 1))
+        
+        # A lone depot and routes past the gather's sweet spot are computed directly
+        self.assertFalse(store.uses_store(1))
+        self.assertFalse(store.uses_store(store.max_locations + 1))
+        large = [{'customer_id': f'CUST{400 + i}', 'latitude': 17.4 + i / 1000, 'longitude': 78.4}
+                 for i in range(store.max_locations)]
+        optimizer.cached_distance_matrix(large, depot)
+        stats = store.get_stats()
+        self.assertEqual(stats['bypassed_requests'], 1)
+        self.assertEqual(stats['locations'], len(locations))
+        store.close()
+
+class TestTerritoryIndex(unittest.TestCase):
+    """Test cases for postman territory assignment"""
+    
+    def setUp(self):
+        """Build territories from a small dataset with two postmen"""
+        import tempfile
+        from territory_index import TerritoryIndex
+        self.work_dir = tempfile.mkdtemp()
+        dataset_path = os.path.join(self.work_dir, 'Dataset.csv')
+        rows = []
+        for i in range(20):
+            postman_id, latitude = ('POST001', 17.40 + i / 1000) if i % 2 else ('POST002', 17.50 + i / 1000)
+            rows.append({
+                'Order ID': f'ORD{1000+i}',
+                'Postman ID': postman_id,
+                'Delivery Address (Lat, Long)': f'{latitude}, 78.45'
+            })
+        pd.DataFrame(rows).to_csv(dataset_path, index=False)
+        self.index = TerritoryIndex.from_dataset(dataset_path, daily_capacity=3)
+    
+    def tearDown(self):
+        """Remove the temporary dataset"""
+        import shutil
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+    
+    def test_owner_lookup(self):
+        """Test known cells map to their postman and unseen locations to the nearest one"""
+        from territory_index import TerritoryIndex
+        self.assertEqual(self.index.owner(17.401, 78.45), ('POST001', 'territory'))
+        self.assertEqual(self.index.owner(17.49, 78.45), ('POST002', 'nearest'))
+        
+        path = os.path.join(self.work_dir, 'territories.json')
+        self.index.save(path)
+        self.assertEqual(TerritoryIndex.load(path).owner(17.401, 78.45), ('POST001', 'territory'))
+    
+    def test_daily_load_overflow(self):
+        """Test orders overflow to a neighboring postman once the owner is full for the day"""
+        assignments = [self.index.assign(17.401, 78.45, '2024-12-18') for _ in range(4)]
+        self.assertEqual([a['postman_id'] for a in assignments], ['POST001'] * 3 + ['POST002'])
+        self.assertEqual(assignments[-1]['method'], 'overflow')
+        self.assertEqual(self.index.assign(17.401, 78.45, '2024-12-19')['postman_id'], 'POST001')
+        self.assertEqual(self.index.get_loads('2024-12-18'), {'POST001': 3, 'POST002': 1})
+        
+        # Once everybody is full the owner takes the order, flagged as over capacity
+        assignments = [self.index.assign(17.401, 78.45, '2024-12-18') for _ in range(3)]
+        self.assertEqual([a['method'] for a in assignments], ['overflow', 'overflow', 'territory_over_capacity'])
+        self.assertEqual(assignments[-1]['postman_id'], 'POST001')
+        self.assertEqual(assignments[-1]['load'], 4)
+
+class TestRoadNetwork(unittest.TestCase):
+    """Test cases for the road network distance backend"""
+    
+    def setUp(self):
+        """Load the bundled fixture: a 6 x 6 street grid split by a river with one bridge"""
+        import road_network
+        self.road_network = road_network
+        self.previous = road_network.get_road_network()
+        self.fixture = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'road_network_fixture.graphml')
+        self.network = road_network.RoadNetwork.from_graphml(self.fixture, landmarks_path='')
+        road_network.set_road_network(self.network)
+        # West bank, east bank and a stop next to the bridge
+        self.locations = [(17.4701, 78.4801), (17.4701, 78.4961), (17.4851, 78.4931)]
+    
+    def tearDown(self):
+        """Restore the shared network"""
+        self.road_network.set_road_network(self.previous)
+    
+    def test_matrix_follows_roads(self):
+        """Test road distances detour over the bridge and rows are reused"""
+        from route_optimization import haversine_matrix
+        self.assertEqual(self.network.get_stats()['connected_nodes'], 36)
+        
+        matrix = self.network.distance_matrix(self.locations)
+        direct = haversine_matrix(self.locations)
+        self.assertEqual(matrix.shape, (3, 3))
+        np.testing.assert_allclose(matrix, matrix.T)
+        self.assertTrue(np.all(matrix >= direct - 1e-6))
+        # Crossing the river near the bottom means riding up to the bridge and back
+        self.assertGreater(matrix[0, 1], 2.5 * direct[0, 1])
+        
+        minutes = self.network.travel_time_matrix(self.locations, speed_km_per_hour=12)
+        self.assertAlmostEqual(minutes[0, 1], self.network.matrix(self.locations)[0, 1] / 12 * 60, places=3)
+        self.assertGreater(self.network.get_stats()['hits'], 0)
+        
+        # A long way round inside the stops' area loses to a short cut leaving it
+        nodes = [(17.0, 78.0), (17.0, 78.01), (17.2, 78.005)] + [(17.5, 78.5 + i / 1000) for i in range(3)]
+        edges = [(0, 1, 10.0, 20), (0, 2, 1.0, 20), (2, 1, 1.0, 20), (2, 3, 30.0, 20), (3, 4, 0.1, 20),
+                 (4, 5, 0.1, 20), (5, 2, 30.0, 20)]
+        edges += [(target, source, length, speed) for source, target, length, speed in edges]
+        shortcut = self.road_network.RoadNetwork(range(len(nodes)), nodes, edges)
+        self.assertAlmostEqual(shortcut.distance_matrix(nodes[:2])[0, 1], 2.0, places=5)
+    
+    def test_region_search_is_exact(self):
+        """Test region searches match whole-network Dijkstra and landmarks are saved next to the extract"""
+        import shutil
+        import tempfile
+        from scipy.sparse.csgraph import dijkstra
+        
+        # A street grid with one-way streets, uneven block lengths and a few fast roads across town
+        rng = np.random.default_rng(7)
+        side = 30
+        nodes = [(17.40 + i * 0.002, 78.40 + j * 0.002) for i in range(side) for j in range(side)]
+        edges = []
+        for i in range(side):
+            for j in range(side):
+                for a, b in ((i, j + 1), (i + 1, j)):
+                    if a < side and b < side:
+                        edge = (i * side + j, a * side + b, 0.22 * rng.uniform(0.9, 1.5), float(rng.choice([15, 30])))
+                        one_way = rng.random()
+                        if one_way >= 0.1:
+                            edges.append(edge)
+                        if one_way < 0.1 or one_way >= 0.2:
+                            edges.append((edge[1], edge[0]) + edge[2:])
+        for a, b in rng.integers(0, side * side, (10, 2)):
+            edges += [(a, b, 0.5, 80.0), (b, a, 0.5, 80.0)]
+        network = self.road_network.RoadNetwork(range(len(nodes)), nodes, edges)
+        
+        for _ in range(5):
+            locations = np.array(nodes[rng.integers(len(nodes))]) + rng.normal(0, 0.004, (12, 2))
+            km, minutes = network.matrices(locations)
+            snapped, access = network.snap(locations)
+            expected, predecessors = dijkstra(network.graph, indices=snapped, return_predecessors=True)
+            expected = expected[:, snapped] + access[:, None] + access[None, :]
+            np.fill_diagonal(expected, 0)
+            np.testing.assert_allclose(km, expected, atol=1e-9)
+            
+            # Minutes are summed along the same path
+            path_minutes, node = 0.0, snapped[1]
+            while node != snapped[0]:
+                path_minutes += network.minutes[predecessors[0, node], node]
+                node = predecessors[0, node]
+            if snapped[0] != snapped[1]:
+                self.assertAlmostEqual(minutes[0, 1], path_minutes + (access[0] + access[1]) * 60 / 25, places=6)
+        self.assertGreater(network.get_stats()['region_searches'], 0)
+        
+        directory = tempfile.mkdtemp()
+        try:
+            extract = os.path.join(directory, 'roads.graphml')
+            shutil.copy(self.fixture, extract)
+            first = self.road_network.RoadNetwork.from_graphml(extract)
+            saved = extract + self.road_network.LANDMARKS_SUFFIX
+            self.assertTrue(os.path.exists(saved))
+            modified = os.path.getmtime(saved)
+            second = self.road_network.RoadNetwork.from_graphml(extract)
+            np.testing.assert_array_equal(first.landmarks, second.landmarks)
+            np.testing.assert_array_equal(first.to_landmarks, second.to_landmarks)
+            self.assertEqual(os.path.getmtime(saved), modified)
+        finally:
+            shutil.rmtree(directory)
+    
+    def test_road_backend_routes(self):
+        """Test optimize-routes plans on road distances when asked"""
+        import route_optimization
+        deliveries = [
+            {'order_id': f'ORD{i}', 'latitude': lat, 'longitude': lng, 'address_type': 0}
+            for i, (lat, lng) in enumerate(self.locations + [(17.4791, 78.4861), (17.4821, 78.4901)])
+        ]
+        client = route_optimization.app.test_client()
+        road = client.post('/optimize-routes', json={
+            'deliveries': deliveries, 'depot_latitude': 17.47, 'depot_longitude': 78.48,
+            'distance_backend': 'road', 'use_cache': False
+        }).get_json()
+        direct = client.post('/optimize-routes', json={
+            'deliveries': deliveries, 'depot_latitude': 17.47, 'depot_longitude': 78.48, 'use_cache': False
+        }).get_json()
+        self.assertTrue(road['success'])
+        self.assertGreater(road['total_distance_km'], direct['total_distance_km'])
+        
+        # Travel times follow the road speeds of the extract
+        optimizer = route_optimization.RouteOptimizer()
+        minutes = self.network.travel_time_matrix(self.locations)
+        details = optimizer.estimate_delivery_time([0, 2, 1], [], self.network.distance_matrix(self.locations),
+                                                   travel_minutes=minutes)
+        self.assertAlmostEqual(details['travel_time_hours'], round((minutes[0, 2] + minutes[2, 1]) / 60, 2))
+        statistics = road['routes'][0]['statistics']
+        self.assertNotAlmostEqual(statistics['travel_time_hours'],
+                                  statistics['total_distance_km'] / route_optimization.POSTMAN_SPEED_KM_PER_HOUR, places=2)
+        
+        self.road_network.set_road_network(None)
+        response = client.post('/optimize-routes', json={'deliveries': deliveries, 'distance_backend': 'road'})
+        self.assertEqual(response.status_code, 400)
+    
+    def test_time_windows_on_roads(self):
+        """Test shift planning with time windows times its arrivals with road minutes"""
+        import route_optimization
+        from datetime import datetime
+        deliveries = [
+            {'order_id': f'ORD{i}', 'latitude': lat, 'longitude': lng, 'address_type': 0, 'time_slot': 1 + i % 2}
+            for i, (lat, lng) in enumerate(self.locations + [(17.4791, 78.4861), (17.4821, 78.4901)])
+        ]
+        depot = (17.47, 78.48)
+        result = RouteOptimizer().optimize_time_windows(deliveries, 1, depot,
+                                                        {'time_windows': 'soft', 'distance_backend': 'road'})
+        self.assertTrue(result['success'])
+        route = result['routes'][0]
+        stops = route['route'][1:]
+        self.assertEqual(len(stops), len(deliveries))
+        
+        # Every leg takes the road minutes of the extract, not the postman's flat speed
+        points = [depot] + [(stop['latitude'], stop['longitude']) for stop in stops]
+        minutes = self.network.route_matrices(points)[1]
+        legs = [minutes[i, i + 1] for i in range(len(stops))]
+        clock = lambda value: datetime.strptime(value, '%H:%M')
+        first_eta = (clock(stops[0]['eta']) - clock(route['statistics']['start_time'])).seconds / 60
+        self.assertAlmostEqual(first_eta, legs[0] + stops[0]['wait_minutes'], delta=0.6)
+        statistics = route['statistics']
+        self.assertAlmostEqual(statistics['travel_time_hours'], sum(legs) / 60, places=2)
+        self.assertNotAlmostEqual(statistics['travel_time_hours'],
+                                  statistics['total_distance_km'] / route_optimization.POSTMAN_SPEED_KM_PER_HOUR, places=2)
+
+class TestSpeedTables(unittest.TestCase):
+    """Test cases for traffic- and weather-aware speed tables"""
+    
+    def setUp(self):
+        """Fit a table from the dataset"""
+        if not os.path.exists('Dataset.csv'):
+            self.skipTest("Dataset.csv not found, skipping test")
+        from speed_tables import SpeedTable
+        self.table = SpeedTable.from_dataset('Dataset.csv')
+        self.locations = np.array([(17.4864, 78.5004), (17.4068, 78.4418), (12.97, 77.59)])
+    
+    def test_lookup_and_persistence(self):
+        """Test multipliers follow conditions, unseen cells use the city value and the table round-trips"""
+        import tempfile
+        from speed_tables import SpeedTable
+        self.assertAlmostEqual(float(self.table.multipliers[0, 0, 0, -1]), 1.0, places=5)
+        heavy = self.table.location_multipliers(self.locations, time_slot=1, traffic=3, weather=3)
+        light = self.table.location_multipliers(self.locations, time_slot=1, traffic=1, weather=1)
+        self.assertTrue(np.all(heavy < light))
+        unknown = self.table.location_multipliers(self.locations, time_slot=2)
+        self.assertAlmostEqual(unknown[2], float(self.table.multipliers[2, 0, 0, -1]), places=5)
+        
+        path = os.path.join(tempfile.mkdtemp(), 'speed_table.npz')
+        self.table.save(path)
+        np.testing.assert_allclose(SpeedTable.load(path).location_multipliers(self.locations, 1),
+                                   self.table.location_multipliers(self.locations, 1))
+    
+    def test_traffic_aware_times(self):
+        """Test heavy traffic lengthens route travel times and batch ETAs but not distances"""
+        optimizer = RouteOptimizer()
+        deliveries = [
+            {'order_id': f'ORD{i}', 'latitude': 17.48 + i / 300, 'longitude': 78.49 + i / 400,
+             'address_type': 1, 'time_slot': 2}
+            for i in range(8)
+        ]
+        plain = optimizer.optimize_postman_routes(deliveries)
+        heavy = optimizer.optimize_postman_routes(deliveries, options={'traffic_aware': True, 'traffic': 3, 'weather': 3})
+        light = optimizer.optimize_postman_routes(deliveries, options={'traffic_aware': True, 'traffic': 1, 'weather': 1})
+        self.assertEqual(heavy['total_distance_km'], plain['total_distance_km'])
+        stats = [result['routes'][0]['statistics'] for result in (light, plain, heavy)]
+        self.assertLess(stats[0]['travel_time_hours'], stats[1]['travel_time_hours'])
+        self.assertLess(stats[1]['travel_time_hours'], stats[2]['travel_time_hours'])
+        self.assertLess(stats[2]['speed_multiplier'], 1.0)
+        
+        routes = plain['routes']
+        base = optimizer.batch_eta(routes)['routes'][0]['end_time']
+        slow = optimizer.batch_eta(routes, conditions={'traffic_aware': True, 'traffic': 3})['routes'][0]['end_time']
+        self.assertGreater(slow, base)
+
+class TestRouteJobs(unittest.TestCase):
+    """Test cases for background route optimization jobs"""
+    
+    def wait_for(self, queue, job_id, timeout=10):
+        """Poll a job until it finishes"""
+        import time
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            job = queue.get(job_id)
+            if job.status in ('succeeded', 'failed', 'cancelled'):
+                return job
+            time.sleep(0.01)
+        self.fail(f"Job {job_id} did not finish")
+    
+    def test_submit_poll_result(self):
+        """Test a job reports progress and returns the same plan as the synchronous endpoint"""
+        import route_optimization
+        rng = np.random.default_rng(46)
+        deliveries = [
+            {'order_id': f'ORD{i}', 'latitude': lat, 'longitude': lng, 'address_type': 0}
+            for i, (lat, lng) in enumerate(zip(rng.uniform(17.45, 17.51, 60), rng.uniform(78.47, 78.53, 60)))
+        ]
+        request = {'deliveries': deliveries, 'num_postmen': 3, 'execution_mode': 'serial'}
+        client = route_optimization.app.test_client()
+        
+        response = client.post('/jobs', json=request)
+        self.assertEqual(response.status_code, 202)
+        job_id = response.get_json()['job_id']
+        self.wait_for(route_optimization.route_job_queue, job_id)
+        
+        status = client.get(f'/jobs/{job_id}').get_json()
+        self.assertEqual(status['status'], 'succeeded')
+        self.assertEqual(status['progress']['routes_done'], 3)
+        self.assertEqual(status['progress']['routes_total'], 3)
+        
+        result = client.get(f'/jobs/{job_id}/result').get_json()
+        sync = client.post('/optimize-routes', json=dict(request, use_cache=False)).get_json()
+        self.assertEqual(result['total_distance_km'], sync['total_distance_km'])
+        self.assertAlmostEqual(status['progress']['distance_km'], result['total_distance_km'], places=1)
+        
+        self.assertEqual(client.get('/jobs/unknown').status_code, 404)
+        self.assertEqual(client.post('/jobs', json={'deliveries': deliveries, 'clustering': 'spectral'}).status_code, 400)
+    
+    def test_cancel_and_expiry(self):
+        """Test queued and running jobs can be cancelled and finished jobs expire"""
+        import threading
+        from route_jobs import RouteJobQueue
+        queue = RouteJobQueue(max_workers=1, ttl_seconds=60)
+        started = threading.Event()
+        
+        def slow_plan(progress=None):
+            started.set()
+            for done in range(1, 1001):
+                threading.Event().wait(0.01)
+                progress(done, 1000, {'statistics': {'total_distance_km': 1.0}})
+            return {'success': True}
+        
+        running = queue.submit(slow_plan)
+        queued = queue.submit(slow_plan)
+        started.wait(5)
+        self.assertEqual(queue.cancel(queued.job_id).status, 'cancelled')
+        queue.cancel(running.job_id)
+        self.assertEqual(self.wait_for(queue, running.job_id).status, 'cancelled')
+        self.assertLess(running.progress['routes_done'], 1000)
+        
+        queue.ttl_seconds = 0
+        self.assertIsNone(queue.get(running.job_id))
+        self.assertEqual(queue.get_stats()['expired'], 2)
+
+class TestEtaSessions(unittest.TestCase):
+    """Test cases for live ETA sessions"""
+    
+    def setUp(self):
+        """Set up a route with a depot and four stops"""
+        import route_optimization
+        self.client = route_optimization.app.test_client()
+        self.route = [{'type': 'depot', 'latitude': 17.48, 'longitude': 78.49}] + [
+            {'order_id': f'ORD{i}', 'latitude': 17.48 + i / 200, 'longitude': 78.49 + i / 300, 'address_type': i % 2}
+            for i in range(1, 5)
+        ]
+    
+    def test_events_recompute_remaining_stops(self):
+        """Test a completed stop shifts only the remaining ETAs and matches a full recalculation"""
+        response = self.client.post('/eta-sessions', json={'route': self.route, 'start_time': '10:00'})
+        self.assertEqual(response.status_code, 201)
+        session = response.get_json()
+        self.assertEqual(session['remaining_stops'], 5)
+        
+        # Postman finishes ORD2 at 10:40, skipping ORD1
+        update = self.client.post(f"/eta-sessions/{session['session_id']}/events",
+                                  json={'stop_id': 'ORD2', 'completed_at': '10:40'}).get_json()
+        self.assertEqual(update['version'], 1)
+        self.assertEqual(update['skipped_stops'], 2)
+        self.assertEqual([eta['stop_id'] for eta in update['etas']], ['ORD3', 'ORD4'])
+        
+        # Same ETAs as the batch engine for the rest of the route leaving ORD2 at 10:40
+        batch = self.client.post('/calculate-eta-batch', json={
+            'routes': [{'start_time': '10:40', 'route': [dict(self.route[2], type='depot')] + self.route[3:]}]
+        }).get_json()
+        self.assertEqual([eta['eta'] for eta in update['etas']],
+                         [stop['eta'] for stop in batch['routes'][0]['route_with_eta'][1:]])
+        
+        self.assertEqual(self.client.post(f"/eta-sessions/{session['session_id']}/events",
+                                          json={'stop_id': 'ORD1', 'completed_at': '10:45'}).status_code, 400)
+        self.assertEqual(self.client.get('/eta-sessions/unknown').status_code, 404)
+    
+    def test_stream_pushes_updates(self):
+        """Test subscribers receive a snapshot, every update and the end of the route"""
+        import threading
+        import route_optimization
+        session = route_optimization.eta_session_from_request({'route': self.route})
+        events = []
+        stream = session.stream(heartbeat_seconds=0.05)
+        events.append(next(stream))
+        reader = threading.Thread(target=lambda: events.extend(stream))
+        reader.start()
+        
+        for position, completed_at in ((1, '10:20'), (3, '10:50'), (4, '11:05')):
+            route_optimization.eta_session_store.complete_stop(session.session_id, position,
+                                                              route_optimization.clock_minutes(completed_at))
+        reader.join(5)
+        self.assertFalse(reader.is_alive())
+        
+        payloads = [json.loads(event.split('data: ', 1)[1]) for event in events if event.startswith('event:')]
+        self.assertTrue(events[0].startswith('event: snapshot'))
+        self.assertEqual([payload['version'] for payload in payloads], [0, 1, 2, 3])
+        self.assertEqual(payloads[-1]['status'], 'finished')
+        self.assertEqual(len(session.subscribers), 0)
+        
+        self.assertEqual(self.client.delete(f'/eta-sessions/{session.session_id}').status_code, 200)
+        self.assertEqual(self.client.get(f'/eta-sessions/{session.session_id}/stream').status_code, 404)
+        
+        # Streams are not capped; each one gets every update
+        session = route_optimization.eta_session_from_request({'route': self.route})
+        url = f'/eta-sessions/{session.session_id}/stream'
+        streams = [self.client.get(url, buffered=False) for _ in range(8)]
+        self.assertEqual([response.status_code for response in streams], [200] * 8)
+        self.assertEqual(route_optimization.eta_session_store.get_stats()['subscribers'], 8)
+        for response in streams:
+            response.close()
+        route_optimization.eta_session_store.delete(session.session_id)
+    
+    def test_long_poll_waits_for_next_version(self):
+        """Test /updates returns at once when behind, wakes on an event and times out with the same version"""
+        import threading
+        import route_optimization
+        session = route_optimization.eta_session_from_request({'route': self.route})
+        url = f'/eta-sessions/{session.session_id}/updates'
+        self.assertEqual(self.client.get(url).get_json()['version'], 0)
+        self.assertEqual(self.client.get(url, query_string={'since': 0, 'timeout': 0.05}).get_json()['version'], 0)
+        
+        polled = []
+        poller = threading.Thread(target=lambda: polled.append(
+            self.client.get(url, query_string={'since': 0, 'timeout': 5}).get_json()))
+        poller.start()
+        poller.join(0.1)
+        self.assertTrue(poller.is_alive())
+        route_optimization.eta_session_store.complete_stop(session.session_id, 1,
+                                                          route_optimization.clock_minutes('10:20'))
+        poller.join(5)
+        self.assertEqual(polled[0]['version'], 1)
+        self.assertEqual(polled[0]['remaining_stops'], 3)
+        
+        self.assertEqual(self.client.get(url, query_string={'since': 'x'}).status_code, 400)
+        route_optimization.eta_session_store.delete(session.session_id)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
 class TestIntegration(unittest.TestCase):
     """Integration tests for the AI service components"""
     